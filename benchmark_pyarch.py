@@ -0,0 +1,920 @@
+#!/usr/bin/env python3
+
+"""
+Benchmarks of the pyarch pipeline stages.
+
+Usage example:
+
+python benchmark_pyarch.py links
+
+python benchmark_pyarch.py suite --output baseline.json
+python benchmark_pyarch.py suite --baseline baseline.json --threshold 0.25
+python benchmark_pyarch.py import --budget 100
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from pyarch import (
+    _TEMPLATE,
+    Analysis,
+    Graph,
+    GraphQuery,
+    GraphSnapshot,
+    Link,
+    Links,
+    LinksDiff,
+    Node,
+    Nodes,
+    PumlParser,
+    Server,
+    WebpageConfig,
+    WebpageGenerator,
+    Workspace,
+    __version__,
+    _is_relation,
+    analyze_links,
+    analyze_source,
+    build_link_index,
+    build_search_index,
+    diff_links,
+    iter_compact_payload,
+    iter_input_puml,
+    main,
+    now_utc,
+    parse_links,
+    parse_puml_files,
+    prerender_diagrams,
+    rollup_diagrams,
+    save_graph,
+    strongly_connected_components,
+)
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def _timeit(fn: Callable[[], object]) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def _peak_mb(fn: Callable[[], object]) -> float:
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1] / 2**20
+    finally:
+        tracemalloc.stop()
+
+
+def _synthetic_links(n: int) -> List[Link]:
+    """Generates n links, every second link is a duplicate of an earlier one."""
+    o = []
+    for i in range(n):
+        j = i // 2
+        o.append(Link(f"pkg{j % 97}.mod{j % 1013}.Cls{j} --* pkg{j % 89}.mod{j % 997}.Dep{j} : attr{j % 7}"))
+    return o
+
+
+def bench_links(sizes: List[int]) -> None:
+    """Measures deduplication of links on append, the time per link is expected to be constant."""
+    print(f"{'links':>10} {'unique':>10} {'seconds':>10} {'us/link':>10}")
+    for n in sizes:
+        raw = _synthetic_links(n)
+        o: List[Links] = []
+        elapsed = _timeit(lambda: o.append(Links(raw).deduplicate()))
+        print(f"{n:>10} {len(o[0]):>10} {elapsed:>10.4f} {elapsed / n * 1e6:>10.3f}")
+
+
+def _synthetic_ids(leaves: int, fanout: int = 10) -> List[str]:
+    """Generates ids of the leaves of a tree with the given fan-out, the depth grows with the number of leaves."""
+    depth = 1
+    while fanout**depth < leaves:
+        depth += 1
+
+    o = []
+    for i in range(leaves):
+        segments = []
+        for _ in range(depth):
+            segments.append(f"n{i % fanout}")
+            i //= fanout
+        o.append(".".join(segments))
+    return o
+
+
+def _nodes_fold(ids: List[str]) -> Nodes:
+    o = Nodes()
+    for _id in ids:
+        o.add(Node.from_str(_id))
+    return o
+
+
+def bench_nodes(sizes: List[int], fold_limit: int = 20_000) -> None:
+    """Measures the namespace tree build, the time per leaf is expected to grow with the depth only."""
+    print(f"{'leaves':>10} {'trie, s':>10} {'us/leaf':>10} {'fold, s':>10}")
+    for n in sizes:
+        ids = _synthetic_ids(n)
+        elapsed = _timeit(lambda: Nodes.from_ids(ids))
+        fold = f"{_timeit(lambda: _nodes_fold(ids)):>10.4f}" if n <= fold_limit else f"{'-':>10}"
+        print(f"{n:>10} {elapsed:>10.4f} {elapsed / n * 1e6:>10.3f} {fold}")
+
+
+_RSS_SCRIPT = """
+import resource, sys
+from pyarch import iter_input_puml, parse_links, Link, Links, _is_relation
+if sys.argv[2] == "stream":
+    links = parse_links(iter_input_puml(sys.argv[1]))
+else:
+    with open(sys.argv[1]) as f:
+        links = Links([Link(el) for el in f.read().split("\\n") if _is_relation(el)])
+print(len(links), resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+
+def bench_stream(sizes_mb: List[int]) -> None:
+    """Measures peak RSS of parsing a PUML file which consists of repeated relations.
+
+    The streaming parser's peak RSS is expected to depend on the number of unique links, not on the file size.
+    """
+    unique = [f"{el.start} {el.arrow} {el.end} : {el.description}" for el in _synthetic_links(20_000)]
+    block = "\n".join(unique) + "\n"
+
+    print(f"{'MB':>6} {'unique':>8} {'stream, MB':>12} {'read, MB':>10}")
+    for size_mb in sizes_mb:
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "classes.puml")
+            with open(path, "w") as f:
+                for _ in range(size_mb * 2**20 // len(block) + 1):
+                    f.write(block)
+
+            o = []
+            for mode in ("stream", "read"):
+                stdout = subprocess.check_output([sys.executable, "-c", _RSS_SCRIPT, path, mode], cwd=_HERE)
+                n, rss_kb = stdout.split()
+                o.append(int(rss_kb) / 1024)
+            print(f"{size_mb:>6} {int(n):>8} {o[0]:>12.1f} {o[1]:>10.1f}")
+
+
+def _synthetic_puml(classes: int, members: int = 6) -> str:
+    """Generates the classes PUML DSL with the given number of classes, their members and relations."""
+    o = ["@startuml classes", "set namespaceSeparator none"]
+    for i in range(classes):
+        o.append(f'class "Cls{i}" as pkg{i % 97}.mod{i % 1013}.Cls{i} {{')
+        for j in range(members // 2):
+            o.append(f"  attr{j} : int")
+        for j in range(members - members // 2):
+            o.append(f"  method{j}(x: int) -> str")
+        o.append("}")
+    for i in range(classes):
+        o.append(f"pkg{i % 97}.mod{i % 1013}.Cls{i} --|> pkg{i % 89}.mod{i % 997}.Cls{i // 2}")
+        o.append(f"pkg{i % 97}.mod{i % 1013}.Cls{i} --* pkg{i % 97}.mod{i % 1013}.Cls{i // 3} : attr{i % 3}")
+    o.append("@enduml")
+    return "\n".join(o) + "\n"
+
+
+def bench_parse(sizes: List[int]) -> None:
+    """Measures the parse throughput of the full PUML parser against the relations line filter."""
+    print(f"{'classes':>10} {'MB':>8} {'filter, MB/s':>14} {'parser, MB/s':>14}")
+    for n in sizes:
+        puml = _synthetic_puml(n)
+        size_mb = len(puml.encode()) / 2**20
+        filter_elapsed = _timeit(lambda: parse_links(puml))
+        parser_elapsed = _timeit(lambda: PumlParser().feed(puml))
+        print(f"{n:>10} {size_mb:>8.2f} {size_mb / filter_elapsed:>14.2f} {size_mb / parser_elapsed:>14.2f}")
+
+
+def bench_source(path: str) -> None:
+    """Measures the in-process analysis of the package against the pyreverse and pyarch pipeline.
+
+    pyreverse is executed only if it is installed, i.e. pylint is installed.
+    """
+    links, classes = [], []
+
+    def _analyze() -> None:
+        o = analyze_source(path, ["test", "tests"])
+        links.append(o[0])
+        classes.append(o[1])
+        WebpageGenerator(o[0].get_nodes(), o[0], WebpageConfig(), o[1])()
+
+    elapsed = _timeit(_analyze)
+    print(f"{'pipeline':>20} {'seconds':>10} {'links':>8}")
+    print(f"{'--source':>20} {elapsed:>10.4f} {len(links[0]):>8}")
+
+    if shutil.which("pyreverse") is None:
+        print(f"{'pyreverse + pyarch':>20} {'-':>10} {'-':>8} (pyreverse not found)")
+        return
+
+    with tempfile.TemporaryDirectory() as d:
+        cmd = ["pyreverse", "-Akmy", "-o", "puml", "-d", d, "--ignore=test,tests", os.path.abspath(path)]
+
+        def _pyreverse() -> None:
+            subprocess.check_call(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            main(iter_input_puml(f"{d}/packages.puml"), iter_input_puml(f"{d}/classes.puml"), WebpageConfig())
+
+        elapsed = _timeit(_pyreverse)
+        n = len(parse_links(iter_input_puml(f"{d}/packages.puml"), iter_input_puml(f"{d}/classes.puml")))
+        print(f"{'pyreverse + pyarch':>20} {elapsed:>10.4f} {n:>8}")
+
+
+def bench_jobs(jobs: List[int], classes: int = 200_000) -> None:
+    """Measures the speedup of the parallel PUML parsing given the number of workers."""
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "classes.puml")
+        with open(path, "w") as f:
+            f.write(_synthetic_puml(classes))
+        size_mb = os.path.getsize(path) / 2**20
+
+        print(f"cpus: {os.cpu_count()}, input: {size_mb:.1f} MB")
+        print(f"{'jobs':>6} {'seconds':>10} {'speedup':>10}")
+        baseline = 0.0
+        for n in jobs:
+            elapsed = _timeit(lambda: parse_puml_files([path], n))
+            baseline = baseline or elapsed
+            print(f"{n:>6} {elapsed:>10.3f} {baseline / elapsed:>10.2f}")
+
+
+def bench_payload(sizes: List[int]) -> None:
+    """Measures the size, build time and peak memory of the default and the compact page's payload."""
+    print(f"{'classes':>10} {'default, MB':>12} {'compact, MB':>12} {'ratio':>6} {'time, s':>16} {'peak, MB':>16}")
+    for n in sizes:
+        parser = PumlParser()
+        parser.feed(_synthetic_puml(n, members=0))
+        links, classes = parser.links, parser.classes
+        nodes = links.get_nodes()
+
+        def _default() -> str:
+            index = build_link_index(links, nodes.iter_ids())
+            return nodes.to_json() + links.to_json() + classes.to_json() + json.dumps(index)
+
+        def _compact() -> str:
+            return "".join(iter_compact_payload(nodes, links, classes))
+
+        sizes_mb = [len(_default()) / 2**20, len(_compact()) / 2**20]
+        times = [_timeit(_default), _timeit(_compact)]
+        peaks = [_peak_mb(_default), _peak_mb(_compact)]
+        print(
+            f"{n:>10} {sizes_mb[0]:>12.2f} {sizes_mb[1]:>12.2f} {sizes_mb[0] / sizes_mb[1]:>6.1f} "
+            f"{times[0]:>7.2f} / {times[1]:>6.2f} {peaks[0]:>7.1f} / {peaks[1]:>6.1f}"
+        )
+
+
+def _render_replace(generator: WebpageGenerator) -> str:
+    """Renders the page by the chained replacements of the placeholders, the rendering before the single pass."""
+    index = {}
+    if len(generator.links) >= generator.index_min_links:
+        index = build_link_index(generator.links, generator.nodes.iter_ids())
+    return (
+        _TEMPLATE.replace("{{.Nodes}}", generator.nodes.to_json())
+        .replace("{{.Links}}", generator.links.to_json())
+        .replace("{{.Classes}}", generator.classes.to_json())
+        .replace("{{.Index}}", json.dumps(index))
+        .replace("{{.Title}}", generator.cfg.title)
+        .replace("{{.Header}}", generator.cfg.header)
+        .replace("{{.Footer}}", generator.cfg.footer)
+        .replace("{{.When}}", f" on {now_utc()}")
+        .replace("{{.Report}}", "")
+        .replace("{{.Search}}", json.dumps(build_search_index(generator.nodes.iter_ids()), separators=(",", ":")))
+    )
+
+
+def bench_render(sizes: List[int]) -> None:
+    """Measures the time and peak memory of writing the page to the file by the chained replacements and by render."""
+    print(f"{'classes':>10} {'page, MB':>10} {'time, s':>16} {'peak, MB':>16}")
+    for n in sizes:
+        parser = PumlParser()
+        parser.feed(_synthetic_puml(n))
+        generator = WebpageGenerator(parser.links.get_nodes(), parser.links, WebpageConfig(), parser.classes)
+
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "index.html")
+
+            def _replace() -> None:
+                with open(path, "w") as f:
+                    f.write(_render_replace(generator))
+
+            def _render() -> None:
+                with open(path, "w") as f:
+                    generator.render(f)
+
+            times = [_timeit(_replace), _timeit(_render)]
+            peaks = [_peak_mb(_replace), _peak_mb(_render)]
+            size_mb = os.path.getsize(path) / 2**20
+
+        print(f"{n:>10} {size_mb:>10.2f} {times[0]:>7.2f} / {times[1]:>6.2f} {peaks[0]:>7.1f} / {peaks[1]:>6.1f}")
+
+
+def bench_prerender(sizes: List[int], top: int = 1_000) -> None:
+    """Measures the time to prerender the diagrams of the top nodes in the current process and in the process pool."""
+    jobs = max(2, os.cpu_count() or 1)
+    print(f"cpus: {os.cpu_count()}, top: {top}")
+    print(f"{'classes':>10} {'diagrams':>10} {'MB':>8} {'jobs 1, s':>10} {f'jobs {jobs}, s':>10}")
+    for n in sizes:
+        parser = PumlParser()
+        parser.feed(_synthetic_puml(n))
+        links, classes = parser.links, parser.classes
+        ids = list(links.get_nodes().iter_ids())
+
+        o: List[Dict[str, str]] = []
+        elapsed = [
+            _timeit(lambda: o.append(prerender_diagrams(links, ids, classes, top, 2**40, j))) for j in (1, jobs)
+        ]
+        size_mb = sum(len(el.encode()) for el in set(o[0].values())) / 2**20
+        print(f"{n:>10} {len(o[0]):>10} {size_mb:>8.2f} {elapsed[0]:>10.2f} {elapsed[1]:>10.2f}")
+
+
+def bench_rollup(sizes: List[int], max_edges: int = 500) -> None:
+    """Measures the largest diagram drawn by the page without and with the collapsed views, and their build time."""
+    print(f"max edges per view: {max_edges}")
+    print(f"{'classes':>10} {'largest':>10} {'collapsed':>10} {'views':>8} {'seconds':>10}")
+    for n in sizes:
+        parser = PumlParser()
+        parser.feed(_synthetic_puml(n, members=0))
+        links = parser.links
+        ids = list(links.get_nodes().iter_ids())
+
+        largest = max(sum(el[1::2]) - sum(el[::2]) for el in build_link_index(links, ids).values())
+        o: List[Dict[str, str]] = []
+        elapsed = _timeit(lambda: o.append(rollup_diagrams(links, ids, parser.classes, max_edges)))
+        collapsed = max((el.count(" --") for el in o[0].values()), default=0)
+        print(f"{n:>10} {largest:>10} {collapsed:>10} {len(o[0]):>8} {elapsed:>10.3f}")
+
+
+def bench_analyze(sizes: List[int], fanout: int = 5) -> None:
+    """Measures the dependency analysis of the imports' graph given the number of the edges."""
+    print(f"{'edges':>10} {'modules':>10} {'cycles':>8} {'largest':>10} {'graph, s':>9} {'scc, s':>8} {'total, s':>9}")
+    for n in sizes:
+        modules = n // fanout
+        rnd = random.Random(n)
+        links = Links(
+            Link(f"pkg.sub{i % 100}.mod{i} --> pkg.sub{j % 100}.mod{j}")
+            for i, j in ((k // fanout, rnd.randrange(modules)) for k in range(n))
+        )
+
+        o: List[Graph] = []
+        graph_elapsed = _timeit(lambda: o.append(Graph.from_links(links, ["-->"])))
+        scc_elapsed = _timeit(lambda: strongly_connected_components(o[0]))
+        analysis: List[Analysis] = []
+        elapsed = _timeit(lambda: analysis.append(analyze_links(links)))
+        cycles = analysis[0].cycles
+        largest = max((len(el) for el in cycles), default=0)
+        print(
+            f"{o[0].edges:>10} {modules:>10} {len(cycles):>8} {largest:>10} {graph_elapsed:>9.2f} {scc_elapsed:>8.2f} "
+            f"{elapsed:>9.2f}"
+        )
+
+
+def _layered_links(n: int, fanout: int = 10) -> Links:
+    """Generates n imports of the modules of the lower layers, every two-hundredth import makes a short cycle."""
+    modules = n // fanout
+    rnd = random.Random(n)
+
+    def _target(i: int) -> int:
+        if i == 0 or rnd.random() < 0.005:
+            return min(modules - 1, i + rnd.randint(1, 5))
+        return rnd.randrange(max(0, i - 1_000), i) if rnd.random() < 0.9 else rnd.randrange(i)
+
+    return Links(
+        Link.from_parts(f"pkg.sub{i % 100}.mod{i}", "-->", f"pkg.sub{j % 100}.mod{j}", "")
+        for i, j in ((k // fanout, _target(k // fanout)) for k in range(n))
+    )
+
+
+def bench_query(sizes: List[int], queries: int = 100) -> None:
+    """Measures the transitive closure and the path queries of the random nodes, and the repeated queries."""
+    print(
+        f"{'edges':>10} {'components':>10} {'build, s':>9} {'closure':>8} {'first, ms':>10} {'repeat, ms':>10} "
+        f"{'path, ms':>9} {'cache, MB':>10}"
+    )
+    for n in sizes:
+        links = _layered_links(n)
+        o: List[GraphQuery] = []
+        build_elapsed = _timeit(lambda: o.append(GraphQuery.from_links(links)))
+        query = o[0]
+
+        rnd = random.Random(n)
+        ids = query.graph.ids
+        sample = [rnd.choice(ids) for _ in range(queries)]
+        found: List[int] = []
+        elapsed = []
+        for fn in (query.dependencies, query.dependents) * 2:
+            elapsed.append(_timeit(lambda: found.extend(len(fn(el)) for el in sample)) / queries * 1e3)
+        path_elapsed = _timeit(lambda: [query.path(rnd.choice(ids), rnd.choice(ids)) for _ in range(queries)])
+
+        print(
+            f"{query.graph.edges:>10} {len(query._members):>10} {build_elapsed:>9.2f} {sum(found) // len(found):>8} "
+            f"{(elapsed[0] + elapsed[1]) / 2:>10.1f} {(elapsed[2] + elapsed[3]) / 2:>10.1f} "
+            f"{path_elapsed / queries * 1e3:>9.1f} {sum(query._cached) / 2**20:>10.1f}"
+        )
+
+
+def bench_diff(sizes: List[int], changed: float = 0.01) -> None:
+    """Measures the diff of two snapshots which differ by the share of the links against the page build."""
+    print(f"changed: {changed:.0%}")
+    print(f"{'links':>10} {'added':>8} {'removed':>8} {'diff, s':>8} {'page, s':>8}")
+    for n in sizes:
+        old = Links(_synthetic_links(2 * n))
+        new = Links(old[i] for i in range(int(n * changed), n))
+        new.extend(
+            Link.from_parts(el.start, el.arrow, el.end, "changed") for el in (old[i] for i in range(int(n * changed)))
+        )
+
+        o: List[LinksDiff] = []
+        elapsed = _timeit(lambda: o.append(diff_links(old, new)))
+
+        def _page() -> None:
+            with open(os.devnull, "w") as f:
+                WebpageGenerator(new.get_nodes(), new, WebpageConfig()).render(f)
+
+        print(f"{n:>10} {len(o[0].added):>8} {len(o[0].removed):>8} {elapsed:>8.2f} {_timeit(_page):>8.2f}")
+
+
+def bench_snapshot(sizes: List[int]) -> None:
+    """Measures the graph snapshot's size, its save, open and load time against parsing the PUML DSL."""
+    print(
+        f"{'classes':>10} {'puml, MB':>9} {'file, MB':>9} {'parse, s':>9} {'save, s':>8} {'open, ms':>9} {'load, s':>8}"
+    )
+    for n in sizes:
+        puml = _synthetic_puml(n)
+        parsed: List[PumlParser] = []
+
+        def _parse() -> None:
+            parsed.append(PumlParser())
+            parsed[0].feed(puml)
+            parsed[0].links.get_nodes()
+
+        parse_elapsed = _timeit(_parse)
+        links, classes = parsed[0].links, parsed[0].classes
+
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "graph.pyarch")
+            save_elapsed = _timeit(lambda: save_graph(path, links, classes))
+            open_elapsed = _timeit(lambda: GraphSnapshot(path).close())
+
+            def _load() -> None:
+                with GraphSnapshot(path) as snapshot:
+                    snapshot.links(), snapshot.classes(), snapshot.nodes()
+
+            load_elapsed = _timeit(_load)
+            size_mb = os.path.getsize(path) / 2**20
+
+        print(
+            f"{n:>10} {len(puml.encode()) / 2**20:>9.2f} {size_mb:>9.2f} {parse_elapsed:>9.2f} {save_elapsed:>8.2f} "
+            f"{open_elapsed * 1e3:>9.2f} {load_elapsed:>8.2f}"
+        )
+
+
+def bench_tree(sizes: List[int], path: Optional[str] = None) -> None:
+    """Measures the page's search index, and the tree's items the page renders at load against the whole tree.
+
+    The pages are written to the path if given, the time to interactive of the page is the "pyarch:interactive" mark
+    of its performance timeline, i.e. performance.getEntriesByName("pyarch:interactive")[0].startTime in the browser.
+    """
+    print(f"{'leaves':>10} {'nodes':>10} {'at load':>10} {'index, s':>10} {'index, MB':>10} {'page, MB':>10}")
+    for n in sizes:
+        ids = _synthetic_ids(n)
+        nodes = Nodes.from_ids(ids)
+        links = Links(Link(f"{start} --> {end}") for start, end in zip(ids, ids[1:]))
+        total = sum(1 for _ in nodes.iter_ids())
+        loaded = len(nodes) + sum(len(el.nodes) for el in nodes)
+
+        index: List[Dict[str, Any]] = []
+        elapsed = _timeit(lambda: index.append(build_search_index(nodes.iter_ids())))
+        index_mb = len(json.dumps(index[0], separators=(",", ":"))) / 2**20
+
+        with tempfile.TemporaryDirectory() as d:
+            page = os.path.join(path or d, f"tree-{n}.html")
+            with open(page, "w") as f:
+                WebpageGenerator(nodes, links, WebpageConfig(title=f"{n} leaves")).render(f)
+            page_mb = os.path.getsize(page) / 2**20
+
+        print(f"{n:>10} {total:>10} {loaded:>10} {elapsed:>10.3f} {index_mb:>10.2f} {page_mb:>10.2f}")
+
+
+def _synthetic_source(path: str, modules: int) -> List[str]:
+    """Writes the package with the given number of modules which import and subclass each other's classes."""
+    o = []
+    for i in range(modules):
+        package = os.path.join(path, "pkg", f"sub{i % 50}")
+        if not os.path.isdir(package):
+            os.makedirs(package)
+            for el in (os.path.dirname(package), package):
+                with open(os.path.join(el, "__init__.py"), "w") as f:
+                    f.write("")
+        o.append(os.path.join(package, f"mod{i}.py"))
+        with open(o[-1], "w") as f:
+            j, k = i // 2, i // 3
+            f.write(
+                f"from pkg.sub{j % 50}.mod{j} import Cls{j}\n"
+                f"from pkg.sub{k % 50} import mod{k}\n\n\n"
+                f"class Cls{i}(Cls{j}):\n"
+                f"    def __init__(self, dep: Cls{j}) -> None:\n"
+                f"        self.dep = dep\n\n"
+                f"    def run(self) -> int:\n"
+                f"        return {i}\n"
+            )
+    return o
+
+
+# the modules imported by the commands using them, importing them at the module's import slows down every embedding
+_LAZY_MODULES = ("argparse", "asyncio", "concurrent.futures", "hashlib", "tempfile", "urllib.parse")
+
+
+def measure_import(repeat: int = 5) -> Tuple[float, Dict[str, int]]:
+    """Measures the time to import pyarch in a new interpreter with python -X importtime.
+
+    The first run compiles the module, its bytecode is cached unless the cache is disabled, e.g. by
+    PYTHONDONTWRITEBYTECODE, hence the first run is not measured.
+
+    Args:
+        repeat: Number of the runs to take the best time of.
+
+    Returns:
+        Best cumulative import time in seconds, and the cumulative times in microseconds of the modules imported by
+        pyarch in the best run.
+    """
+    best: Tuple[float, Dict[str, int]] = (float("inf"), {})
+    for i in range(repeat + 1):
+        stderr = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import pyarch"],
+            cwd=_HERE,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stderr
+
+        # the modules imported by pyarch precede it, and are nested deeper than the top level
+        modules: Dict[str, int] = {}
+        for line in stderr.splitlines():
+            fields = line.split("|")
+            if len(fields) != 3 or not fields[1].strip().isdigit():
+                continue
+            name = fields[2].rstrip()
+            if name.strip() == "pyarch" and not name.startswith("  "):
+                if i > 0 and int(fields[1]) / 1e6 < best[0]:
+                    best = (int(fields[1]) / 1e6, modules)
+                break
+            if not name.startswith("  "):
+                modules = {}
+            else:
+                modules[name.strip()] = int(fields[1])
+    return best
+
+
+def bench_import(repeat: int = 5, budget: float = 0.1) -> int:
+    """Prints the import time of pyarch and the slowest modules it imports, checks the import time's budget.
+
+    Returns:
+        Exit code, 1 if the import time exceeds the budget, or if pyarch imports the modules which must be imported
+        lazily.
+    """
+    seconds, modules = measure_import(repeat)
+    print(f"import pyarch: {seconds * 1e3:.1f} ms, {len(modules)} modules")
+    for name, us in sorted(modules.items(), key=lambda el: -el[1])[:10]:
+        print(f"{name:>24} {us / 1e3:>8.1f} ms")
+
+    eager = [el for el in _LAZY_MODULES if el in modules]
+    for el in eager:
+        print(f"regression: {el} is imported by pyarch", file=sys.stderr)
+    if seconds > budget:
+        print(f"regression: import time exceeds the budget of {budget * 1e3:g} ms", file=sys.stderr)
+    return 1 if eager or seconds > budget else 0
+
+
+def bench_watch(sizes: List[int], repeat: int = 7) -> None:
+    """Measures the server's update latency upon the change of a single module of the package's source.
+
+    The median latency of Server.update upon the repeated edits is reported: the edit of a function's body which keeps
+    the graph, and the new import which changes the links.
+    """
+    print(f"{'modules':>8} {'links':>8} {'initial, s':>11} {'noop, ms':>9} {'body, ms':>9} {'import, ms':>11}")
+    for n in sizes:
+        with tempfile.TemporaryDirectory() as d:
+            paths = _synthetic_source(d, n)
+            workspace = Workspace(os.path.join(d, "pkg"), source=True)
+            server = Server(workspace, WebpageConfig())
+            initial = _timeit(server.update)
+
+            o: Dict[str, List[float]] = {"noop": [], "body": [], "import": []}
+            for i in range(repeat):
+                o["noop"].append(_timeit(server.update))
+
+                with open(paths[n // 2], "a") as f:
+                    f.write(f"\n\ndef helper{i}() -> int:\n    return 1\n")
+                o["body"].append(_timeit(server.update))
+
+                with open(paths[n // 2], "a") as f:
+                    f.write(f"\nimport pkg.sub{i % 50}.mod{i}\n")
+                o["import"].append(_timeit(server.update))
+            gc.unfreeze()
+
+            noop, body, imports = (sorted(el)[repeat // 2] * 1e3 for el in o.values())
+            print(f"{n:>8} {len(workspace.links):>8} {initial:>11.2f} {noop:>9.1f} {body:>9.1f} {imports:>11.1f}")
+
+
+def generate_puml(
+    depth: int = 5,
+    fanout: int = 6,
+    density: float = 2.0,
+    duplicates: float = 0.2,
+    classes: int = 2,
+    members: int = 4,
+    seed: int = 0,
+) -> Tuple[str, str]:
+    """Generates the deterministic packages and classes PUML DSL of a synthetic package.
+
+    Args:
+        depth: Depth of the package's tree, the modules are the leaves.
+        fanout: Number of the sub-packages, or the modules of every package.
+        density: Average number of the relations of every module and of every class.
+        duplicates: Ratio of the duplicated relations to the unique relations.
+        classes: Number of the classes in every module.
+        members: Number of the attributes and methods of every class.
+        seed: Seed of the random generator.
+
+    Returns:
+        The packages and the classes PUML DSL.
+    """
+    rnd = random.Random(seed)
+    modules = ["pkg"]
+    for _ in range(depth - 1):
+        modules = [f"{el}.m{i}" for el in modules for i in range(fanout)]
+    class_ids = [f"{el}.C{i}" for el in modules for i in range(classes)]
+
+    def _relations(ids: List[str], arrows: List[str]) -> List[str]:
+        o = []
+        for start in ids:
+            for _ in range(int(density) + (rnd.random() < density % 1)):
+                end = rnd.choice(ids)
+                if end != start:
+                    arrow = rnd.choice(arrows)
+                    o.append(f"{start} {arrow} {end}" + (f" : attr{rnd.randrange(9)}" if arrow == "--*" else ""))
+        for _ in range(int(len(o) * duplicates)):
+            o.insert(rnd.randrange(len(o) + 1), rnd.choice(o))
+        return o
+
+    packages = ["@startuml packages_pkg", "set namespaceSeparator none"]
+    packages.extend(f'package "{el}" as {el} {{\n}}' for el in modules)
+    packages.extend(_relations(modules, ["-->"]))
+    packages.append("@enduml")
+
+    o = ["@startuml classes_pkg", "set namespaceSeparator none"]
+    for _id in class_ids:
+        o.append(f'class "{_id.rpartition(".")[2]}" as {_id} {{')
+        o.extend(f"  attr{j} : int" for j in range(members // 2))
+        o.extend(f"  method{j}(x: int) -> str" for j in range(members - members // 2))
+        o.append("}")
+    o.extend(_relations(class_ids, ["--|>", "--*", "--o"]))
+    o.append("@enduml")
+    return "\n".join(packages) + "\n", "\n".join(o) + "\n"
+
+
+def _stage(fn: Callable[[], object], repeat: int) -> Dict[str, float]:
+    """Measures the best time of the repeated runs, and the peak memory of a separate traced run."""
+    seconds = min(_timeit(fn) for _ in range(repeat))
+    return {"seconds": round(seconds, 6), "peak_mb": round(_peak_mb(fn), 3)}
+
+
+def run_suite(params: Dict[str, Any], repeat: int = 5) -> Dict[str, Any]:
+    """Measures the time and the peak memory of every stage of pyarch.main on the synthetic package.
+
+    The stages are: parse of the PUML DSL, deduplicate of its relations which is a part of parse, get_nodes, render of
+    the page, and main which runs the stages end to end.
+
+    Args:
+        params: Parameters of generate_puml.
+        repeat: Number of the runs to take the best time of.
+
+    Returns:
+        Results: the versions, the parameters, the inputs' sizes and the stages' measurements.
+    """
+    packages, classes = generate_puml(**params)
+    cfg = WebpageConfig()
+
+    parser = PumlParser()
+    parser.feed(packages)
+    parser.feed(classes)
+    links, nodes = parser.links, parser.links.get_nodes()
+    relations = [Link(el) for el in (packages + classes).splitlines() if _is_relation(el)]
+
+    def _parse() -> None:
+        o = PumlParser()
+        o.feed(packages)
+        o.feed(classes)
+
+    def _render() -> None:
+        with open(os.devnull, "w") as f:
+            WebpageGenerator(nodes, links, cfg, parser.classes).render(f)
+
+    stages = {
+        "parse": _parse,
+        "deduplicate": lambda: Links(relations).deduplicate(),
+        "get_nodes": links.get_nodes,
+        "render": _render,
+        "main": lambda: main(packages, classes, cfg),
+    }
+    return {
+        "pyarch": __version__,
+        "python": platform.python_version(),
+        "params": params,
+        "inputs": {
+            "mb": round(len((packages + classes).encode()) / 2**20, 3),
+            "relations": len(relations),
+            "links": len(links),
+            "nodes": len(list(nodes.iter_ids())),
+        },
+        "stages": {name: _stage(fn, repeat) for name, fn in stages.items()},
+    }
+
+
+def compare_results(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float = 0.25) -> List[str]:
+    """Compares the suite's results to the baseline.
+
+    Args:
+        results: Results of run_suite.
+        baseline: Results of run_suite stored as the baseline.
+        threshold: Allowed relative increase of the stage's time and peak memory.
+
+    Returns:
+        Regressions' descriptions, empty if no stage regressed.
+
+    Raises:
+        ValueError: raised when the results were measured with different parameters.
+    """
+    if results["params"] != baseline["params"]:
+        raise ValueError("the parameters differ from the baseline's: %s" % baseline["params"])
+
+    o = []
+    for name, stage in results["stages"].items():
+        base = baseline["stages"].get(name)
+        if base is None:
+            continue
+        for metric, value in stage.items():
+            if value > base[metric] * (1 + threshold):
+                increase = value / base[metric] - 1 if base[metric] else float("inf")
+                o.append(f"{name}: {metric} {value:g} exceeds the baseline {base[metric]:g} by {increase:.0%}")
+    return o
+
+
+def bench_suite(args: argparse.Namespace) -> int:
+    """Runs the suite, prints and stores the results, compares them to the baseline.
+
+    Returns:
+        Exit code, 1 if any stage regressed, or if the results cannot be compared to the baseline.
+    """
+    params = {
+        "depth": args.depth,
+        "fanout": args.fanout,
+        "density": args.density,
+        "duplicates": args.duplicates,
+        "seed": args.seed,
+    }
+    results = run_suite(params, args.repeat)
+
+    print(" ".join(f"{k}: {v}" for k, v in results["inputs"].items()))
+    print(f"{'stage':>12} {'seconds':>10} {'peak, MB':>10}")
+    for name, stage in results["stages"].items():
+        print(f"{name:>12} {stage['seconds']:>10.4f} {stage['peak_mb']:>10.2f}")
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline is None:
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    try:
+        regressions = compare_results(results, baseline, args.threshold)
+    except ValueError as ex:
+        print(f"error: {ex}", file=sys.stderr)
+        return 1
+    for el in regressions:
+        print(f"regression: {el}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+def bench_generate(args: argparse.Namespace) -> None:
+    """Writes the synthetic package's packages.puml and classes.puml to the directory, defaults to the current one."""
+    packages, classes = generate_puml(args.depth, args.fanout, args.density, args.duplicates, seed=args.seed)
+    path = args.path or "."
+    for name, puml in (("packages.puml", packages), ("classes.puml", classes)):
+        with open(os.path.join(path, name), "w") as f:
+            f.write(puml)
+        print(f"{os.path.join(path, name)}: {len(puml.encode()) / 2**20:.2f} MB")
+
+
+def get_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="benchmark_pyarch", description="Benchmarks of the pyarch pipeline stages.")
+    parser.add_argument(
+        "benchmark",
+        choices=[
+            "links",
+            "nodes",
+            "stream",
+            "parse",
+            "source",
+            "jobs",
+            "payload",
+            "render",
+            "prerender",
+            "rollup",
+            "watch",
+            "analyze",
+            "diff",
+            "snapshot",
+            "tree",
+            "query",
+            "import",
+            "suite",
+            "generate",
+        ],
+        help="Benchmark to run.",
+    )
+    parser.add_argument(
+        "--path",
+        type=str,
+        default=None,
+        help="Package directory for the source benchmark, output directory for the generate and the tree benchmarks.",
+    )
+    parser.add_argument(
+        "--sizes",
+        type=lambda v: [int(el) for el in v.split(",")],
+        default=None,
+        help="Comma separated input sizes.",
+    )
+
+    synthetic = parser.add_argument_group("synthetic package", "Parameters of the suite and generate benchmarks.")
+    synthetic.add_argument("--depth", type=int, default=5, help="Depth of the package's tree.")
+    synthetic.add_argument("--fanout", type=int, default=6, help="Number of the sub-packages of every package.")
+    synthetic.add_argument("--density", type=float, default=2.0, help="Average number of the relations per node.")
+    synthetic.add_argument("--duplicates", type=float, default=0.2, help="Ratio of the duplicated relations.")
+    synthetic.add_argument("--seed", type=int, default=0, help="Seed of the random generator.")
+
+    suite = parser.add_argument_group("suite", "Parameters of the suite and import benchmarks.")
+    suite.add_argument("--repeat", type=int, default=5, help="Number of the runs to take the best time of.")
+    suite.add_argument("--budget", type=float, default=100, help="Import time's budget in milliseconds.")
+    suite.add_argument("--output", type=str, default=None, help="Path to write the JSON results to.")
+    suite.add_argument("--baseline", type=str, default=None, help="Path to the JSON results to compare against.")
+    suite.add_argument(
+        "--threshold",
+        type=float,
+        default=0.25,
+        help="Allowed relative increase of the stage's time and peak memory over the baseline.",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = get_args()
+
+    if args.benchmark == "links":
+        bench_links(args.sizes or [1_000, 10_000, 100_000, 1_000_000])
+    elif args.benchmark == "nodes":
+        bench_nodes(args.sizes or [1_000, 10_000, 100_000, 500_000])
+    elif args.benchmark == "stream":
+        bench_stream(args.sizes or [10, 100, 500])
+    elif args.benchmark == "parse":
+        bench_parse(args.sizes or [1_000, 10_000, 50_000])
+    elif args.benchmark == "source":
+        bench_source(args.path or os.path.dirname(argparse.__file__) + "/email")
+    elif args.benchmark == "jobs":
+        bench_jobs(args.sizes or [1, 2, 4, 8, 16])
+    elif args.benchmark == "payload":
+        bench_payload(args.sizes or [1_000, 10_000, 100_000])
+    elif args.benchmark == "render":
+        bench_render(args.sizes or [1_000, 10_000, 100_000])
+    elif args.benchmark == "prerender":
+        bench_prerender(args.sizes or [1_000, 10_000, 100_000])
+    elif args.benchmark == "rollup":
+        bench_rollup(args.sizes or [1_000, 10_000, 100_000])
+    elif args.benchmark == "watch":
+        bench_watch(args.sizes or [1_000, 10_000])
+    elif args.benchmark == "analyze":
+        bench_analyze(args.sizes or [10_000, 100_000, 1_000_000])
+    elif args.benchmark == "diff":
+        bench_diff(args.sizes or [10_000, 100_000, 1_000_000])
+    elif args.benchmark == "snapshot":
+        bench_snapshot(args.sizes or [1_000, 10_000, 100_000])
+    elif args.benchmark == "query":
+        bench_query(args.sizes or [10_000, 100_000, 1_000_000])
+    elif args.benchmark == "tree":
+        bench_tree(args.sizes or [1_000, 10_000, 100_000], args.path)
+    elif args.benchmark == "import":
+        sys.exit(bench_import(args.repeat, args.budget / 1e3))
+    elif args.benchmark == "suite":
+        sys.exit(bench_suite(args))
+    elif args.benchmark == "generate":
+        bench_generate(args)
@@ -14,39 +14,168 @@ pyreverse -Akmy -o puml . --ignore=test,tests
 ./pyarch.py --output index.html --input .
 """
 
-import argparse
+import array
+import ast
+import bisect
+import builtins
+import collections
+import contextlib
 import dataclasses
+import gc
+import html
+import io
+import itertools
 import json
 import logging
+import mmap
+import os
+import re
+import struct
 import sys
 import time
 from os.path import isfile
-from sys import exit
-from typing import Dict, List
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, TextIO, Tuple, Union
+
+if TYPE_CHECKING:
+    import argparse
+    import asyncio
+
+__version__ = "0.0.2"
+
+# the stable API, the rest of the module is the command line interface and the implementation details
+__all__ = [
+    "Link",
+    "Links",
+    "Node",
+    "Nodes",
+    "Class",
+    "Classes",
+    "PumlParser",
+    "PumlSource",
+    "PumlInput",
+    "iter_links",
+    "parse_links",
+    "read_puml",
+    "parse_puml_files",
+    "chunk_puml_file",
+    "Cache",
+    "ClassSummary",
+    "ModuleSummary",
+    "summarize_module",
+    "iter_source_modules",
+    "link_modules",
+    "analyze_source",
+    "WebpageConfig",
+    "WebpageGenerator",
+    "render_template",
+    "build_link_index",
+    "build_search_index",
+    "generate_diagram",
+    "prerender_diagrams",
+    "rollup_links",
+    "rollup_diagrams",
+    "iter_compact_payload",
+    "shard_links",
+    "Graph",
+    "GraphQuery",
+    "run_query",
+    "strongly_connected_components",
+    "NodeMetrics",
+    "Analysis",
+    "analyze_links",
+    "LinksDiff",
+    "diff_links",
+    "diff_page",
+    "save_graph",
+    "GraphSnapshot",
+    "load_snapshot",
+    "BatchJob",
+    "read_batch_manifest",
+    "build_batch_job",
+    "run_batch",
+    "write_batch_index",
+    "Workspace",
+    "Server",
+    "Stage",
+    "Profiler",
+    "main",
+    "cli",
+]
 
 
 class Link:
+    """Immutable relation between two nodes defined by the PlantUML DSL.
+
+    The link is identified by the tuple (start, arrow, end, description), hence it can be used as a dict key,
+    or a set member which makes deduplication O(1) per link.
+    """
+
+    __slots__ = ("_key",)
+
+    _key: Tuple[str, str, str, str]
+
     def __init__(self, dsl_puml: str) -> None:
         o = dsl_puml.split(" ")
 
         if len(o) != 3 and len(o) != 5:
             raise ValueError("input is not compliant with the PlantUML DSL")
 
-        self.start: str = o[0]
-        self.end: str = o[2]
-        self.arrow: str = o[1]
+        object.__setattr__(self, "_key", (o[0], o[1], o[2], o[4] if len(o) == 5 else ""))
 
-        self.description: str = ""
-        if len(o) == 5:
-            self.description = o[4]
+    @classmethod
+    def from_parts(cls, start: str, arrow: str, end: str, description: str = "") -> "Link":
+        """Creates a new Link object given its attributes.
 
-    def __eq__(self, other: "Link") -> bool:  # type: ignore
-        return (
-            self.start == other.start
-            and self.end == other.end
-            and self.arrow == other.arrow
-            and self.description == other.description
-        )
+        Args:
+            start: Id of the node the link starts at.
+            arrow: PlantUML arrow.
+            end: Id of the node the link ends at.
+            description: Link's label.
+
+        Returns:
+            Link object.
+        """
+        o = cls.__new__(cls)
+        object.__setattr__(o, "_key", (start, arrow, end, description))
+        return o
+
+    @property
+    def start(self) -> str:
+        return self._key[0]
+
+    @property
+    def arrow(self) -> str:
+        return self._key[1]
+
+    @property
+    def end(self) -> str:
+        return self._key[2]
+
+    @property
+    def description(self) -> str:
+        return self._key[3]
+
+    @property
+    def key(self) -> Tuple[str, str, str, str]:
+        return self._key
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError("Link is immutable")
+
+    def __reduce__(self) -> Tuple[Callable[..., "Link"], Tuple[str, str, str, str]]:
+        # the link is recreated from its key by pickle and copy, its attributes cannot be set
+        return (Link.from_parts, self._key)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Link):
+            return NotImplemented
+        return self._key == other._key
+
+    def __hash__(self) -> int:
+        return hash(self._key)
+
+    def __repr__(self) -> str:
+        return "Link.from_parts%r" % (self._key,)
 
     def to_dict(self) -> Dict[str, str]:
         return {
@@ -57,34 +186,103 @@ class Link:
         }
 
 
-class Links(List[Link]):
-    def to_json(self) -> str:
-        return json.dumps([el.to_dict() for el in self])
+class Links:
+    """Insertion-ordered collection of unique links.
 
-    def deduplicate(self) -> "Links":
-        if len(self) < 2:
-            return self
+    Duplicates are dropped on append, the order of the first occurrence is preserved.
+    """
 
-        o = [self[0]]
+    __slots__ = ("_items", "_seen")
 
-        for el in self[1:]:
-            if len({None for i in o if i == el}) == 0:
-                o.append(el)
+    def __init__(self, links: Iterable[Link] = ()) -> None:
+        self._items: List[Link] = []
+        self._seen: Set[Link] = set()
+        self.extend(links)
 
-        return Links(o)
+    def append(self, link: Link) -> None:
+        if link not in self._seen:
+            self._seen.add(link)
+            self._items.append(link)
 
-    def get_nodes(self) -> "Nodes":
-        ids = set()
-        for link in self:
-            ids.add(link.start)
-            ids.add(link.end)
+    def extend(self, links: Iterable[Link]) -> None:
+        seen, items = self._seen, self._items
+        for link in links:
+            if link not in seen:
+                seen.add(link)
+                items.append(link)
 
-        o = Nodes()
-        for _id in ids:
-            o.add(Node.from_str(_id))
+    @classmethod
+    def concat(cls, *links: "Links") -> "Links":
+        """Concatenates the collections.
 
+        The disjoint collections, e.g. of the links with different arrows, are concatenated without checking every
+        link; the links of the overlapping collections are deduplicated, the first occurrence is kept.
+
+        Args:
+            links: Collections to concatenate in order.
+
+        Returns:
+            New collection of the links.
+        """
+        o = cls()
+        for el in links:
+            o._seen |= el._seen
+        if len(o._seen) == sum(len(el) for el in links):
+            for el in links:
+                o._items.extend(el._items)
+        else:
+            o._seen = set()
+            for el in links:
+                o.extend(el)
         return o
 
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __iter__(self) -> Iterator[Link]:
+        return iter(self._items)
+
+    def __getitem__(self, i: int) -> Link:
+        return self._items[i]
+
+    def __contains__(self, link: object) -> bool:
+        return link in self._seen
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Links):
+            return NotImplemented
+        return self._items == other._items
+
+    def __repr__(self) -> str:
+        return "Links(%r)" % self._items
+
+    def iter_json(self, chunk_size: int = 2**12) -> Iterator[str]:
+        """Serialises the links to JSON in chunks of links."""
+        yield "["
+        for i in range(0, len(self._items), chunk_size):
+            if i > 0:
+                yield ", "
+            yield json.dumps([el.to_dict() for el in self._items[i : i + chunk_size]])[1:-1]
+        yield "]"
+
+    def to_json(self) -> str:
+        return "".join(self.iter_json())
+
+    def deduplicate(self) -> "Links":
+        """Returns the links without duplicates.
+
+        The collection never holds duplicates, the method is kept for backward compatibility.
+        """
+        return self
+
+    def get_nodes(self) -> "Nodes":
+        ids: Dict[str, None] = {}
+        for link in self:
+            ids[link.start] = None
+            ids[link.end] = None
+
+        return Nodes.from_ids(ids)
+
 
 @dataclasses.dataclass
 class Node:
@@ -104,16 +302,7 @@ class Node:
         Returns:
             Node object.
         """
-        node_names = id.split(Node._SEPARATOR)[-1::-1]
-        node = Node(id, node_names[0], Nodes([]))
-
-        i = 1
-        while i < len(node_names):
-            node_id = Node._SEPARATOR.join(node_names[i:][-1::-1])
-            node = Node(node_id, node_names[i], Nodes([node]))
-            i += 1
-
-        return node
+        return Nodes.from_ids([id])[0]
 
     def __eq__(self, other: "Node") -> bool:  # type: ignore
         flag = self.id == other.id and self.name == self.name and len(self.nodes) == len(other.nodes)
@@ -134,7 +323,8 @@ class Nodes(List["Node"]):
     def add(self, other: "Node"):
         root_found = False
         for node in self:
-            if node.parent_id() == other.parent_id() and node.id == other.id:
+            # the parent id is derived from the id, hence equal ids imply equal parents
+            if node.id == other.id:
                 root_found = True
                 for child in other.nodes:
                     node.nodes.add(child)
@@ -142,190 +332,4186 @@ class Nodes(List["Node"]):
         if not root_found:
             self.append(other)
 
+    @classmethod
+    def from_ids(cls, ids: Iterable[str]) -> "Nodes":
+        """Builds the namespace tree given the nodes' ids.
+
+        The nodes are indexed by their ids, every id is inserted below its deepest ancestor found in the index, hence
+        the cost is O(depth) per id and O(1) per id whose parent is already in the tree.
+        The result is equal to adding Node.from_str(id) for every id in the given order.
+
+        Args:
+            ids: Dotted nodes' ids.
+
+        Returns:
+            Nodes tree.
+        """
+        o = cls()
+        index: Dict[str, Node] = {}
+
+        for _id in ids:
+            if _id in index:
+                continue
+
+            missing = []
+            ancestor: Optional[str] = _id
+            while ancestor is not None and ancestor not in index:
+                missing.append(ancestor)
+                head, separator, _ = ancestor.rpartition(Node._SEPARATOR)
+                ancestor = head if separator else None
+
+            nodes = o if ancestor is None else index[ancestor].nodes
+            for node_id in reversed(missing):
+                node = index[node_id] = Node(node_id, node_id.rpartition(Node._SEPARATOR)[2], Nodes())
+                nodes.append(node)
+                nodes = node.nodes
+
+        return o
+
+    def iter_ids(self) -> Iterator[str]:
+        """Iterates over the ids of the nodes in the tree depth first."""
+        stack = list(reversed(self))
+        while stack:
+            node = stack.pop()
+            yield node.id
+            stack.extend(reversed(node.nodes))
+
+    def iter_json(self) -> Iterator[str]:
+        """Serialises the tree to JSON chunk by chunk without copying it to dicts."""
+        yield "["
+        for i, node in enumerate(self):
+            if i > 0:
+                yield ", "
+            yield f'{{"id": {json.dumps(node.id)}, "name": {json.dumps(node.name)}, "nodes": '
+            yield from node.nodes.iter_json()
+            yield "}"
+        yield "]"
+
     def to_json(self) -> str:
-        return json.dumps([dataclasses.asdict(el) for el in self])
+        return "".join(self.iter_json())
 
 
 def _is_relation(el: str) -> bool:
     return " --" in el
 
 
-@dataclasses.dataclass
-class WebpageConfig:
-    title: str = "Python package architecture"
-    header: str = "Python package architecture"
-    footer: str = """<p style="font-size:15px">Built with ❤️ by <a href=https://www.dkisler.com target=_blank>Dmitry Kisler - dkisler.com</a></p>"""
-
+PumlSource = Union[str, Iterable[str]]
+# the path of the PUML file, or of the directory with {classes,packages}.puml files, or the iterable of the PUML lines
+PumlInput = Union[str, "os.PathLike[str]", Iterable[str]]
 
-def now_utc() -> str:
-    return time.strftime("%Y-%m-%d %H:%M:%S GMT", time.gmtime())
 
+def _iter_lines(puml: PumlSource) -> Iterable[str]:
+    """Iterates over the lines of the PUML DSL given either as a string, or as an iterable, e.g. a file object."""
+    if isinstance(puml, str):
+        return io.StringIO(puml)
+    return puml
 
-@dataclasses.dataclass
-class WebpageGenerator:
-    nodes: Nodes
-    links: Links
-    cfg: WebpageConfig
 
-    def __call__(self) -> str:
-        """Creates the webpage with architecture details."""
+def iter_links(puml: PumlSource) -> Iterator[Link]:
+    """Parses the PUML DSL line by line.
 
-        template = """<!doctypehtml><html lang=en><title>{{.Title}}</title><meta content="width=device-width,initial-scale=1"name=viewport><meta charset=UTF-8><script src=https://cdn.jsdelivr.net/npm/mermaid@10.3.1/dist/mermaid.min.js></script><style>:root{font-family:Inter,system-ui,Avenir,Helvetica,Arial,sans-serif;line-height:1.5;font-weight:400;--code-bg:rgb(245, 245, 245);background:var(--code-bg);font-synthesis:none;text-rendering:optimizeLegibility;-webkit-font-smoothing:antialiased;-moz-osx-font-smoothing:grayscale;-webkit-text-size-adjust:100%}body,html{height:100%;width:100%;background:var(--code-bg)}.alert{color:red;font-size:25px}*{box-sizing:border-box}.column{float:left;border:2px solid #000;border-radius:20px;height:85vh;margin:0 .25vw}.left{width:25vw;padding:10px}.right{padding:0;width:73vw}.row:after{display:table;clear:both}#lab-input{display:block;vertical-align:center;horiz-align:center}@media only screen and (max-width:1600px){.left,.right{width:95vw}.right{height:73vh;margin-top:1vh}.left{height:6vh}#input{width:0}header{font-size:1rem}#selector-btn{display:none}.tree{height:90%}}.tree{width:100%;height:80%;overflow:scroll}.tree::-webkit-scrollbar{width:10px;height:fit-content}.tree::-webkit-scrollbar-thumb{background:#7f7f7f;border:2px solid #000;border-radius:5px}.tree-panel{height:100%;width:100%}.tree-panel ul{list-style-type:none}.tree-panel .caret,.tree-panel .custom-control-input{cursor:pointer;user-select:none}.tree-panel .collapsed{display:none}.caret{font-style:normal;font-size:20px;margin-right:10px}.minimize:before{content:"-";margin-right:3px}.maximize:before{content:"+"}.fixed:before{content:"*";margin-right:15px}#output{height:100%;align-content:center;margin:0}#diagram{max-width:none!important;width:100%;height:100%}footer{padding:1rem}a{color:#000}a:active,a:hover,a:link,a:visited{text-decoration:none}header{font-size:2rem;font-weight:700;margin-bottom:10px}#diagram-title{position:absolute;left:50%;transform:translate(0,50%)}p.info,ul.info{text-align:left;font-size:1rem;font-weight:300}ul.info{list-style-type:decimal}.container{display:flex;justify-content:space-evenly}#diagram-title,#lab-input{font-size:20pt;text-align:center}#diagram-title,#lab-input,.alert,footer,header{text-align:center}</style><header>{{.Header}}</header><div class=row><div class="column left"id=in_col><label for=input id=lab-input>Select node</label><div id=selector-btn><hr><div class=container><button id=expand-all>Expand All</button> <button id=collapse-all>Collapse All</button></div><hr></div><div class=tree-panel id=input></div></div><div class="column right"id=out_col><div id=output></div></div></div><footer><p style=font-size:15px>Generated by <a href=https://github.com/kislerdm/pyarch target=_blank>pyarch</a> {{.When}}</p>{{.Footer}}</footer><script>const nodes={{.Nodes}},links={{.Links}};mermaid.initialize({theme:"default",dompurifyConfig:{USE_PROFILES:{svg:!0}},startOnLoad:!0,htmlLabels:!0,c4:{diagramMarginY:0}});class Router{#a;#b;#c;#d="q";constructor(){this.#b=window.location,this.#a=window.history,this.#c=this.#e(this.#f()[0])}updateRouteToNode(e){this.#a.pushState({},"",`${this.#c}?${this.#d}=${e}`)}readNodeIDFromRoute(){let e=this.#f();return e.length<2?"":e[1]}#f(){return this.#b.href.split(`${this.#d}=`)}#e(e){let t=e.slice(-1);return"?"!==t&&"/"!==t?e:this.#e(e.slice(0,-1))}}function selectLinks(e){let t=links.filter(t=>t.start===e||t.end===e);return 0===t.length?links.filter(t=>t.start.startsWith(e)||t.end.startsWith(e)):t}function convertID(e){return e.replaceAll(".","-")}function generateDiagram(e){let t=selectLinks(e);if(0===t.length)return"";let l=`classDiagram
-`;for(let i of t)l+=`${convertID(i.start)} ${i.arrow} ${convertID(i.end)}`,void 0!==i.description&&""!==i.description&&(l+=` : ${i.description}`),l+=`
-`;return l}const inputSelectedIdStyle="font-weight:bold;font-size:18px";function generateListDepth(e,t,l,i){if(0===e.length)return"";let n=l<i?"<ul>":'<ul class="collapsed">',s=l<i-1?"minimize":"maximize";for(let r of e){let a=r.id===t?`style=${inputSelectedIdStyle}`:"",o=`<span class="custom-control-input" id="${r.id}" ${a}>${r.name}</span>`,c=`<span class="caret ${s}"></span>`;void 0!==r.nodes&&r.nodes.length>0?n+=`<li>${c}${o}${generateListDepth(r.nodes,t,l+1,i)}</li>`:n+=`<li><span class="fixed"></span>${o}</li>`}return`${n}</ul>`}function generateList(e,t){return generateListDepth(e,t,0,2)}const router=new Router;let id=router.readNodeIDFromRoute();""===id&&(id=nodes[0].id);let prevSelectedId=id;const inputElements=document.getElementsByClassName("custom-control-input"),carets=document.getElementsByClassName("caret"),out=document.getElementById("output");async function draw(e){let t=generateDiagram(e);if(""===t){let l=`No data found for the input nodeID: ${e}`;out.innerHTML=`<h2 style="text-align:center;font-weight:bold;font-size:20pt;color:red">${l}</h2>`,console.error(l)}else try{let{svg:i}=await mermaid.render("diagram",t,out);out.innerHTML=i}catch(n){console.error(n.message)}}document.addEventListener("DOMContentLoaded",async function(){let e=document.getElementById("input");for(let t of(e.innerHTML=`<form class="tree" id="intputForm">${generateList(nodes,id)}</form>`,await draw(id),carets))t.addEventListener("click",()=>{t.parentElement.querySelector("ul").classList.toggle("collapsed"),t.classList.toggle("minimize"),t.classList.toggle("maximize")});for(let l of inputElements)l.addEventListener("click",async e=>{let t=e.target.id;await draw(t),resetDefaultStyleInputElement(prevSelectedId),l.setAttribute("style",inputSelectedIdStyle),prevSelectedId=t,router.updateRouteToNode(t),isMobileDevice()&&(hideInputPanel(),isClickedSelectorLabel=!1)})});const btnExpandAll=document.getElementById("expand-all");btnExpandAll.addEventListener("click",function(){for(let e of document.getElementsByClassName("caret"))e.parentElement.querySelector("ul").classList.remove("collapsed"),e.classList.remove("maximize"),e.classList.add("minimize")});const btnCollapseAll=document.getElementById("collapse-all");function resetDefaultStyleInputElement(e){for(let t of inputElements)t.id===e&&t.setAttribute("style","")}btnCollapseAll.addEventListener("click",function(){for(let e of document.getElementsByClassName("caret"))e.parentElement.querySelector("ul").classList.add("collapsed"),e.classList.remove("minimize"),e.classList.add("maximize")});let isClickedSelectorLabel=!1;const selectorLabel=document.getElementById("lab-input");function showInputPanel(){let e=document.getElementById("in_col");e.setAttribute("style","height:70vh");let t=document.getElementById("input");t.setAttribute("style","width:100%");let l=document.getElementById("selector-btn");l.setAttribute("style","display:block")}function hideInputPanel(){let e=document.getElementById("in_col");e.setAttribute("style","height:6vh");let t=document.getElementById("input");t.setAttribute("style","width:0");let l=document.getElementById("selector-btn");l.setAttribute("style","display:none")}function isMobileDevice(){return window.screen.availWidth<=1600}selectorLabel.addEventListener("click",()=>{isMobileDevice()&&(isClickedSelectorLabel?(hideInputPanel(),isClickedSelectorLabel=!1):(showInputPanel(),isClickedSelectorLabel=!0))});</script></body></html>"""
+    Args:
+        puml: PUML DSL as a string, or as an iterable of lines, e.g. a file object.
 
-        footer = self.cfg.footer if self.cfg.footer != "" else WebpageConfig.footer
-        return (
-            template.replace("{{.Nodes}}", self.nodes.to_json())
-            .replace("{{.Links}}", self.links.to_json())
-            .replace("{{.Title}}", self.cfg.title)
-            .replace("{{.Header}}", self.cfg.header)
-            .replace("{{.Footer}}", footer)
-            .replace("{{.When}}", f" on {now_utc()}")
-        )
+    Yields:
+        Link objects in the order of their definition.
+    """
+    for line in _iter_lines(puml):
+        if _is_relation(line):
+            yield Link(line.rstrip("\r\n"))
 
 
-def main(puml_packages: str, puml_classes: str, webpage_cfg: WebpageConfig) -> str:
-    """Main runner.
+def parse_links(*pumls: PumlSource) -> Links:
+    """Parses the PUML DSL definitions into the deduplicated links.
 
     Args:
-        puml_packages: PUML DSL definition packages relations.
-        puml_classes: PUML DSL definition classes relations.
-        webpage_cfg: Page templating configuration.
+        pumls: PUML DSL definitions as strings, or as iterables of lines.
 
     Returns:
-        HTML page.
+        Deduplicated links in the order of the first occurrence.
+    """
+    links = Links()
+    for puml in pumls:
+        links.extend(iter_links(puml))
+    return links
+
+
+class Class:
+    """Class declared in the PUML DSL with its members.
+
+    Args:
+        id: Class id used in the relations, i.e. the alias after the keyword 'as'.
+        label: Class label, i.e. the quoted name.
+        kind: Declaration keyword, e.g. 'class', or 'interface'.
+        stereotype: Stereotype without the angle brackets, e.g. 'dataclass'.
+        attributes: Attributes in the PUML DSL notation, e.g. 'name : str'.
+        methods: Methods in the PUML DSL notation, e.g. '{abstract}run(x) -> int'.
+    """
+
+    __slots__ = ("id", "label", "kind", "stereotype", "attributes", "methods")
+
+    def __init__(
+        self,
+        id: str,
+        label: str = "",
+        kind: str = "class",
+        stereotype: str = "",
+        attributes: Tuple[str, ...] = (),
+        methods: Tuple[str, ...] = (),
+    ) -> None:
+        self.id = id
+        self.label = label or id
+        self.kind = kind
+        self.stereotype = stereotype
+        self.attributes = attributes
+        self.methods = methods
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Class):
+            return NotImplemented
+        return all(getattr(self, el) == getattr(other, el) for el in Class.__slots__)
+
+    def __repr__(self) -> str:
+        return "Class(%s)" % ", ".join("%s=%r" % (el, getattr(self, el)) for el in Class.__slots__)
+
+    def to_mermaid_members(self) -> List[str]:
+        """Returns the members in the mermaid classDiagram notation."""
+        return [_mermaid_member(el) for el in (*self.attributes, *self.methods)]
+
+
+def _mermaid_member(member: str) -> str:
+    suffix = ""
+    if member.startswith("{abstract}"):
+        member, suffix = member[len("{abstract}") :], "*"
+    elif member.startswith("{static}"):
+        member, suffix = member[len("{static}") :], "$"
+
+    if "(" in member:
+        member = member.replace(" -> ", " ", 1)
+
+    return member.replace("{", "").replace("}", "") + suffix
+
+
+class Classes:
+    """Table of the classes declared in the PUML DSL keyed by the interned class id."""
+
+    __slots__ = ("_rows",)
+
+    def __init__(self, classes: Iterable[Class] = ()) -> None:
+        self._rows: Dict[str, Class] = {}
+        for el in classes:
+            self.add(el)
+
+    def add(self, other: Class) -> None:
+        """Adds the class, the members of the class declared earlier with the same id are extended."""
+        row = self._rows.get(other.id)
+        if row is None:
+            self._rows[sys.intern(other.id)] = other
+            return
+
+        row.attributes += tuple(el for el in other.attributes if el not in row.attributes)
+        row.methods += tuple(el for el in other.methods if el not in row.methods)
+        row.stereotype = row.stereotype or other.stereotype
+
+    def get(self, id: str) -> Optional[Class]:
+        return self._rows.get(id)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __iter__(self) -> Iterator[Class]:
+        return iter(self._rows.values())
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Classes):
+            return NotImplemented
+        return self._rows == other._rows
+
+    def to_members(self) -> Dict[str, List[str]]:
+        """Returns the members of the classes which have any in the mermaid classDiagram notation."""
+        return {el.id: el.to_mermaid_members() for el in self if el.attributes or el.methods}
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_members())
+
+
+_PUML_TOKENS = re.compile(
+    r'\s*(?:(?P<string>"[^"]*")|(?P<stereotype><<[^>]*>>)|(?P<color>#\S+)|(?P<brace>[{}])|(?P<word>[^\s{}"]+))'
+)
+
+_PUML_DECLARATIONS = frozenset(("class", "interface", "enum", "annotation", "entity", "package"))
+
+
+def _tokenize(line: str) -> Iterator[Tuple[str, str]]:
+    """Splits the line of PUML DSL into the tokens (kind, value)."""
+    pos, end = 0, len(line)
+    while pos < end:
+        match = _PUML_TOKENS.match(line, pos)
+        if match is None or match.end() == pos:
+            return
+        pos = match.end()
+        kind = match.lastgroup
+        if kind is not None:
+            yield kind, match.group(kind)
+
+
+class PumlParser:
+    """Parser of the PlantUML DSL generated by pyreverse.
+
+    Relations are collected into the deduplicated links; declarations of classes with their stereotypes, attributes
+    and methods are collected into the classes table. The input is consumed line by line.
+
+    Example:
+        parser = PumlParser()
+        parser.feed(puml_packages)
+        parser.feed(puml_classes)
+        links, classes = parser.links, parser.classes
     """
-    links: Links = Links([])
 
-    dsl_puml = [*puml_packages.split("\n"), *puml_classes.split("\n")]
+    __slots__ = ("links", "classes", "_in_block", "_class", "_attributes", "_methods")
+
+    def __init__(self) -> None:
+        self.links = Links()
+        self.classes = Classes()
+        self._in_block = False
+        self._class: Optional[Class] = None
+        self._attributes: List[str] = []
+        self._methods: List[str] = []
+
+    def feed(self, puml: PumlSource) -> None:
+        """Parses the PUML DSL.
+
+        Args:
+            puml: PUML DSL as a string, or as an iterable of lines, e.g. a file object.
+        """
+        for line in _iter_lines(puml):
+            self.feed_line(line)
+
+    def feed_line(self, line: str) -> None:
+        line = line.rstrip("\r\n")
+
+        if self._in_block:
+            member = line.strip()
+            if member == "}":
+                self._close()
+            elif member != "":
+                (self._methods if "(" in member else self._attributes).append(sys.intern(member))
+            return
 
-    for line in dsl_puml:
         if _is_relation(line):
-            links.append(Link(line))
+            self.links.append(Link(line))
+            return
 
-    links_deduplicated = links.deduplicate()
-    nodes = links_deduplicated.get_nodes()
+        tokens = list(_tokenize(line))
+        if len(tokens) < 2 or tokens[0][0] != "word":
+            return
 
-    webpage_generator = WebpageGenerator(nodes, links_deduplicated, webpage_cfg)
+        if tokens[0][1] == "abstract":
+            tokens = tokens[1:] if tokens[1][1] == "class" else [("word", "class"), *tokens[1:]]
 
-    return webpage_generator()
+        if tokens[0][1] in _PUML_DECLARATIONS:
+            self._declare(tokens)
 
+    def _declare(self, tokens: List[Tuple[str, str]]) -> None:
+        kind = tokens[0][1]
+        label, id, stereotype = "", "", ""
 
-def get_args() -> argparse.Namespace:
-    """Parses stdin arguments."""
-    parser = argparse.ArgumentParser(
-        prog="pyarch",
-        usage="""pyarch: generates HTML with dynamic classDiagram based on the pyreverse PUML DSL.
+        i = 1
+        while i < len(tokens):
+            token_kind, value = tokens[i]
+            if token_kind == "string":
+                label = value[1:-1]
+            elif token_kind == "word" and value == "as" and i + 1 < len(tokens):
+                i += 1
+                id = tokens[i][1].strip('"')
+            elif token_kind == "word" and id == "" and label == "":
+                label = value
+            elif token_kind == "stereotype":
+                stereotype = value[2:-2].strip()
+            elif token_kind == "brace":
+                self._in_block = value == "{"
+            i += 1
 
-Ref:
-- https://www.bhavaniravi.com/python/generate-uml-diagrams-from-python-code
-- https://mermaid.js.org/syntax/classDiagram.html
+        # the package's block is consumed without collecting members
+        self._class = None if kind == "package" else Class(id or label, label, kind, stereotype)
+        if not self._in_block:
+            self._close()
 
-Usage example:
+    def _close(self) -> None:
+        if self._class is not None:
+            self._class.attributes, self._class.methods = tuple(self._attributes), tuple(self._methods)
+            self.classes.add(self._class)
 
-cd superduperdb
-pyreverse -Akmy -o puml . --ignore=test,tests
-./pyarch.py --input . --output index.html""",
-    )
-    parser.add_argument("-i", "--input", required=True, type=str, help="Directory with {classes,packages}.puml files.")
-    parser.add_argument("-o", "--output", required=True, type=str, help="Directory to output index.html file.")
-    parser.add_argument("-v", "--verbose", required=False, default=False, action="store_true", help="Verbosity.")
-    parser.add_argument("--title", required=False, type=str, default=WebpageConfig.title, help="Custom page title.")
-    parser.add_argument(
-        "--header", required=False, type=str, default=WebpageConfig.header, help="Custom header string."
-    )
-    parser.add_argument(
-        "--footer",
-        required=False,
-        type=str,
-        default=WebpageConfig.footer,
-        help="Custom footer as HTML encoded string.",
-    )
-    return parser.parse_args()
+        self._in_block = False
+        self._class = None
+        self._attributes, self._methods = [], []
 
 
-logging.basicConfig(format="%(asctime)s [%(levelname)s] %(message)s", level=logging.INFO)
-_LOGS = logging.getLogger("pyarch")
+class Cache:
+    """Content-addressed on-disk cache of the parsed inputs.
 
+    The entries are keyed by the hash of the input content and the pyarch version, the least recently used entries
+    are evicted when the cache exceeds its size. The entries are written atomically, hence the cache can be shared by
+    parallel runs: a concurrently evicted, or a partially written entry is a cache miss.
 
-def read_input_puml(path: str) -> str:
-    """Reads input file.
+    Args:
+        path: Cache directory.
+        max_bytes: Maximum size of the cache.
+    """
+
+    def __init__(self, path: str = ".pyarch/cache", max_bytes: int = 512 * 2**20) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(*parts: Union[str, bytes]) -> str:
+        """Returns the entry key given the content it depends on."""
+        import hashlib
+
+        o = hashlib.sha256(__version__.encode())
+        for el in parts:
+            o.update(b"\0")
+            o.update(el.encode() if isinstance(el, str) else el)
+        return o.hexdigest()
+
+    @staticmethod
+    def file_key(kind: str, path: str) -> str:
+        """Returns the entry key given the file content."""
+        import hashlib
+
+        o = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(2**20), b""):
+                o.update(chunk)
+        return Cache.key(kind, o.digest())
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.path, key[:2], key)
+
+    def get(self, key: str) -> Optional[Any]:
+        """Reads the entry.
+
+        Returns:
+            Entry's value, or None if the entry is not found, or cannot be read.
+        """
+        path = self._entry_path(key)
+        try:
+            with open(path, "rb") as f:
+                o = json.loads(f.read())
+            os.utime(path)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return o
+
+    def put(self, key: str, value: Any) -> None:
+        """Writes the entry, the cache size is checked by evict()."""
+        path = self._entry_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            import tempfile
+
+            fd, path_tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+            with os.fdopen(fd, "wb") as f:
+                f.write(json.dumps(value, separators=(",", ":")).encode())
+            os.replace(path_tmp, path)
+        except OSError as ex:
+            _LOGS.warning("cache: cannot write %s: %s" % (path, ex))
+
+    def evict(self) -> None:
+        """Removes the least recently used entries until the cache fits its size.
+
+        The cache directory is scanned, hence the method is expected to be called once the entries are written.
+        """
+        entries = []
+        for dirpath, _, filenames in os.walk(self.path):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        size = sum(el[1] for el in entries)
+        for _, entry_size, path in sorted(entries):
+            if size <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            size -= entry_size
+
+
+_PUML_CHUNK_STARTS = (b"@", b"class ", b"package ", b"interface ", b"abstract ", b"enum ")
+
+# class row of the chunk table: (id, label, kind, stereotype, attributes, methods)
+_ClassRow = Tuple[str, str, str, str, Tuple[str, ...], Tuple[str, ...]]
+
+
+def _is_chunk_start(line: bytes) -> bool:
+    """Checks if the chunk can start with the line: the line must not belong to a class' block."""
+    return line.startswith(_PUML_CHUNK_STARTS) or (line[:1] not in (b" ", b"\t", b"}") and b" --" in line)
+
+
+def chunk_puml_file(path: str, chunks: int) -> List[Tuple[int, int]]:
+    """Splits the PUML file into byte ranges at the lines' boundaries outside the classes' blocks.
 
     Args:
         path: Path to file.
+        chunks: Desired number of chunks.
 
     Returns:
-        File content.
+        Byte ranges [start, end) which cover the file.
+    """
+    size = os.path.getsize(path)
+    if size == 0:
+        return []
+
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        o: List[Tuple[int, int]] = []
+        start = 0
+        for i in range(1, chunks):
+            pos = max(size * i // chunks, start)
+            # the chunk starts at the first line after the position which is outside the classes' blocks
+            while True:
+                eol = mm.find(b"\n", pos)
+                if eol == -1:
+                    pos = size
+                    break
+                pos = eol + 1
+                eol = mm.find(b"\n", pos)
+                if _is_chunk_start(mm[pos : size if eol == -1 else eol]):
+                    break
+            if pos >= size:
+                break
+            if pos > start:
+                o.append((start, pos))
+                start = pos
+        o.append((start, size))
+
+    return o
+
+
+# chunk table: the strings' table, the links as flat quadruples of the strings' indices, the classes
+_PumlTable = Tuple[List[str], "array.array[int]", List[_ClassRow]]
+
+
+def _puml_table(parser: PumlParser) -> _PumlTable:
+    strings: Dict[str, int] = {}
+    links = array.array("i")
+    for link in parser.links:
+        for el in link.key:
+            links.append(strings.setdefault(el, len(strings)))
+
+    classes = [(el.id, el.label, el.kind, el.stereotype, el.attributes, el.methods) for el in parser.classes]
+    return list(strings), links, classes
+
+
+def _merge_puml_table(parser: PumlParser, table: _PumlTable) -> None:
+    strings, links, classes = table
+    for i in range(0, len(links), 4):
+        parser.links.append(
+            Link.from_parts(strings[links[i]], strings[links[i + 1]], strings[links[i + 2]], strings[links[i + 3]])
+        )
+    for row in classes:
+        parser.classes.add(Class(*row))
+
+
+def _encode_puml_tables(tables: List[_PumlTable]) -> List[Any]:
+    return [[strings, links.tolist(), classes] for strings, links, classes in tables]
+
+
+def _decode_puml_tables(value: List[Any]) -> List[_PumlTable]:
+    return [
+        (
+            strings,
+            array.array("i", links),
+            [(row[0], row[1], row[2], row[3], tuple(row[4]), tuple(row[5])) for row in classes],
+        )
+        for strings, links, classes in value
+    ]
+
+
+def _parse_puml_chunk(path: str, start: int, end: int) -> _PumlTable:
+    """Parses the byte range of the PUML file into the compact chunk table."""
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        text = mm[start:end].decode()
+
+    parser = PumlParser()
+    parser.feed(io.StringIO(text, newline=None))
+    return _puml_table(parser)
+
+
+def parse_puml_files(paths: Iterable[str], jobs: int = 1, cache: Optional[Cache] = None) -> Tuple[Links, Classes]:
+    """Parses the PUML files, optionally in parallel and using the cache.
+
+    The files are memory-mapped and split into chunks which are parsed in the process pool. The chunks' tables are
+    merged in the order of the chunks, hence the result is identical to parsing the files sequentially.
+    The chunks' tables of the files are cached by the files' content, only the changed files are parsed.
+
+    Args:
+        paths: Paths to files.
+        jobs: Number of worker processes, the files are parsed in the current process if jobs < 2.
+        cache: Cache of the parsed files.
+
+    Returns:
+        Deduplicated links and the classes table.
 
     Raises:
         FileNotFoundError: raised when the file is not found.
         IOError: raised upon reading error.
     """
-    if not isfile(path):
-        raise FileNotFoundError("file %s not found" % path)
+    paths = list(paths)
+    for path in paths:
+        if not isfile(path):
+            raise FileNotFoundError("file %s not found" % path)
+
+    parser = PumlParser()
+    if jobs < 2 and cache is None:
+        for path in paths:
+            parser.feed(iter_input_puml(path))
+        return parser.links, parser.classes
 
     try:
-        with open(path, "r") as f:
-            return f.read()
-    except Exception as ex:
-        raise IOError(ex) from ex
+        keys = [Cache.file_key("puml", path) if cache is not None else "" for path in paths]
+        tables: List[List[_PumlTable]] = []
+        missing: List[int] = []
+        for i, key in enumerate(keys):
+            value = cache.get(key) if cache is not None else None
+            if value is None:
+                missing.append(i)
+                tables.append([])
+            else:
+                tables.append(_decode_puml_tables(value))
 
+        # the files parsed in the current process are merged from their parsers, the tables are built to be cached only
+        parsers: Dict[int, PumlParser] = {}
+        if jobs < 2:
+            for i in missing:
+                parsers[i] = PumlParser()
+                parsers[i].feed(iter_input_puml(paths[i]))
+                if cache is not None:
+                    tables[i].append(_puml_table(parsers[i]))
+        elif missing:
+            tasks = [(i, start, end) for i in missing for start, end in chunk_puml_file(paths[i], jobs * 4)]
+            import concurrent.futures
 
-def print_version():
-    """Prints version to stdout."""
-    __version__ = "0.0.2"
-    print("version: %s" % __version__)
-    exit(0)
+            with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+                futures = [executor.submit(_parse_puml_chunk, paths[i], start, end) for i, start, end in tasks]
+                for (i, _, _), future in zip(tasks, futures):
+                    tables[i].append(future.result())
 
+        if cache is not None and missing:
+            for i in missing:
+                cache.put(keys[i], _encode_puml_tables(tables[i]))
+            cache.evict()
 
-if __name__ == "__main__":
-    if sys.argv[-1].endswith("--version"):
-        print_version()
+        for i, file_tables in enumerate(tables):
+            if i in parsers:
+                parser.links.extend(parsers[i].links)
+                for el in parsers[i].classes:
+                    parser.classes.add(el)
+                continue
+            for table in file_tables:
+                _merge_puml_table(parser, table)
+    except (OSError, ValueError) as ex:
+        raise IOError(ex) from ex
 
-    args = get_args()
+    return parser.links, parser.classes
 
-    path_classes_puml = f"{args.input}/classes.puml"
-    path_packages_puml = f"{args.input}/packages.puml"
 
-    puml_packages: str = ""
-    puml_classes: str = ""
+@dataclasses.dataclass
+class ClassSummary:
+    """Class extracted from the python source.
 
-    if args.verbose:
-        _LOGS.info("reading %s" % path_classes_puml)
-    try:
-        puml_classes = read_input_puml(path_classes_puml)
-    except FileNotFoundError as ex:
-        _LOGS.warning(ex)
-    except IOError as ex:
-        _LOGS.error(ex)
-        exit(1)
+    Args:
+        name: Class name qualified within its module, e.g. 'Outer.Inner'.
+        bases: Base classes' names as written in the source, e.g. 'abc.ABC'.
+        associations: Tuples (arrow, type name as written in the source, attribute name).
+        attributes: Attributes in the PUML DSL notation, e.g. 'name : str'.
+        methods: Methods in the PUML DSL notation, e.g. '{abstract}run(x: int) -> int'.
+    """
 
-    if args.verbose:
-        _LOGS.info("reading %s" % path_packages_puml)
-    try:
-        puml_packages = read_input_puml(path_packages_puml)
-    except FileNotFoundError as ex:
-        _LOGS.warning(ex)
-    except IOError as ex:
-        _LOGS.error(ex)
-        exit(1)
+    name: str
+    bases: List[str] = dataclasses.field(default_factory=list)
+    associations: List[Tuple[str, str, str]] = dataclasses.field(default_factory=list)
+    attributes: List[str] = dataclasses.field(default_factory=list)
+    methods: List[str] = dataclasses.field(default_factory=list)
 
-    if puml_classes == "" and puml_packages == "":
-        _LOGS.error("no required inputs found")
-        exit(1)
 
-    if args.verbose:
-        _LOGS.info("generating report files")
+@dataclasses.dataclass
+class ModuleSummary:
+    """Module extracted from the python source, it depends on the module's source and name only.
 
-    html = main(
-        puml_packages=puml_packages,
-        puml_classes=puml_classes,
-        webpage_cfg=WebpageConfig(title=args.title, header=args.header, footer=args.footer),
+    Args:
+        module: Module's dotted name.
+        imports: Imported dotted names, i.e. modules, or their attributes.
+        names: Mapping of the names bound by the imports to the imported dotted names.
+        classes: Classes defined in the module.
+    """
+
+    module: str
+    imports: List[str] = dataclasses.field(default_factory=list)
+    names: Dict[str, str] = dataclasses.field(default_factory=dict)
+    classes: List[ClassSummary] = dataclasses.field(default_factory=list)
+
+    @staticmethod
+    def from_dict(o: Dict[str, Any]) -> "ModuleSummary":
+        """Creates a new ModuleSummary object given its dict representation, e.g. dataclasses.asdict output."""
+        classes = []
+        for el in o["classes"]:
+            cls = ClassSummary(**el)
+            cls.associations = [(arrow, type_name, attribute) for arrow, type_name, attribute in cls.associations]
+            classes.append(cls)
+        return ModuleSummary(o["module"], o["imports"], o["names"], classes)
+
+
+def _dotted_name(node: ast.AST) -> str:
+    """Returns the dotted name of the Name/Attribute expression, or an empty string."""
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        prefix = _dotted_name(node.value)
+        return f"{prefix}.{node.attr}" if prefix else ""
+    return ""
+
+
+def _annotation_names(node: Optional[ast.AST]) -> List[str]:
+    """Returns the dotted names referenced by the type annotation, e.g. ['Foo', 'Bar'] for Optional[Union[Foo, Bar]]."""
+    if node is None:
+        return []
+
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        try:
+            return _annotation_names(ast.parse(node.value, mode="eval").body)
+        except SyntaxError:
+            return []
+
+    name = _dotted_name(node)
+    if name:
+        return [name]
+
+    o: List[str] = []
+    if isinstance(node, ast.Subscript):
+        # the container, e.g. Optional, or List is not an association
+        o.extend(_annotation_names(node.slice))
+    elif isinstance(node, (ast.Tuple, ast.List)):
+        for el in node.elts:
+            o.extend(_annotation_names(el))
+    elif isinstance(node, ast.BinOp):
+        o.extend(_annotation_names(node.left))
+        o.extend(_annotation_names(node.right))
+    elif sys.version_info < (3, 9) and isinstance(node, ast.Index):  # pragma: no cover
+        o.extend(_annotation_names(node.value))  # type: ignore
+    return o
+
+
+def _is_abstract(node: Union[ast.FunctionDef, ast.AsyncFunctionDef]) -> bool:
+    return any(_dotted_name(el).split(".")[-1] == "abstractmethod" for el in node.decorator_list)
+
+
+class _ModuleVisitor(ast.NodeVisitor):
+    """Extracts the imports and classes of a module."""
+
+    def __init__(self, module: str, is_package: bool, source: str) -> None:
+        self.summary = ModuleSummary(module)
+        self._package = module if is_package else module.rpartition(".")[0]
+        # the lines are encoded once: the columns' offsets are in bytes, ast.get_source_segment splits per call
+        self._lines = [el.encode() for el in source.split("\n")]
+        self._scope: List[str] = []
+
+    def _segment(self, node: Optional[ast.expr]) -> str:
+        """Returns the source code of the expression."""
+        if node is None or node.end_lineno is None or node.end_col_offset is None:
+            return ""
+
+        start, end = node.lineno - 1, node.end_lineno - 1
+        if start == end:
+            return self._lines[start][node.col_offset : node.end_col_offset].decode()
+
+        o = [
+            self._lines[start][node.col_offset :],
+            *self._lines[start + 1 : end],
+            self._lines[end][: node.end_col_offset],
+        ]
+        return b"\n".join(o).decode()
+
+    def visit_Import(self, node: ast.Import) -> None:
+        for alias in node.names:
+            self.summary.imports.append(alias.name)
+            if alias.asname:
+                self.summary.names[alias.asname] = alias.name
+            else:
+                root = alias.name.split(".")[0]
+                self.summary.names[root] = root
+
+    def visit_ImportFrom(self, node: ast.ImportFrom) -> None:
+        base = node.module or ""
+        if node.level > 0:
+            package = self._package.split(".")
+            package = package[: len(package) - node.level + 1] if node.level > 1 else package
+            base = ".".join(el for el in (*package, base) if el)
+
+        for alias in node.names:
+            if alias.name == "*":
+                self.summary.imports.append(base)
+                continue
+            name = f"{base}.{alias.name}" if base else alias.name
+            self.summary.imports.append(name)
+            self.summary.names[alias.asname or alias.name] = name
+
+    def visit_ClassDef(self, node: ast.ClassDef) -> None:
+        self._scope.append(node.name)
+        cls = ClassSummary(".".join(self._scope))
+        self.summary.classes.append(cls)
+
+        for base in node.bases:
+            name = _dotted_name(base)
+            if name:
+                cls.bases.append(name)
+
+        attributes: Dict[str, str] = {}
+        for el in node.body:
+            if isinstance(el, ast.AnnAssign) and isinstance(el.target, ast.Name):
+                attributes[el.target.id] = self._segment(el.annotation)
+                for type_name in _annotation_names(el.annotation):
+                    cls.associations.append(("--*", type_name, el.target.id))
+            elif isinstance(el, ast.Assign):
+                for target in el.targets:
+                    if isinstance(target, ast.Name):
+                        attributes.setdefault(target.id, "")
+            elif isinstance(el, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                cls.methods.append(self._method(el))
+                self._instance_attributes(el, cls, attributes)
+            elif isinstance(el, ast.ClassDef):
+                self.visit_ClassDef(el)
+
+        cls.attributes = [f"{k} : {v}" if v else k for k, v in attributes.items()]
+        self._scope.pop()
+
+    def _method(self, node: Union[ast.FunctionDef, ast.AsyncFunctionDef]) -> str:
+        args = [*node.args.posonlyargs, *node.args.args, *node.args.kwonlyargs]
+        if args and args[0].arg in ("self", "cls"):
+            args = args[1:]
+        o = "{abstract}" if _is_abstract(node) else ""
+        o += f"{node.name}({', '.join(self._argument(el) for el in args)})"
+        if node.returns is not None:
+            o += f" -> {self._segment(node.returns)}"
+        return o
+
+    def _argument(self, node: ast.arg) -> str:
+        return f"{node.arg}: {self._segment(node.annotation)}" if node.annotation else node.arg
+
+    def _instance_attributes(
+        self, node: Union[ast.FunctionDef, ast.AsyncFunctionDef], cls: ClassSummary, attributes: Dict[str, str]
+    ) -> None:
+        """Collects the attributes assigned to self: instantiation is composition, annotation is aggregation."""
+        args = {el.arg: el.annotation for el in (*node.args.posonlyargs, *node.args.args, *node.args.kwonlyargs)}
+        for el in ast.walk(node):
+            targets: List[ast.expr]
+            if isinstance(el, ast.AnnAssign):
+                targets, value, annotation = [el.target], el.value, el.annotation
+            elif isinstance(el, ast.Assign):
+                targets, value, annotation = el.targets, el.value, None
+            else:
+                continue
+
+            for target in targets:
+                if not (
+                    isinstance(target, ast.Attribute)
+                    and isinstance(target.value, ast.Name)
+                    and target.value.id == "self"
+                ):
+                    continue
+
+                if isinstance(value, ast.Call) and _dotted_name(value.func):
+                    attributes.setdefault(target.attr, _dotted_name(value.func))
+                    cls.associations.append(("--*", _dotted_name(value.func), target.attr))
+                    continue
+
+                if annotation is None and isinstance(value, ast.Name) and args.get(value.id) is not None:
+                    annotation = args[value.id]
+                attributes.setdefault(target.attr, self._segment(annotation))
+                for type_name in _annotation_names(annotation):
+                    cls.associations.append(("--o", type_name, target.attr))
+
+    def generic_visit(self, node: ast.AST) -> None:
+        # classes and imports in functions' bodies are skipped, the same as pyreverse does
+        if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda)):
+            super().generic_visit(node)
+
+
+def summarize_module(module: str, source: str, is_package: bool = False) -> ModuleSummary:
+    """Extracts the imports and classes of the module from its source.
+
+    Args:
+        module: Module's dotted name.
+        source: Module's python source code.
+        is_package: True if the source is the package's __init__.py.
+
+    Returns:
+        Module summary.
+
+    Raises:
+        SyntaxError: raised when the source cannot be parsed.
+    """
+    source = source.replace("\r\n", "\n").replace("\r", "\n")
+    visitor = _ModuleVisitor(module, is_package, source)
+    visitor.visit(ast.parse(source))
+    return visitor.summary
+
+
+def iter_source_modules(path: str, ignore: Iterable[str] = ()) -> Iterator[Tuple[str, str, bool]]:
+    """Walks the package's directory in a deterministic order.
+
+    Args:
+        path: Package directory, or a directory with packages and modules.
+        ignore: Base names of the files and directories to skip.
+
+    Yields:
+        Tuples (module's dotted name, path to the module's file, is the module a package's __init__.py).
+    """
+    ignored = set(ignore)
+    for dirpath, modules in _iter_source_dirs(path, ignored):
+        yield from modules
+
+
+def _iter_source_dirs(path: str, ignored: Set[str]) -> Iterator[Tuple[str, List[Tuple[str, str, bool]]]]:
+    """Walks the package's directory, yields the directories' paths with their modules."""
+    root = os.path.abspath(path)
+    prefix = os.path.basename(root) if isfile(os.path.join(root, "__init__.py")) else ""
+
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(el for el in dirnames if el not in ignored and not el.startswith("."))
+        package = os.path.relpath(dirpath, root).replace(os.sep, ".")
+        package = ".".join(el for el in (prefix, "" if package == "." else package) if el)
+
+        modules = []
+        for filename in sorted(filenames):
+            if not filename.endswith(".py") or filename in ignored or filename[:-3] in ignored:
+                continue
+            if filename == "__init__.py":
+                if package:
+                    modules.append((package, os.path.join(dirpath, filename), True))
+                continue
+            name = filename[:-3]
+            modules.append((f"{package}.{name}" if package else name, os.path.join(dirpath, filename), False))
+        yield dirpath, modules
+
+
+def link_modules(summaries: Iterable[ModuleSummary]) -> Tuple[Links, Classes]:
+    """Resolves the modules' imports and classes into the relations.
+
+    The packages' relations precede the classes' relations, the same as for the pyreverse PUML inputs.
+
+    Args:
+        summaries: Modules' summaries.
+
+    Returns:
+        Deduplicated links and the classes table.
+    """
+    summaries = list(summaries)
+    modules = {el.module for el in summaries}
+    class_ids = {f"{el.module}.{cls.name}" for el in summaries for cls in el.classes}
+
+    package_links = Links()
+    for summary in summaries:
+        package_links.extend(_link_module_imports(summary, modules))
+
+    links = Links()
+    classes = Classes()
+    for summary in summaries:
+        links.extend(_link_module_classes(summary, class_ids))
+        for el in _module_classes(summary):
+            classes.add(el)
+
+    package_links.extend(links)
+    return package_links, classes
+
+
+def _link_module_imports(summary: ModuleSummary, modules: Set[str]) -> List[Link]:
+    o = []
+    for name in summary.imports:
+        target = name if name in modules else name.rpartition(".")[0]
+        if target in modules and target != summary.module:
+            o.append(Link.from_parts(summary.module, "-->", target))
+    return o
+
+
+def _module_classes(summary: ModuleSummary) -> List[Class]:
+    return [
+        Class(f"{summary.module}.{cls.name}", attributes=tuple(cls.attributes), methods=tuple(cls.methods))
+        for cls in summary.classes
+    ]
+
+
+def _link_module_classes(summary: ModuleSummary, class_ids: Set[str]) -> List[Link]:
+    def _resolve(name: str, scope: str) -> str:
+        # lookup order: the enclosing classes, the module's classes, the imported names, the builtins
+        while True:
+            candidate = f"{summary.module}.{scope}.{name}" if scope else f"{summary.module}.{name}"
+            if candidate in class_ids:
+                return candidate
+            if not scope:
+                break
+            scope = scope.rpartition(".")[0]
+
+        head, _, tail = name.partition(".")
+        if head in summary.names:
+            return f"{summary.names[head]}.{tail}" if tail else summary.names[head]
+        # the implicit base 'object' is omitted, the same as pyreverse does
+        if not tail and head != "object" and isinstance(getattr(builtins, head, None), type):
+            return f"builtins.{head}"
+        return ""
+
+    o = []
+    for cls in summary.classes:
+        cls_id = f"{summary.module}.{cls.name}"
+        scope = cls.name.rpartition(".")[0]
+
+        for base in cls.bases:
+            base_id = _resolve(base, scope)
+            if base_id:
+                o.append(Link.from_parts(cls_id, "--|>", base_id))
+
+        for arrow, type_name, attribute in cls.associations:
+            type_id = _resolve(type_name, scope)
+            # associations are limited to the analysed classes to omit the built-in types, e.g. str
+            if type_id in class_ids:
+                o.append(Link.from_parts(type_id, arrow, cls_id, attribute))
+    return o
+
+
+def analyze_source(path: str, ignore: Iterable[str] = (), cache: Optional[Cache] = None) -> Tuple[Links, Classes]:
+    """Analyses the python package in-process using the stdlib ast module.
+
+    Args:
+        path: Package directory, or a directory with packages and modules.
+        ignore: Base names of the files and directories to skip, e.g. 'tests'.
+        cache: Cache of the modules' summaries, only the changed modules are analysed.
+
+    Returns:
+        Deduplicated links and the classes table.
+
+    Raises:
+        IOError: raised upon reading error.
+    """
+    summaries = []
+    for module, path_module, is_package in iter_source_modules(path, ignore):
+        try:
+            with open(path_module, "rb") as f:
+                source = f.read()
+        except Exception as ex:
+            raise IOError(ex) from ex
+
+        key = Cache.key("source", module, str(is_package), source) if cache is not None else ""
+        value = cache.get(key) if cache is not None else None
+        if value is not None:
+            summaries.append(ModuleSummary.from_dict(value))
+            continue
+
+        try:
+            summary = summarize_module(module, source.decode("utf-8", errors="replace"), is_package)
+        except SyntaxError as ex:
+            _LOGS.warning("skip %s: %s" % (path_module, ex))
+            continue
+
+        summaries.append(summary)
+        if cache is not None:
+            cache.put(key, dataclasses.asdict(summary))
+
+    if cache is not None and cache.misses > 0:
+        cache.evict()
+
+    return link_modules(summaries)
+
+
+@dataclasses.dataclass
+class WebpageConfig:
+    title: str = "Python package architecture"
+    header: str = "Python package architecture"
+    footer: str = """<p style="font-size:15px">Built with ❤️ by <a href=https://www.dkisler.com target=_blank>Dmitry Kisler - dkisler.com</a></p>"""
+
+
+def now_utc() -> str:
+    return time.strftime("%Y-%m-%d %H:%M:%S GMT", time.gmtime())
+
+
+_TEMPLATE = """<!doctypehtml><html lang=en><title>{{.Title}}</title><meta content="width=device-width,initial-scale=1"name=viewport><meta charset=UTF-8><script src=https://cdn.jsdelivr.net/npm/mermaid@10.3.1/dist/mermaid.min.js></script><style>:root{font-family:Inter,system-ui,Avenir,Helvetica,Arial,sans-serif;line-height:1.5;font-weight:400;--code-bg:rgb(245, 245, 245);background:var(--code-bg);font-synthesis:none;text-rendering:optimizeLegibility;-webkit-font-smoothing:antialiased;-moz-osx-font-smoothing:grayscale;-webkit-text-size-adjust:100%}body,html{height:100%;width:100%;background:var(--code-bg)}.alert{color:red;font-size:25px}*{box-sizing:border-box}.column{float:left;border:2px solid #000;border-radius:20px;height:85vh;margin:0 .25vw}.left{width:25vw;padding:10px}.right{padding:0;width:73vw}.row:after{display:table;clear:both}#lab-input{display:block;vertical-align:center;horiz-align:center}@media only screen and (max-width:1600px){.left,.right{width:95vw}.right{height:73vh;margin-top:1vh}.left{height:6vh}#input{width:0}header{font-size:1rem}#selector-btn{display:none}.tree{height:90%}}.tree{width:100%;height:80%;overflow:scroll}.tree::-webkit-scrollbar{width:10px;height:fit-content}.tree::-webkit-scrollbar-thumb{background:#7f7f7f;border:2px solid #000;border-radius:5px}.tree-panel{height:100%;width:100%}.tree-panel ul{list-style-type:none}.tree-panel .caret,.tree-panel .custom-control-input{cursor:pointer;user-select:none}.tree-panel .collapsed{display:none}#search{width:100%;margin-bottom:5px}#search-results{max-height:30%;overflow:scroll;padding-left:10px}.tree-panel .search-result{cursor:pointer;overflow-wrap:anywhere}.caret{font-style:normal;font-size:20px;margin-right:10px}.minimize:before{content:"-";margin-right:3px}.maximize:before{content:"+"}.fixed:before{content:"*";margin-right:15px}#output{height:100%;align-content:center;margin:0}#diagram{max-width:none!important;width:100%;height:100%}footer{padding:1rem}a{color:#000}a:active,a:hover,a:link,a:visited{text-decoration:none}header{font-size:2rem;font-weight:700;margin-bottom:10px}#diagram-title{position:absolute;left:50%;transform:translate(0,50%)}p.info,ul.info{text-align:left;font-size:1rem;font-weight:300}ul.info{list-style-type:decimal}.container{display:flex;justify-content:space-evenly}#diagram-title,#lab-input{font-size:20pt;text-align:center}#diagram-title,#lab-input,.alert,footer,header{text-align:center}</style><header>{{.Header}}</header>{{.Report}}<div class=row><div class="column left"id=in_col><label for=input id=lab-input>Select node</label><div id=selector-btn><hr><div class=container><button id=expand-all>Expand All</button> <button id=collapse-all>Collapse All</button></div><hr></div><div class=tree-panel id=input></div></div><div class="column right"id=out_col><div id=output></div></div></div><footer><p style=font-size:15px>Generated by <a href=https://github.com/kislerdm/pyarch target=_blank>pyarch</a> {{.When}}</p>{{.Footer}}</footer><script>const nodes={{.Nodes}},links={{.Links}},classes={{.Classes}},linkIndex={{.Index}},diagrams={{.Diagrams}};mermaid.initialize({theme:"default",dompurifyConfig:{USE_PROFILES:{svg:!0}},startOnLoad:!0,htmlLabels:!0,c4:{diagramMarginY:0}});class Router{#a;#b;#c;#d="q";constructor(){this.#b=window.location,this.#a=window.history,this.#c=this.#e(this.#f()[0])}updateRouteToNode(e){this.#a.pushState({},"",`${this.#c}?${this.#d}=${e}`)}readNodeIDFromRoute(){let e=this.#f();return e.length<2?"":e[1]}#f(){return this.#b.href.split(`${this.#d}=`)}#e(e){let t=e.slice(-1);return"?"!==t&&"/"!==t?e:this.#e(e.slice(0,-1))}}function selectLinks(e){if(Object.prototype.hasOwnProperty.call(linkIndex,e)){let t=[],l=linkIndex[e];for(let i=0;i<l.length;i+=2)for(let n=l[i];n<l[i+1];n++)t.push(links[n]);return t}let t=links.filter(t=>t.start===e||t.end===e);return 0===t.length?links.filter(t=>t.start.startsWith(e)||t.end.startsWith(e)):t}function convertID(e){return e.replaceAll(".","-")}function generateDiagram(e){if(Object.prototype.hasOwnProperty.call(diagrams.i,e))return diagrams.t[diagrams.i[e]];let t=selectLinks(e);if(0===t.length)return"";let l=`classDiagram
+`;for(let i of t)l+=`${convertID(i.start)} ${i.arrow} ${convertID(i.end)}`,void 0!==i.description&&""!==i.description&&(l+=` : ${i.description}`),l+=`
+`;let c=new Set;for(let i of t)c.add(i.start),c.add(i.end);for(let i of c)Object.prototype.hasOwnProperty.call(classes,i)&&(l+=`class ${convertID(i)}{
+${classes[i].join(`
+`)}
+}
+`);return l}const inputSelectedIdStyle="font-weight:bold;font-size:18px",searchIndex={{.Search}},renderedNodes=new Map;function generateItem(e,t,l){renderedNodes.set(e.id,e);let i=e.id===t?`style=${inputSelectedIdStyle}`:"",n=`<span class="custom-control-input" id="${e.id}" ${i}>${e.name}</span>`;return void 0!==e.nodes&&e.nodes.length>0?l?`<li><span class="caret minimize"></span>${n}${generateList(e.nodes,t,l)}</li>`:`<li><span class="caret maximize"></span>${n}</li>`:`<li><span class="fixed"></span>${n}</li>`}function generateList(e,t,l=!1){let i="<ul>";for(let n of e)i+=generateItem(n,t,l);return`${i}</ul>`}function expandNode(e){let t=e.parentElement,l=t.querySelector("ul");null===l?t.insertAdjacentHTML("beforeend",generateList(renderedNodes.get(e.nextElementSibling.id).nodes,prevSelectedId)):l.classList.remove("collapsed"),e.classList.remove("maximize"),e.classList.add("minimize")}function collapseNode(e){e.parentElement.querySelector("ul").classList.add("collapsed"),e.classList.remove("minimize"),e.classList.add("maximize")}function revealNode(e){let t=nodes;for(;;){let l=t.find(t=>t.id===e||e.startsWith(`${t.id}.`));if(void 0===l||l.id===e)return void 0!==l;let i=document.getElementById(l.id).previousElementSibling;i.classList.contains("maximize")&&expandNode(i),t=l.nodes}}let nodeIds;function flattenIds(){if(void 0===nodeIds){nodeIds=[];let e=[...nodes].reverse();for(;e.length>0;){let t=e.pop();if(nodeIds.push(t.id),void 0!==t.nodes)for(let l=t.nodes.length-1;l>=0;l--)e.push(t.nodes[l])}}return nodeIds}function decodePostings(e){let t=0;return e.map(e=>t+=e)}function intersectPostings(e,t){let l=[],i=0,n=0;for(;i<e.length&&n<t.length;)e[i]<t[n]?i++:e[i]>t[n]?n++:(l.push(e[i]),i++,n++);return l}function searchNodes(e,t=50){let l=e.trim().toLowerCase();if(""===l)return[];let i=l.slice(l.lastIndexOf(".")+1),n=searchIndex.n,s=[];if(i.length<3){let r=0,a=n.length;for(;r<a;){let o=r+a>>1;n[o]<i?r=o+1:a=o}for(;r<n.length&&n[r].startsWith(i);r++)s.push(r)}else{let c=[];for(let d=0;d+3<=i.length;d++){let h=i.slice(d,d+3);if(!Object.prototype.hasOwnProperty.call(searchIndex.g,h))return[];c.push(searchIndex.g[h])}c.sort((e,t)=>e.length-t.length),s=c.map(decodePostings).reduce(intersectPostings).filter(e=>n[e].includes(i))}let f=flattenIds(),p=[];for(let u of s)for(let g of searchIndex.x[u]){let m=f[g];(i===l||m.toLowerCase().includes(l))&&p.push({id:m,exact:n[u]===i})}return p.sort((e,t)=>t.exact-e.exact||e.id.length-t.id.length||(e.id<t.id?-1:1)).slice(0,t).map(e=>e.id)}function showSearchResults(e){let t=document.getElementById("search-results"),l=searchNodes(e);t.innerHTML=l.map(e=>`<li class="search-result" data-id="${e}">${e}</li>`).join(""),0===l.length?t.classList.add("collapsed"):t.classList.remove("collapsed")}const router=new Router;let id=router.readNodeIDFromRoute();""===id&&(id=nodes[0].id);let prevSelectedId=id;const out=document.getElementById("output");async function draw(e){let t=generateDiagram(e);if(""===t){let l=`No data found for the input nodeID: ${e}`;out.innerHTML=`<h2 style="text-align:center;font-weight:bold;font-size:20pt;color:red">${l}</h2>`,console.error(l)}else try{let{svg:i}=await mermaid.render("diagram",t,out);out.innerHTML=i}catch(n){console.error(n.message)}}async function selectNode(e){await draw(e),resetDefaultStyleInputElement(prevSelectedId);let t=document.getElementById(e);null!==t&&t.setAttribute("style",inputSelectedIdStyle),prevSelectedId=e,router.updateRouteToNode(e),isMobileDevice()&&(hideInputPanel(),isClickedSelectorLabel=!1)}document.addEventListener("DOMContentLoaded",async function(){let e=document.getElementById("input");e.innerHTML=`<input autocomplete="off" id="search" placeholder="Search node" type="search"><ul class="collapsed" id="search-results"></ul><form class="tree" id="intputForm">${generateList(nodes,id)}</form>`;for(let t of document.querySelectorAll("#intputForm>ul>li>.caret"))expandNode(t);revealNode(id),e.addEventListener("click",async e=>{let t=e.target;if(t.classList.contains("caret"))t.classList.contains("maximize")?expandNode(t):collapseNode(t);else if(t.classList.contains("custom-control-input"))await selectNode(t.id);else if(t.classList.contains("search-result")){let l=t.dataset.id;revealNode(l)&&document.getElementById(l).scrollIntoView({block:"center"}),await selectNode(l)}}),e.addEventListener("input",e=>{"search"===e.target.id&&showSearchResults(e.target.value)}),performance.mark("pyarch:interactive"),await draw(id)});const btnExpandAll=document.getElementById("expand-all");btnExpandAll.addEventListener("click",function(){document.getElementById("intputForm").innerHTML=generateList(nodes,prevSelectedId,!0)});const btnCollapseAll=document.getElementById("collapse-all");function resetDefaultStyleInputElement(e){let t=document.getElementById(e);null!==t&&t.setAttribute("style","")}btnCollapseAll.addEventListener("click",function(){for(let e of document.querySelectorAll("#input .minimize"))collapseNode(e)});let isClickedSelectorLabel=!1;const selectorLabel=document.getElementById("lab-input");function showInputPanel(){let e=document.getElementById("in_col");e.setAttribute("style","height:70vh");let t=document.getElementById("input");t.setAttribute("style","width:100%");let l=document.getElementById("selector-btn");l.setAttribute("style","display:block")}function hideInputPanel(){let e=document.getElementById("in_col");e.setAttribute("style","height:6vh");let t=document.getElementById("input");t.setAttribute("style","width:0");let l=document.getElementById("selector-btn");l.setAttribute("style","display:none")}function isMobileDevice(){return window.screen.availWidth<=1600}selectorLabel.addEventListener("click",()=>{isMobileDevice()&&(isClickedSelectorLabel?(hideInputPanel(),isClickedSelectorLabel=!1):(showInputPanel(),isClickedSelectorLabel=!0))});</script></body></html>"""
+
+
+_TEMPLATE_DATA = (
+    "const nodes={{.Nodes}},links={{.Links}},classes={{.Classes}},linkIndex={{.Index}},diagrams={{.Diagrams}};"
+)
+
+# the shell page fetches the links of the selected node's top-level package from the shard listed in the manifest
+_TEMPLATE_SHARDED = _TEMPLATE.replace(
+    _TEMPLATE_DATA,
+    "const nodes={{.Nodes}},shards={};let links=[],classes={},linkIndex={},diagrams={t:[],i:{}},manifest;async funct"
+    'ion loadShard(e){let t=e.split(".")[0];try{void 0===manifest&&(manifest=await(await fetch("{{.Data}}/manifest.js'
+    'on")).json()),Object.prototype.hasOwnProperty.call(manifest.shards,t)?(void 0===shards[t]&&(shards[t]=await(awai'
+    "t fetch(`{{.Data}}/${manifest.shards[t]}`)).json()),{links,classes,index:linkIndex,diagrams={t:[],i:{}}}=shards["
+    "t]):(links=[],classes={},linkIndex={},diagrams={t:[],i:{}})}catch(l){console.error(l.message),links=[],classes={"
+    "},linkIndex={},diagrams={t:[],i:{}}}}",
+).replace(
+    "async function draw(e){let t=generateDiagram(e);",
+    "async function draw(e){await loadShard(e);let t=generateDiagram(e);",
+)
+
+
+# the page scans the links to select the node's links without the index, the scan is instant for the small graphs
+_LINK_INDEX_MIN_LINKS = 10_000
+
+
+def build_link_index(links: Iterable[Link], ids: Iterable[str]) -> Dict[str, List[int]]:
+    """Builds the index of the links selected for every node on the page.
+
+    The node selects the links which start, or end at the node; if there are none, it selects the links with either
+    end's id starting with the node's id, i.e. the links of the package's descendants.
+
+    Args:
+        links: Links in the order of the page's links array.
+        ids: Nodes' ids.
+
+    Returns:
+        Flat pairs of the ranges [start, end) of the links' indices for every node's id.
+    """
+    exact: Dict[str, List[int]] = {}
+    for i, link in enumerate(links):
+        exact.setdefault(link.start, []).append(i)
+        if link.end != link.start:
+            exact.setdefault(link.end, []).append(i)
+    endpoints = sorted(exact)
+
+    o: Dict[str, List[int]] = {}
+    for _id in ids:
+        indices = exact.get(_id)
+        if indices is None:
+            selected: Set[int] = set()
+            j = bisect.bisect_left(endpoints, _id)
+            while j < len(endpoints) and endpoints[j].startswith(_id):
+                selected.update(exact[endpoints[j]])
+                j += 1
+            indices = sorted(selected)
+
+        ranges: List[int] = []
+        for i in indices:
+            if ranges and ranges[-1] == i:
+                ranges[-1] = i + 1
+            else:
+                ranges.extend((i, i + 1))
+        o[_id] = ranges
+
+    return o
+
+
+def build_search_index(ids: Iterable[str]) -> Dict[str, Any]:
+    """Builds the index of the page's search over the nodes' names.
+
+    The names are the last parts of the nodes' ids, lower-cased and deduplicated. The page looks the queries shorter
+    than three characters up by the prefix in the sorted names, and the longer queries by the intersection of their
+    trigrams' postings; the part of the query before the last dot is matched against the candidates' ids.
+
+    Args:
+        ids: Nodes' ids in the depth first order of the tree.
+
+    Returns:
+        Sorted names ("n"), the nodes' indices of every name ("x"), and the delta encoded names' indices of every
+        trigram ("g").
+    """
+    nodes: Dict[str, List[int]] = {}
+    for i, _id in enumerate(ids):
+        nodes.setdefault(_id.rsplit(Node._SEPARATOR, 1)[-1].lower(), []).append(i)
+    names = sorted(nodes)
+
+    trigrams: Dict[str, List[int]] = {}
+    for i, name in enumerate(names):
+        for gram in {name[j : j + 3] for j in range(len(name) - 2)}:
+            trigrams.setdefault(gram, []).append(i)
+
+    return {
+        "n": names,
+        "x": [nodes[el] for el in names],
+        "g": {gram: [b - a for a, b in zip([0] + postings, postings)] for gram, postings in trigrams.items()},
+    }
+
+
+def _convert_id(_id: str) -> str:
+    return _id.replace(".", "-")
+
+
+def generate_diagram(links: Iterable[Link], members: Dict[str, List[str]]) -> str:
+    """Generates the mermaid classDiagram of the links the same as the page does.
+
+    Args:
+        links: Links selected for the node.
+        members: Classes' members, see Classes.to_members.
+
+    Returns:
+        Diagram definition, or an empty string if there are no links.
+    """
+    o: List[str] = []
+    ids: Dict[str, None] = {}
+    for link in links:
+        line = f"{_convert_id(link.start)} {link.arrow} {_convert_id(link.end)}"
+        o.append(f"{line} : {link.description}" if link.description else line)
+        ids[link.start] = None
+        ids[link.end] = None
+
+    if not o:
+        return ""
+
+    o.insert(0, "classDiagram")
+    for _id in ids:
+        if _id in members:
+            o.append("class %s{\n%s\n}" % (_convert_id(_id), "\n".join(members[_id])))
+    o.append("")
+    return "\n".join(o)
+
+
+def _diagram_from_ranges(links: List[Link], members: Dict[str, List[str]], ranges: List[int]) -> str:
+    return generate_diagram(
+        (links[i] for j in range(0, len(ranges), 2) for i in range(ranges[j], ranges[j + 1])), members
+    )
+
+
+# the links and the classes' members of the diagrams' worker process
+_DIAGRAMS_STATE: Tuple[List[Link], Dict[str, List[str]]] = ([], {})
+
+
+def _init_diagrams_worker(keys: List[Tuple[str, str, str, str]], members: Dict[str, List[str]]) -> None:
+    global _DIAGRAMS_STATE
+    _DIAGRAMS_STATE = ([Link.from_parts(*el) for el in keys], members)
+
+
+def _render_diagrams(ranges: List[List[int]]) -> List[str]:
+    return [_diagram_from_ranges(*_DIAGRAMS_STATE, el) for el in ranges]
+
+
+def prerender_diagrams(
+    links: Links,
+    ids: Iterable[str],
+    classes: Classes,
+    top: Optional[int] = None,
+    budget: int = 8 * 2**20,
+    jobs: int = 1,
+) -> Dict[str, str]:
+    """Generates the diagrams of the nodes with the most links to embed them in the page.
+
+    The nodes are ranked by the number of their links. The diagrams are added in the order of the rank while their
+    total size fits the budget, a diagram which does not fit is skipped; the diagrams identical to the ones added
+    earlier are embedded once, hence they do not count towards the budget.
+
+    Args:
+        links: Links.
+        ids: Nodes' ids.
+        classes: Classes table.
+        top: Number of the nodes with the most links to generate the diagrams for, all nodes if None.
+        budget: Total size of the diagrams in bytes.
+        jobs: Number of worker processes, the diagrams are generated in the current process if jobs < 2.
+
+    Returns:
+        Diagrams of the nodes in the order of the rank.
+    """
+    index = build_link_index(links, ids)
+    counts = {_id: sum(el[1::2]) - sum(el[::2]) for _id, el in index.items()}
+    ranked = sorted((_id for _id, count in counts.items() if count > 0), key=lambda el: -counts[el])
+    if top is not None:
+        ranked = ranked[:top]
+
+    members = classes.to_members()
+    if jobs < 2:
+        items = list(links)
+        return _take_diagrams(ranked, (_diagram_from_ranges(items, members, index[el]) for el in ranked), budget)
+
+    chunk_size = max(1, len(ranked) // (jobs * 4))
+    tasks = [[index[el] for el in ranked[i : i + chunk_size]] for i in range(0, len(ranked), chunk_size)]
+    import concurrent.futures
+
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=jobs, initializer=_init_diagrams_worker, initargs=([el.key for el in links], members)
+    ) as executor:
+        diagrams = (el for chunk in executor.map(_render_diagrams, tasks) for el in chunk)
+        return _take_diagrams(ranked, diagrams, budget)
+
+
+def _take_diagrams(ids: List[str], diagrams: Iterable[str], budget: int) -> Dict[str, str]:
+    o: Dict[str, str] = {}
+    seen: Set[str] = set()
+    size = 0
+    for _id, diagram in zip(ids, diagrams):
+        diagram_size = 0 if diagram in seen else len(diagram.encode())
+        if size + diagram_size > budget:
+            continue
+        o[_id] = diagram
+        seen.add(diagram)
+        size += diagram_size
+    return o
+
+
+def _ancestor_id(_id: str, depth: int) -> str:
+    return Node._SEPARATOR.join(_id.split(Node._SEPARATOR, depth)[:depth])
+
+
+def rollup_links(links: Iterable[Link], depth: int) -> Dict[Tuple[str, str, str], int]:
+    """Aggregates the links between the ancestors of their ends at the depth of the namespace tree.
+
+    Args:
+        links: Links.
+        depth: Number of the ids' segments to keep, the deeper ids are replaced by their ancestor's id.
+
+    Returns:
+        Number of the links for every (start, arrow, end) of the ancestors in the order of the first occurrence,
+        the links within the same ancestor are dropped.
+    """
+    o: Dict[Tuple[str, str, str], int] = {}
+    ancestors: Dict[str, str] = {}
+    for link in links:
+        start = ancestors.get(link.start)
+        if start is None:
+            start = ancestors[link.start] = _ancestor_id(link.start, depth)
+        end = ancestors.get(link.end)
+        if end is None:
+            end = ancestors[link.end] = _ancestor_id(link.end, depth)
+        if start != end:
+            key = (start, link.arrow, end)
+            o[key] = o.get(key, 0) + 1
+    return o
+
+
+def rollup_diagrams(
+    links: Links, ids: Iterable[str], classes: Classes, max_edges: int, depth: int = 2
+) -> Dict[str, str]:
+    """Generates the collapsed diagrams of the nodes which select more than max_edges links.
+
+    The links of the node are aggregated between the ancestors of their ends at most depth levels below the node, the
+    edges carry the number of the aggregated links. The depth is reduced until the number of the edges is at most
+    max_edges, the heaviest edges are kept if there are still more. The collapsed ancestors are annotated with
+    <<collapsed>>, the page draws their diagrams upon selection in the tree.
+
+    Args:
+        links: Links.
+        ids: Nodes' ids.
+        classes: Classes table.
+        max_edges: Maximum number of the edges per diagram.
+        depth: Number of the levels below the node to aggregate the links to.
+
+    Returns:
+        Diagrams of the nodes which select more than max_edges links.
+    """
+    members = classes.to_members()
+    o: Dict[str, str] = {}
+    for _id, ranges in build_link_index(links, ids).items():
+        if sum(ranges[1::2]) - sum(ranges[::2]) <= max_edges:
+            continue
+
+        selected = [links[i] for j in range(0, len(ranges), 2) for i in range(ranges[j], ranges[j + 1])]
+        level = len(_id.split(Node._SEPARATOR))
+        deepest = max(el.count(Node._SEPARATOR) + 1 for link in selected for el in (link.start, link.end))
+
+        # the links within one ancestor are dropped, hence the deeper levels are tried until any edge remains; the
+        # shallower levels of an empty roll-up are empty too
+        edges: Dict[Tuple[str, str, str], int] = {}
+        start = level + max(depth, 1)
+        for level_max in range(start, max(start, deepest) + 1):
+            edges = rollup_links(selected, level_max)
+            if edges:
+                break
+        while len(edges) > max_edges and level_max > level + 1:
+            shallower = rollup_links(selected, level_max - 1)
+            if not shallower:
+                break
+            edges, level_max = shallower, level_max - 1
+
+        if not edges:
+            # the node selects the self-links only, they are drawn uncollapsed
+            level_max = deepest
+            for link in selected:
+                key = (link.start, link.arrow, link.end)
+                edges[key] = edges.get(key, 0) + 1
+        if len(edges) > max_edges:
+            edges = dict(sorted(edges.items(), key=lambda el: -el[1])[:max_edges])
+
+        ends = {el for link in selected for el in (link.start, link.end)}
+        collapsed = {_ancestor_id(el, level_max) for el in ends if el.count(Node._SEPARATOR) >= level_max}
+        o[_id] = _rollup_diagram(edges, collapsed, members)
+
+    return o
+
+
+def _rollup_diagram(edges: Dict[Tuple[str, str, str], int], collapsed: Set[str], members: Dict[str, List[str]]) -> str:
+    o = ["classDiagram"]
+    ids: Dict[str, None] = {}
+    for (start, arrow, end), count in edges.items():
+        line = f"{_convert_id(start)} {arrow} {_convert_id(end)}"
+        o.append(f"{line} : {count} links" if count > 1 else line)
+        ids[start] = None
+        ids[end] = None
+
+    for _id in ids:
+        body = (["<<collapsed>>"] if _id in collapsed else []) + members.get(_id, [])
+        if body:
+            o.append("class %s{\n%s\n}" % (_convert_id(_id), "\n".join(body)))
+    o.append("")
+    return "\n".join(o)
+
+
+def _diagrams_json(diagrams: Dict[str, str]) -> str:
+    """Serialises the diagrams to JSON with the table of the unique diagrams ("t") and the nodes' indices ("i")."""
+    texts: Dict[str, int] = {}
+    index = {_id: texts.setdefault(el, len(texts)) for _id, el in diagrams.items()}
+    return json.dumps({"t": list(texts), "i": index})
+
+
+class Graph:
+    """Directed graph of the links' ends indexed by integers in the compressed sparse row layout.
+
+    Args:
+        ids: Nodes' ids by their indices.
+        offsets: Offsets of the nodes' edges, the edges of the node i are targets[offsets[i]:offsets[i + 1]].
+        targets: Indices of the edges' ends, the edges of every node are unique and sorted.
+    """
+
+    __slots__ = ("ids", "offsets", "targets")
+
+    def __init__(self, ids: List[str], offsets: "array.array[int]", targets: "array.array[int]") -> None:
+        self.ids = ids
+        self.offsets = offsets
+        self.targets = targets
+
+    @classmethod
+    def from_links(
+        cls, links: Iterable[Link], arrows: Optional[Iterable[str]] = None, reverse: Iterable[str] = ()
+    ) -> "Graph":
+        """Builds the graph of the links' ends, the links between the same ends are merged to a single edge.
+
+        Args:
+            links: Links.
+            arrows: Arrows of the links to include, all links are included if None.
+            reverse: Arrows of the links included as the edges from the end to the start.
+
+        Returns:
+            Graph with the nodes indexed in the order of the first occurrence.
+        """
+        include = None if arrows is None else frozenset(arrows)
+        flip = frozenset(reverse)
+        index: Dict[str, int] = {}
+        # the edges are encoded as integers (start << 32) | end, hence sorted by start first
+        edges = set()
+        for start, arrow, end, _ in (el.key for el in links):
+            if include is None or arrow in include:
+                if arrow in flip:
+                    start, end = end, start
+                edges.add(index.setdefault(start, len(index)) << 32 | index.setdefault(end, len(index)))
+        return cls(list(index), *_csr_arrays(edges, len(index)))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def edges(self) -> int:
+        return len(self.targets)
+
+    def successors(self, i: int) -> "array.array[int]":
+        return self.targets[self.offsets[i] : self.offsets[i + 1]]
+
+    def transpose(self) -> "Graph":
+        """Returns the graph with the reversed edges, the nodes' indices are kept."""
+        counts = [0] * (len(self) + 1)
+        for i in self.targets:
+            counts[i + 1] += 1
+        offsets = array.array("q", itertools.accumulate(counts))
+        position = offsets.tolist()
+        targets = array.array("q", [0]) * len(self.targets)
+        # the starts are visited in the ascending order, hence the reversed edges of every node are sorted
+        for start in range(len(self)):
+            for i in range(self.offsets[start], self.offsets[start + 1]):
+                end = self.targets[i]
+                targets[position[end]] = start
+                position[end] += 1
+        return Graph(self.ids, offsets, targets)
+
+
+def _csr_arrays(edges: Iterable[int], n: int) -> Tuple["array.array[int]", "array.array[int]"]:
+    """Returns the offsets and the targets of the edges encoded as integers (start << 32) | end of n nodes."""
+    keys = sorted(edges)
+    counts = [0] * (n + 1)
+    for key in keys:
+        counts[(key >> 32) + 1] += 1
+    return array.array("q", itertools.accumulate(counts)), array.array("q", [key & 0xFFFFFFFF for key in keys])
+
+
+def strongly_connected_components(graph: Graph) -> List[List[int]]:
+    """Finds the strongly connected components of the graph using Tarjan's algorithm in O(nodes + edges).
+
+    The recursion is replaced by the explicit stack, hence the depth of the graph is not limited by the interpreter.
+
+    Returns:
+        Components as the lists of the nodes' indices in the reverse topological order of the condensed graph, i.e.
+        every component is listed after the components it has edges to.
+    """
+    offsets, targets = graph.offsets, graph.targets
+    n = len(graph)
+    index = [-1] * n
+    low = [0] * n
+    on_stack = [False] * n
+    position = [0] * n
+    stack: List[int] = []
+    o: List[List[int]] = []
+
+    counter = 0
+    for root in range(n):
+        if index[root] != -1:
+            continue
+
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = True
+        position[root] = offsets[root]
+        calls = [root]
+        while calls:
+            v = calls[-1]
+            i, end = position[v], offsets[v + 1]
+            while i < end:
+                w = targets[i]
+                i += 1
+                if index[w] == -1:
+                    position[v] = i
+                    index[w] = low[w] = counter
+                    counter += 1
+                    stack.append(w)
+                    on_stack[w] = True
+                    position[w] = offsets[w]
+                    calls.append(w)
+                    break
+                if on_stack[w] and index[w] < low[v]:
+                    low[v] = index[w]
+            else:
+                calls.pop()
+                if low[v] == index[v]:
+                    component = []
+                    while True:
+                        w = stack.pop()
+                        on_stack[w] = False
+                        component.append(w)
+                        if w == v:
+                            break
+                    o.append(component)
+                if calls and low[v] < low[calls[-1]]:
+                    low[calls[-1]] = low[v]
+    return o
+
+
+@dataclasses.dataclass
+class NodeMetrics:
+    """Coupling metrics of the node of the dependency graph.
+
+    Args:
+        id: Node id.
+        fan_in: Number of the nodes which depend on the node, i.e. the afferent coupling.
+        fan_out: Number of the nodes the node depends on, i.e. the efferent coupling.
+        instability: fan_out / (fan_in + fan_out): 0 for the stable nodes, 1 for the unstable nodes.
+    """
+
+    id: str
+    fan_in: int
+    fan_out: int
+    instability: float
+
+
+@dataclasses.dataclass
+class Analysis:
+    """Dependency analysis of the links.
+
+    Args:
+        arrows: Arrows of the links of the dependency graph.
+        nodes: Number of the nodes of the dependency graph.
+        edges: Number of the edges of the dependency graph.
+        cycles: Strongly connected components of more than one node, i.e. the dependency cycles, the largest first.
+        metrics: Coupling metrics of the nodes of the dependency graph.
+        couplings: Heaviest couplings between the packages as (start, end, number of the edges between their nodes),
+            the heaviest first.
+    """
+
+    arrows: List[str]
+    nodes: int
+    edges: int
+    cycles: List[List[str]]
+    metrics: List[NodeMetrics]
+    couplings: List[Tuple[str, str, int]]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "graph": {"arrows": self.arrows, "nodes": self.nodes, "edges": self.edges},
+            "cycles": self.cycles,
+            "metrics": [
+                {"id": el.id, "fan_in": el.fan_in, "fan_out": el.fan_out, "instability": el.instability}
+                for el in self.metrics
+            ],
+            "couplings": [{"start": start, "end": end, "links": n} for start, end, n in self.couplings],
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict())
+
+    def to_html(self, top: int = 20) -> str:
+        """Returns the collapsible report's section of the page with the top nodes and couplings."""
+        o = [
+            '<details style="margin:0 1vw 10px"><summary>',
+            f"Dependency analysis: {len(self.cycles)} cycles, {self.nodes} modules, {self.edges} imports",
+            "</summary>",
+        ]
+        if self.cycles:
+            o.append("<p>Cycles:<ol>")
+            o.extend("<li>%s</li>" % ", ".join(_node_anchor(_id) for _id in el) for el in self.cycles[:top])
+            o.append("</ol>")
+
+        for title, key in (("fan-in", "fan_in"), ("fan-out", "fan_out")):
+            rows = sorted(self.metrics, key=lambda el: -getattr(el, key))[:top]
+            o.append(f"<p>Highest {title}:<table><tr><th>module<th>fan-in<th>fan-out<th>instability</tr>")
+            o.extend(
+                f"<tr><td>{_node_anchor(el.id)}<td>{el.fan_in}<td>{el.fan_out}<td>{el.instability:.2f}</tr>"
+                for el in rows
+            )
+            o.append("</table>")
+
+        o.append("<p>Heaviest couplings:<table><tr><th>package<th>depends on<th>links</tr>")
+        o.extend(
+            f"<tr><td>{_node_anchor(start)}<td>{_node_anchor(end)}<td>{n}</tr>"
+            for start, end, n in self.couplings[:top]
+        )
+        o.append("</table></details>")
+        return "".join(o)
+
+
+def _node_anchor(_id: str) -> str:
+    import urllib.parse
+
+    return f'<a href="?q={urllib.parse.quote(_id)}">{html.escape(_id)}</a>'
+
+
+def analyze_links(links: Links, arrows: Iterable[str] = ("-->",), depth: int = 2, top: int = 20) -> Analysis:
+    """Analyses the dependencies between the links' ends.
+
+    The dependency graph is built from the links with the given arrows, by default the modules' imports. The cycles are
+    its strongly connected components; the couplings count its edges between the ancestors of their ends at the depth
+    of the namespace tree.
+
+    Args:
+        links: Links.
+        arrows: Arrows of the links of the dependency graph.
+        depth: Number of the ids' segments of the packages to aggregate the couplings to.
+        top: Number of the heaviest couplings to keep.
+
+    Returns:
+        Analysis.
+    """
+    arrows = list(arrows)
+    graph = Graph.from_links(links, arrows)
+
+    cycles = [sorted(graph.ids[i] for i in el) for el in strongly_connected_components(graph) if len(el) > 1]
+    cycles.sort(key=lambda el: (-len(el), el))
+
+    fan_in = [0] * len(graph)
+    for i in graph.targets:
+        fan_in[i] += 1
+    fan_out = [graph.offsets[i + 1] - graph.offsets[i] for i in range(len(graph))]
+    metrics = [
+        NodeMetrics(_id, fan_in[i], fan_out[i], round(fan_out[i] / (fan_in[i] + fan_out[i]), 4))
+        for i, _id in enumerate(graph.ids)
+    ]
+
+    # the edges are counted between the packages' indices, the edges within the same package are dropped
+    packages: Dict[str, int] = {}
+    ancestors = [packages.setdefault(_ancestor_id(el, depth), len(packages)) for el in graph.ids]
+    starts = itertools.chain.from_iterable(itertools.repeat(el, n) for el, n in zip(ancestors, fan_out))
+    couplings = collections.Counter(zip(starts, map(ancestors.__getitem__, graph.targets)))
+    names = list(packages)
+    heaviest = [(names[start], names[end], n) for (start, end), n in couplings.most_common() if start != end][:top]
+
+    return Analysis(arrows, len(graph), graph.edges, cycles, metrics, heaviest)
+
+
+# the composition and the aggregation link the attribute's type to its owner class, i.e. against the dependency
+_REVERSED_ARROWS = ("--*", "--o")
+
+
+_BITS = bytes.maketrans(b"01", b"\x00\x01")
+
+
+def _iter_bits(bits: int) -> Iterator[int]:
+    """Iterates over the indices of the set bits of the integer in the ascending order."""
+    return itertools.compress(itertools.count(), bin(bits)[:1:-1].encode().translate(_BITS))
+
+
+class GraphQuery:
+    """Queries of the transitive dependencies between the nodes of the dependency graph.
+
+    The graph is condensed to the acyclic graph of its strongly connected components. The components reachable from
+    the component are stored as the bits of an integer: the bitsets are computed upon the first query which reaches
+    the component, and memoized in the LRU cache of the bounded size, hence the repeated queries cost the decoding of
+    the bitsets.
+
+    The id of a package which is not the graph's node selects the package's nodes, the same as the page does.
+
+    Args:
+        graph: Dependency graph, the edge from the start to the end means that the start depends on the end.
+        cache_size: Maximum size of the memoized bitsets in bytes.
+    """
+
+    def __init__(self, graph: Graph, cache_size: int = 2**28) -> None:
+        self.graph = graph
+        self.cache_size = cache_size
+        self._index = {el: i for i, el in enumerate(graph.ids)}
+        self._sorted_ids = sorted(graph.ids)
+        self._transposed: Optional[Graph] = None
+
+        # the components are in the reverse topological order, i.e. the edges point to the lower indices; the
+        # components of the reversed graph are numbered backwards to keep the order, and the bitsets short
+        self._members = strongly_connected_components(graph)
+        self._component = [0] * len(graph)
+        for c, members in enumerate(self._members):
+            for i in members:
+                self._component[i] = c
+
+        n = len(self._members)
+        forward, reverse = set(), set()
+        for start in range(len(graph)):
+            c = self._component[start]
+            for end in graph.successors(start):
+                d = self._component[end]
+                if c != d:
+                    forward.add(c << 32 | d)
+                    reverse.add((n - 1 - d) << 32 | (n - 1 - c))
+        self._condensed = (_csr_arrays(forward, n), _csr_arrays(reverse, n))
+        self._labelled = (self._members, self._members[::-1])
+        self._rank = [0] * len(graph)
+        for rank, _id in enumerate(self._sorted_ids):
+            self._rank[self._index[_id]] = rank
+        self._bitsets: Tuple["collections.OrderedDict[int, int]", ...] = (
+            collections.OrderedDict(),
+            collections.OrderedDict(),
+        )
+        self._cached = [0, 0]
+
+    @classmethod
+    def from_links(
+        cls, links: Iterable[Link], arrows: Optional[Iterable[str]] = None, cache_size: int = 2**28
+    ) -> "GraphQuery":
+        """Builds the queries of the dependency graph of the links.
+
+        The composition and the aggregation links are included as the edges from their ends to their starts, because
+        they link the attribute's type to its owner class.
+
+        Args:
+            links: Links.
+            arrows: Arrows of the links of the dependency graph, all links are included if None.
+            cache_size: Maximum size of the memoized bitsets in bytes.
+        """
+        return cls(Graph.from_links(links, arrows, _REVERSED_ARROWS), cache_size)
+
+    def dependencies(self, _id: str) -> List[str]:
+        """Returns the sorted ids of the nodes the node depends on transitively, the node itself excluded.
+
+        Raises:
+            KeyError: raised when the node is not found.
+        """
+        return self._closure(_id, 0)
+
+    def dependents(self, _id: str) -> List[str]:
+        """Returns the sorted ids of the nodes which depend on the node transitively, the node itself excluded.
+
+        Raises:
+            KeyError: raised when the node is not found.
+        """
+        return self._closure(_id, 1)
+
+    def path(self, start: str, end: str) -> Optional[List[str]]:
+        """Finds the shortest dependency path from the start to the end.
+
+        The breadth first search is limited to the components which are reachable from the start, and from which the
+        end is reachable.
+
+        Returns:
+            Ids of the path's nodes from the start to the end, or None if the end is not reachable.
+
+        Raises:
+            KeyError: raised when either node is not found.
+        """
+        sources, targets = self._resolve(start), set(self._resolve(end))
+        n = len(self._members)
+        forward = self._reach(0, (self._component[i] for i in sources))
+        reverse = self._reach(1, (n - 1 - self._component[i] for i in targets))
+        # the bits of the reversed graph's components are numbered backwards
+        between = forward & int(bin(reverse)[2:].zfill(n)[::-1], 2)
+        if between == 0:
+            return None
+
+        allowed = bytearray(n)
+        for c in _iter_bits(between):
+            allowed[c] = 1
+        previous = {i: -1 for i in sources}
+        queue = collections.deque(sources)
+        while queue:
+            i = queue.popleft()
+            if i in targets:
+                o = []
+                while i != -1:
+                    o.append(self.graph.ids[i])
+                    i = previous[i]
+                return o[::-1]
+            for j in self.graph.successors(i):
+                if j not in previous and allowed[self._component[j]]:
+                    previous[j] = i
+                    queue.append(j)
+        return None
+
+    def neighbourhood(self, _id: str, depth: int = 1, direction: str = "both") -> Dict[str, int]:
+        """Finds the nodes within the number of the dependency steps from the node.
+
+        Args:
+            _id: Node id.
+            depth: Maximum number of the steps.
+            direction: Steps to the "dependencies", to the "dependents", or "both".
+
+        Returns:
+            Distances of the nodes from the node by their ids, ordered by the distance and the id, the node itself is
+            excluded.
+
+        Raises:
+            KeyError: raised when the node is not found.
+            ValueError: raised when the direction is unknown.
+        """
+        if direction not in ("dependencies", "dependents", "both"):
+            raise ValueError(f"unknown direction {direction}")
+        graphs = []
+        if direction != "dependents":
+            graphs.append(self.graph)
+        if direction != "dependencies":
+            graphs.append(self._transpose())
+
+        sources = self._resolve(_id)
+        distances = dict.fromkeys(sources, 0)
+        frontier = sources
+        for distance in range(1, depth + 1):
+            found = []
+            for graph in graphs:
+                for i in frontier:
+                    for j in graph.successors(i):
+                        if j not in distances:
+                            distances[j] = distance
+                            found.append(j)
+            frontier = found
+
+        o = sorted((distance, self.graph.ids[i]) for i, distance in distances.items() if distance > 0)
+        return {_id: distance for distance, _id in o}
+
+    def _resolve(self, _id: str) -> List[int]:
+        """Returns the index of the node, or the indices of the package's nodes."""
+        i = self._index.get(_id)
+        if i is not None:
+            return [i]
+
+        prefix = _id + Node._SEPARATOR
+        o = []
+        j = bisect.bisect_left(self._sorted_ids, prefix)
+        while j < len(self._sorted_ids) and self._sorted_ids[j].startswith(prefix):
+            o.append(self._index[self._sorted_ids[j]])
+            j += 1
+        if len(o) == 0:
+            raise KeyError(f"node {_id} not found")
+        return o
+
+    def _transpose(self) -> Graph:
+        if self._transposed is None:
+            self._transposed = self.graph.transpose()
+        return self._transposed
+
+    def _closure(self, _id: str, direction: int) -> List[str]:
+        sources = self._resolve(_id)
+        n = len(self._members)
+        # the node's component reaches the node's other members, if any, and the components of its successors
+        if direction == 0:
+            bits = self._reach(0, (self._component[i] for i in sources))
+        else:
+            bits = self._reach(1, (n - 1 - self._component[i] for i in sources))
+
+        # the nodes are marked by their ranks in the sorted ids, hence the result is sorted without comparisons
+        marks = bytearray(len(self.graph))
+        members, rank = self._labelled[direction], self._rank
+        for c in _iter_bits(bits):
+            for i in members[c]:
+                marks[rank[i]] = 1
+        for i in sources:
+            marks[rank[i]] = 0
+        return list(itertools.compress(self._sorted_ids, marks))
+
+    def _reach(self, direction: int, components: Iterable[int]) -> int:
+        """Returns the bitset of the components reachable from the components, the components themselves included."""
+        bitsets = self._bitsets[direction]
+        sources = sorted(set(components))
+        if len(sources) == 1 and sources[0] in bitsets:
+            bitsets.move_to_end(sources[0])
+            return bitsets[sources[0]]
+
+        offsets, targets = self._condensed[direction]
+        # the components reachable from the components are collected, the memoized components are not expanded; the
+        # edges point to the lower indices, hence the reached components are flagged by the digits of the bitset
+        top = sources[-1]
+        known: Dict[int, int] = {}
+        seen = bytearray(b"0") * (top + 1)
+        for x in sources:
+            seen[top - x] = 49
+        pending = []
+        stack = sources[:]
+        while stack:
+            x = stack.pop()
+            bits = bitsets.get(x)
+            if bits is not None:
+                known[x] = bits
+                continue
+            pending.append(x)
+            for y in targets[offsets[x] : offsets[x + 1]]:
+                if seen[top - y] == 48:
+                    seen[top - y] = 49
+                    stack.append(y)
+
+        o = 0
+        # the bitset of the component spans its index bits at most, the bitsets of all collected components are
+        # memoized while they fit the cache without the eviction
+        if sum(self._cached) + sum(pending) // 8 + len(pending) <= self.cache_size:
+            pending.sort()
+            for x in pending:
+                bits = 1 << x
+                for y in targets[offsets[x] : offsets[x + 1]]:
+                    bits |= known[y]
+                known[x] = bits
+                self._memoize(direction, x, bits)
+            for x in sources:
+                o |= known[x]
+            return o
+
+        o = int(seen, 2)
+        for bits in known.values():
+            o |= bits
+        if len(sources) == 1:
+            self._memoize(direction, top, o)
+        return o
+
+    def _memoize(self, direction: int, c: int, bits: int) -> None:
+        """Memoizes the bitset evicting the least recently used bitsets of the direction with the larger cache."""
+        size = (bits.bit_length() + 7) // 8
+        if size > self.cache_size:
+            return
+        while sum(self._cached) + size > self.cache_size:
+            d = 0 if self._cached[0] >= self._cached[1] else 1
+            self._cached[d] -= (self._bitsets[d].popitem(last=False)[1].bit_length() + 7) // 8
+        self._bitsets[direction][c] = bits
+        self._cached[direction] += size
+
+
+_QUERIES = ("dependencies", "dependents", "path", "neighbourhood")
+
+
+def run_query(query: GraphQuery, kind: str, ids: List[str], depth: int = 1, direction: str = "both") -> Dict[str, Any]:
+    """Runs the query of the dependency graph given its kind and the nodes' ids.
+
+    Args:
+        query: Queries of the dependency graph.
+        kind: "dependencies", "dependents", or "neighbourhood" of the node, or the shortest "path" between two nodes.
+        ids: Node's id, or the start's and the end's ids of the path.
+        depth: Maximum number of the steps of the neighbourhood.
+        direction: Steps of the neighbourhood: to the "dependencies", to the "dependents", or "both".
+
+    Returns:
+        Query's kind, its ids, and the result: the sorted ids, the ids of the path's nodes or None, or the distances of
+        the neighbourhood's nodes by their ids.
+
+    Raises:
+        KeyError: raised when the node is not found.
+        ValueError: raised when the kind is unknown, or the number of the ids does not match it.
+    """
+    if kind not in _QUERIES:
+        raise ValueError(f"unknown query {kind}, expected one of {', '.join(_QUERIES)}")
+    expected = 2 if kind == "path" else 1
+    if len(ids) != expected:
+        raise ValueError(f"{kind} expects {expected} node id(s), {len(ids)} given")
+
+    result: Any
+    if kind == "dependencies":
+        result = query.dependencies(ids[0])
+    elif kind == "dependents":
+        result = query.dependents(ids[0])
+    elif kind == "path":
+        result = query.path(ids[0], ids[1])
+    else:
+        result = query.neighbourhood(ids[0], depth, direction)
+    return {"query": kind, "ids": ids, "result": result}
+
+
+def _query_text(record: Dict[str, Any]) -> str:
+    """Formats the query's result as text: the ids per line, the path's ids, or the distances and the ids per line."""
+    result = record["result"]
+    if record["query"] == "path":
+        return "" if result is None else " -> ".join(result) + "\n"
+    if record["query"] == "neighbourhood":
+        return "".join(f"{distance} {_id}\n" for _id, distance in result.items())
+    return "".join(f"{_id}\n" for _id in result)
+
+
+def _link_ends(links: Iterable[Link]) -> Dict[str, None]:
+    """Returns the ids of the links' ends in the order of the first occurrence."""
+    ids: Dict[str, None] = {}
+    for link in links:
+        ids[link.start] = None
+        ids[link.end] = None
+    return ids
+
+
+def _link_dsl(link: Link) -> str:
+    line = f"{link.start} {link.arrow} {link.end}"
+    return f"{line} : {link.description}" if link.description else line
+
+
+@dataclasses.dataclass
+class LinksDiff:
+    """Difference between the old and the new snapshots of the links.
+
+    Args:
+        added: Links of the new snapshot missing in the old one in the new snapshot's order.
+        removed: Links of the old snapshot missing in the new one in the old snapshot's order.
+        added_nodes: Ids of the new snapshot's links' ends missing in the old snapshot.
+        removed_nodes: Ids of the old snapshot's links' ends missing in the new snapshot.
+        old: Number of the links and of the nodes of the old snapshot.
+        new: Number of the links and of the nodes of the new snapshot.
+    """
+
+    added: List[Link]
+    removed: List[Link]
+    added_nodes: List[str]
+    removed_nodes: List[str]
+    old: Tuple[int, int]
+    new: Tuple[int, int]
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "old": {"links": self.old[0], "nodes": self.old[1]},
+            "new": {"links": self.new[0], "nodes": self.new[1]},
+            "added": {"links": [el.to_dict() for el in self.added], "nodes": self.added_nodes},
+            "removed": {"links": [el.to_dict() for el in self.removed], "nodes": self.removed_nodes},
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict())
+
+    def to_markdown(self, limit: int = 100) -> str:
+        """Returns the summary for the pull request's comment, at most limit items are listed per change."""
+        o = [
+            "### Architecture diff",
+            "",
+            "| | old | new | added | removed |",
+            "|---|---:|---:|---:|---:|",
+            f"| links | {self.old[0]} | {self.new[0]} | {len(self.added)} | {len(self.removed)} |",
+            f"| nodes | {self.old[1]} | {self.new[1]} | {len(self.added_nodes)} | {len(self.removed_nodes)} |",
+        ]
+        for title, rows in (
+            ("Added links", [_link_dsl(el) for el in self.added]),
+            ("Removed links", [_link_dsl(el) for el in self.removed]),
+            ("Added nodes", self.added_nodes),
+            ("Removed nodes", self.removed_nodes),
+        ):
+            if rows:
+                o.extend(("", f"<details><summary>{title} ({len(rows)})</summary>", ""))
+                o.extend(f"- `{el}`" for el in rows[:limit])
+                if len(rows) > limit:
+                    o.append(f"- ... {len(rows) - limit} more")
+                o.extend(("", "</details>"))
+        return "\n".join(o) + "\n"
+
+    def to_html(self, limit: int = 100) -> str:
+        """Returns the collapsible report's section of the page, at most limit items are listed per change."""
+        import urllib.parse
+
+        o = [
+            '<details style="margin:0 1vw 10px"><summary>',
+            f"Architecture diff: +{len(self.added)} / -{len(self.removed)} links, "
+            f"+{len(self.added_nodes)} / -{len(self.removed_nodes)} nodes",
+            "</summary>",
+        ]
+        for title, rows in (
+            ("Added links", [(el.start, _link_dsl(el)) for el in self.added]),
+            ("Removed links", [(el.start, _link_dsl(el)) for el in self.removed]),
+            ("Added nodes", [(el, el) for el in self.added_nodes]),
+            ("Removed nodes", [(el, el) for el in self.removed_nodes]),
+        ):
+            if rows:
+                o.append(f"<p>{title}:<ul>")
+                o.extend(
+                    f'<li><a href="?q={urllib.parse.quote(_id)}">{html.escape(text)}</a></li>'
+                    for _id, text in rows[:limit]
+                )
+                if len(rows) > limit:
+                    o.append(f"<li>... {len(rows) - limit} more</li>")
+                o.append("</ul>")
+        o.append("</details>")
+        return "".join(o)
+
+
+def diff_links(old: Links, new: Links) -> LinksDiff:
+    """Finds the links and the nodes added and removed between the snapshots in O(old + new).
+
+    The links are compared by their (start, arrow, end, description), the membership is checked by the collections'
+    hash sets.
+
+    Args:
+        old: Links of the old snapshot.
+        new: Links of the new snapshot.
+
+    Returns:
+        Difference between the snapshots.
+    """
+    old_ids, new_ids = _link_ends(old), _link_ends(new)
+    return LinksDiff(
+        [el for el in new if el not in old],
+        [el for el in old if el not in new],
+        [el for el in new_ids if el not in old_ids],
+        [el for el in old_ids if el not in new_ids],
+        (len(old), len(old_ids)),
+        (len(new), len(new_ids)),
+    )
+
+
+def _flatten_nodes(nodes: Nodes) -> Tuple[List[int], List[str], List[str]]:
+    """Flattens the tree depth first to the parents' indices (-1 for the roots), the names and the ids of the nodes.
+
+    Raises:
+        ValueError: raised when the node's id is not derived from its parent.
+    """
+    parents: List[int] = []
+    names: List[str] = []
+    node_ids: List[str] = []
+
+    stack = [(-1, el) for el in reversed(nodes)]
+    while stack:
+        parent, node = stack.pop()
+        expected = node.name if parent < 0 else f"{node_ids[parent]}{Node._SEPARATOR}{node.name}"
+        if node.id != expected:
+            raise ValueError("node id %s does not match its position in the tree" % node.id)
+        stack.extend((len(parents), el) for el in reversed(node.nodes))
+        parents.append(parent)
+        names.append(node.name)
+        node_ids.append(node.id)
+    return parents, names, node_ids
+
+
+def iter_compact_payload(nodes: Nodes, links: Links, classes: Classes) -> Iterator[str]:
+    """Serialises the page's data to the compact columnar JSON chunk by chunk.
+
+    The nodes' tree is flattened depth first to the arrays of the parents' indices ("p", -1 for the roots) and of the
+    names ("n"), the node's id is its parent's id joined with its name. The links are the columns of the indices of
+    the start ("ls") and end ("le") nodes, of the arrows ("la") in the arrows' table ("a") and of the descriptions
+    ("ld") in the descriptions' table ("d"). The classes' members ("c") and the links' index ("x") refer to the nodes
+    by their indices.
+
+    Args:
+        nodes: Nodes' tree built from the links' ids, e.g. by Links.get_nodes.
+        links: Links.
+        classes: Classes table.
+
+    Yields:
+        JSON chunks.
+
+    Raises:
+        ValueError: raised when the node's id is not derived from its parent, or the link's end is not in the tree.
+    """
+    parents, names, node_ids = _flatten_nodes(nodes)
+    ids = {_id: i for i, _id in enumerate(node_ids)}
+
+    arrows: Dict[str, int] = {}
+    descriptions: Dict[str, int] = {"": 0}
+    columns: Tuple[List[int], List[int], List[int], List[int]] = ([], [], [], [])
+    for link in links:
+        if link.start not in ids or link.end not in ids:
+            raise ValueError("link %r refers to the node which is not in the tree" % link)
+        columns[0].append(ids[link.start])
+        columns[1].append(ids[link.end])
+        columns[2].append(arrows.setdefault(link.arrow, len(arrows)))
+        columns[3].append(descriptions.setdefault(link.description, len(descriptions)))
+
+    yield '{"v":1,"p":'
+    yield from _iter_json_array(parents)
+    for key, value in (("n", names), ("a", list(arrows)), ("d", list(descriptions))):
+        yield f',"{key}":'
+        yield from _iter_json_array(value)
+    for key, column in zip(("ls", "le", "la", "ld"), columns):
+        yield f',"{key}":'
+        yield from _iter_json_array(column)
+    yield ',"c":'
+    yield from _iter_json_array(
+        [[ids[el.id], el.to_mermaid_members()] for el in classes if el.id in ids and (el.attributes or el.methods)]
+    )
+    yield ',"x":'
+    yield from _iter_json_array(list(build_link_index(links, node_ids).values()))
+    yield "}"
+
+
+def _iter_json_array(
+    values: List[Any], chunk_size: int = 2**14, separators: Tuple[str, str] = (",", ":")
+) -> Iterator[str]:
+    """Serialises the array to JSON in chunks of elements, the compact JSON by default."""
+    yield "["
+    for i in range(0, len(values), chunk_size):
+        if i > 0:
+            yield separators[0]
+        yield json.dumps(values[i : i + chunk_size], separators=separators)[1:-1]
+    yield "]"
+
+
+def _iter_json_object(
+    values: Dict[str, Any], chunk_size: int = 2**14, separators: Tuple[str, str] = (", ", ": ")
+) -> Iterator[str]:
+    """Serialises the object to JSON in chunks of items."""
+    yield "{"
+    items = iter(values.items())
+    chunk = dict(itertools.islice(items, chunk_size))
+    while chunk:
+        yield json.dumps(chunk, separators=separators)[1:-1]
+        chunk = dict(itertools.islice(items, chunk_size))
+        if chunk:
+            yield separators[0]
+    yield "}"
+
+
+@contextlib.contextmanager
+def _gc_paused() -> Iterator[None]:
+    """Pauses the garbage collector while the acyclic graph's objects are allocated in bulk.
+
+    The collections triggered by the allocations would traverse the growing graph repeatedly without freeing it.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+_GRAPH_MAGIC = b"PYARCHG\x00"
+_GRAPH_VERSION = 1
+# the sections of the snapshot in the order of the header's table of their (offset, size)
+_GRAPH_SECTIONS = (
+    "string_offsets",
+    "strings",
+    "node_parents",
+    "node_names",
+    "link_starts",
+    "link_ends",
+    "link_arrows",
+    "link_descriptions",
+    "class_fields",
+    "attribute_offsets",
+    "attributes",
+    "method_offsets",
+    "methods",
+)
+_GRAPH_HEADER = struct.Struct("<8sII" + "QQ" * len(_GRAPH_SECTIONS))
+
+
+def save_graph(path: str, links: Links, classes: Classes, nodes: Optional[Nodes] = None) -> None:
+    """Writes the graph to the versioned binary snapshot file.
+
+    The file consists of the header with the magic bytes, the format's version and the table of the sections' offsets
+    and sizes; the sections are aligned to 8 bytes. The strings are stored once in the table of their UTF-8 bytes and
+    the offsets; the other sections are the little-endian int32 arrays: the namespace tree flattened depth first to
+    the parents' indices (-1 for the roots) and the names' string indices; the links' start and end nodes' indices,
+    and their arrows' and descriptions' string indices; the classes' id, label, kind and stereotype string indices,
+    and their attributes and methods as the offsets to the arrays of the string indices.
+
+    Args:
+        path: Path to the file, the file is replaced atomically.
+        links: Links.
+        classes: Classes table.
+        nodes: Nodes' tree built from the links' ids, it is built by Links.get_nodes if not given.
+
+    Raises:
+        ValueError: raised when the link's end is not in the tree.
+        IOError: raised upon writing error.
+    """
+    parents, names, node_ids = _flatten_nodes(links.get_nodes() if nodes is None else nodes)
+    ids = {_id: i for i, _id in enumerate(node_ids)}
+    strings: Dict[str, int] = {}
+
+    def _strings(values: Iterable[str]) -> "array.array[int]":
+        return array.array("i", [strings.setdefault(el, len(strings)) for el in values])
+
+    sections: Dict[str, "array.array[int]"] = {"node_parents": array.array("i", parents), "node_names": _strings(names)}
+    try:
+        sections["link_starts"] = array.array("i", [ids[el.start] for el in links])
+        sections["link_ends"] = array.array("i", [ids[el.end] for el in links])
+    except KeyError as ex:
+        raise ValueError("link refers to the node %s which is not in the tree" % ex) from None
+    sections["link_arrows"] = _strings(el.arrow for el in links)
+    sections["link_descriptions"] = _strings(el.description for el in links)
+
+    sections["class_fields"] = _strings(v for el in classes for v in (el.id, el.label, el.kind, el.stereotype))
+    for key in ("attributes", "methods"):
+        sections[key[:-1] + "_offsets"] = array.array(
+            "i", itertools.accumulate(itertools.chain((0,), (len(getattr(el, key)) for el in classes)))
+        )
+        sections[key] = _strings(v for el in classes for v in getattr(el, key))
+
+    encoded = [el.encode() for el in strings]
+    sections["string_offsets"] = array.array("i", itertools.accumulate(itertools.chain((0,), map(len, encoded))))
+
+    blobs: List[bytes] = []
+    for name in _GRAPH_SECTIONS:
+        if name == "strings":
+            blobs.append(b"".join(encoded))
+            continue
+        values = sections[name]
+        if sys.byteorder == "big":
+            values.byteswap()
+        blobs.append(values.tobytes())
+
+    table: List[int] = []
+    offset = _GRAPH_HEADER.size
+    for blob in blobs:
+        offset += -offset % 8
+        table.extend((offset, len(blob)))
+        offset += len(blob)
+
+    import tempfile
+
+    fd, path_tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(_GRAPH_HEADER.pack(_GRAPH_MAGIC, _GRAPH_VERSION, len(_GRAPH_SECTIONS), *table))
+            for blob, start in zip(blobs, table[::2]):
+                f.write(b"\x00" * (start - f.tell()))
+                f.write(blob)
+        os.replace(path_tmp, path)
+    except BaseException:
+        os.remove(path_tmp)
+        raise
+
+
+class GraphSnapshot:
+    """Graph loaded from the binary snapshot file written by save_graph.
+
+    The file is memory-mapped, its int32 sections are exposed as zero-copy memoryviews, hence opening the snapshot
+    costs O(1) regardless of its size; the strings are decoded, and the links, nodes and classes are built on demand.
+
+    Example:
+        with GraphSnapshot("graph.pyarch") as snapshot:
+            links, classes = snapshot.links(), snapshot.classes()
+
+    Args:
+        path: Path to the file.
+
+    Raises:
+        ValueError: raised when the file is not the snapshot, or its version is not supported.
+        IOError: raised upon reading error.
+    """
+
+    def __init__(self, path: str) -> None:
+        with open(path, "rb") as f:
+            try:
+                self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise ValueError("file %s is not the pyarch graph snapshot" % path) from None
+
+        if len(self._mm) < _GRAPH_HEADER.size or self._mm[: len(_GRAPH_MAGIC)] != _GRAPH_MAGIC:
+            self._mm.close()
+            raise ValueError("file %s is not the pyarch graph snapshot" % path)
+
+        magic, version, n_sections, *table = _GRAPH_HEADER.unpack_from(self._mm)
+        if version != _GRAPH_VERSION or n_sections != len(_GRAPH_SECTIONS):
+            self._mm.close()
+            raise ValueError("graph snapshot %s of version %d is not supported" % (path, version))
+
+        for name, offset, size in zip(_GRAPH_SECTIONS, table[::2], table[1::2]):
+            if offset + size > len(self._mm) or (name != "strings" and size % 4 != 0):
+                self._mm.close()
+                raise ValueError("graph snapshot %s is truncated, or corrupted: invalid section %s" % (path, name))
+
+        self._views: List[memoryview] = [memoryview(self._mm)]
+        self._sections: Dict[str, Any] = {}
+        for name, offset, size in zip(_GRAPH_SECTIONS, table[::2], table[1::2]):
+            view = self._views[0][offset : offset + size]
+            self._views.append(view)
+            if name == "strings":
+                self._sections[name] = view
+            elif sys.byteorder == "little":
+                self._sections[name] = view.cast("i")
+                self._views.append(self._sections[name])
+            else:
+                values = array.array("i", view)
+                values.byteswap()
+                self._sections[name] = values
+
+        self._strings: Optional[List[str]] = None
+        self._node_ids: Optional[List[str]] = None
+
+    def close(self) -> None:
+        """Releases the views and unmaps the file."""
+        for view in reversed(self._views):
+            view.release()
+        self._views, self._sections = [], {}
+        self._mm.close()
+
+    def __enter__(self) -> "GraphSnapshot":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    def section(self, name: str) -> Any:
+        """Returns the section's zero-copy view, e.g. link_starts, see save_graph."""
+        return self._sections[name]
+
+    def __len__(self) -> int:
+        """Returns the number of the links."""
+        return len(self._sections["link_starts"])
+
+    @property
+    def strings(self) -> List[str]:
+        if self._strings is None:
+            offsets, blob = self._sections["string_offsets"], self._sections["strings"]
+            self._strings = [str(blob[offsets[i] : offsets[i + 1]], "utf-8") for i in range(len(offsets) - 1)]
+        return self._strings
+
+    @property
+    def node_ids(self) -> List[str]:
+        """Nodes' ids in the order of the flattened tree."""
+        if self._node_ids is None:
+            strings = self.strings
+            o: List[str] = []
+            with _gc_paused():
+                for parent, name in zip(self._sections["node_parents"], self._sections["node_names"]):
+                    o.append(
+                        sys.intern(strings[name] if parent < 0 else f"{o[parent]}{Node._SEPARATOR}{strings[name]}")
+                    )
+            self._node_ids = o
+        return self._node_ids
+
+    def nodes(self) -> Nodes:
+        strings, ids = self.strings, self.node_ids
+        o = Nodes()
+        index: List[Node] = []
+        with _gc_paused():
+            for i, (parent, name) in enumerate(zip(self._sections["node_parents"], self._sections["node_names"])):
+                node = Node(ids[i], strings[name], Nodes())
+                (o if parent < 0 else index[parent].nodes).append(node)
+                index.append(node)
+        return o
+
+    def links(self) -> Links:
+        strings, ids = self.strings, self.node_ids
+        columns = (self._sections[el] for el in ("link_starts", "link_arrows", "link_ends", "link_descriptions"))
+        with _gc_paused():
+            return Links(
+                Link.from_parts(ids[start], strings[arrow], ids[end], strings[description])
+                for start, arrow, end, description in zip(*columns)
+            )
+
+    def classes(self) -> Classes:
+        strings = self.strings
+        fields = self._sections["class_fields"]
+        members = [(self._sections[el + "_offsets"], self._sections[el + "s"]) for el in ("attribute", "method")]
+        o = Classes()
+        with _gc_paused():
+            for i in range(len(fields) // 4):
+                _id, label, kind, stereotype = (strings[el] for el in fields[4 * i : 4 * i + 4])
+                attributes, methods = (
+                    tuple(strings[el] for el in values[offsets[i] : offsets[i + 1]]) for offsets, values in members
+                )
+                o.add(Class(_id, label, kind, stereotype, attributes, methods))
+        return o
+
+
+# the page decodes the compact payload to the same data as the default page embeds
+_TEMPLATE_COMPACT = _TEMPLATE.replace(
+    _TEMPLATE_DATA,
+    "function decodePayload(e){let t=[],l=[],i=[];for(let n=0;n<e.p.length;n++){let s=e.p[n],r=s<0?e.n[n]:`${t[s]}."
+    "${e.n[n]}`,a={id:r,name:e.n[n],nodes:[]};t.push(r),(s<0?l:i[s].nodes).push(a),i.push(a)}let o=e.ls.map((l,i)=>({"
+    "start:t[l],end:t[e.le[i]],arrow:e.a[e.la[i]],description:e.d[e.ld[i]]})),c={},d={};for(let[h,f]of e.c)c[t[h]]=f;"
+    "return e.x.forEach((e,l)=>d[t[l]]=e),{nodes:l,links:o,classes:c,linkIndex:d}}const{nodes,links,classes,linkIndex"
+    "}=decodePayload({{.Payload}}),diagrams={{.Diagrams}};",
+)
+
+
+_TEMPLATE_PLACEHOLDER = re.compile(r"\{\{\.(\w+)\}\}")
+
+
+def _split_template(template: str) -> Tuple[str, ...]:
+    """Splits the template into the literal segments alternating with the placeholders' names."""
+    return tuple(_TEMPLATE_PLACEHOLDER.split(template))
+
+
+_SEGMENTS = _split_template(_TEMPLATE)
+_SEGMENTS_SHARDED = _split_template(_TEMPLATE_SHARDED)
+_SEGMENTS_COMPACT = _split_template(_TEMPLATE_COMPACT)
+
+
+def render_template(fout: TextIO, segments: Tuple[str, ...], values: Dict[str, Union[str, Iterable[str]]]) -> None:
+    """Writes the template to the file-like object in a single pass.
+
+    Args:
+        fout: File-like object to write to.
+        segments: Template split by _split_template.
+        values: Placeholders' values as strings, or as iterables of chunks, e.g. generators of JSON chunks.
+
+    Raises:
+        KeyError: raised when the placeholder's value is not given.
+    """
+    for i, segment in enumerate(segments):
+        if i % 2 == 0:
+            fout.write(segment)
+            continue
+        value = values[segment]
+        if isinstance(value, str):
+            fout.write(value)
+        else:
+            for chunk in value:
+                fout.write(chunk)
+
+
+def shard_links(links: Links, prefixes: Iterable[str]) -> Dict[str, List[Link]]:
+    """Groups the links by the prefixes of their ends' ids.
+
+    The link belongs to the prefix's group if the id of either of its ends starts with the prefix. The prefixes are
+    matched as strings, the same as the page selects the links of a node.
+
+    Args:
+        links: Links.
+        prefixes: Ids' prefixes, e.g. the ids of the top-level packages.
+
+    Returns:
+        Links grouped by the prefixes, the links' order is preserved.
+    """
+    o: Dict[str, List[Link]] = {el: [] for el in prefixes}
+    lengths = sorted({len(el) for el in o})
+    for link in links:
+        matched = {_id[:k] for _id in (link.start, link.end) for k in lengths if _id[:k] in o}
+        for prefix in matched:
+            o[prefix].append(link)
+    return o
+
+
+@dataclasses.dataclass
+class WebpageGenerator:
+    nodes: Nodes
+    links: Links
+    cfg: WebpageConfig
+    classes: Classes = dataclasses.field(default_factory=Classes)
+    compact: bool = False
+    diagrams: Dict[str, str] = dataclasses.field(default_factory=dict)
+    report: str = ""
+    index_min_links: int = _LINK_INDEX_MIN_LINKS
+
+    @classmethod
+    def from_puml(
+        cls, *inputs: PumlInput, cfg: Optional[WebpageConfig] = None, compact: bool = False
+    ) -> "WebpageGenerator":
+        """Creates the generator of the page of the PUML DSL inputs.
+
+        The template is split once at import, hence the generator can be created, and rendered many times per
+        process at the cost of the graph's serialisation only.
+
+        Args:
+            inputs: Paths of the PUML files, or of the directories with {classes,packages}.puml files, or the file
+                objects, or other iterables of the PUML DSL lines, see read_puml.
+            cfg: Page templating configuration, the default one if None.
+            compact: Embed the compact payload instead of the JSON data.
+
+        Returns:
+            Page's generator.
+
+        Raises:
+            FileNotFoundError: raised when the inputs are not found.
+            IOError: raised upon reading error.
+        """
+        links, classes = read_puml(*inputs)
+        return cls(links.get_nodes(), links, cfg or WebpageConfig(), classes, compact)
+
+    def __call__(self) -> str:
+        """Creates the webpage with architecture details."""
+        o = io.StringIO()
+        self.render(o)
+        return o.getvalue()
+
+    def render(self, fout: TextIO) -> None:
+        """Writes the webpage with architecture details to the file-like object.
+
+        The template is filled in a single pass, the data is written in JSON chunks as it is serialised, hence the
+        page is not copied in memory.
+        """
+        values = self._page_values()
+        values["Diagrams"] = _diagrams_json(self.diagrams)
+        if self.compact:
+            values["Payload"] = iter_compact_payload(self.nodes, self.links, self.classes)
+            render_template(fout, _SEGMENTS_COMPACT, values)
+            return
+
+        values["Nodes"] = self.nodes.iter_json()
+        values["Links"] = self.links.iter_json()
+        values["Classes"] = self.classes.to_json()
+        # the index of the links selected by the nodes is embedded for the graphs of at least index_min_links links
+        index = build_link_index(self.links, self.nodes.iter_ids()) if len(self.links) >= self.index_min_links else {}
+        values["Index"] = _iter_json_object(index)
+        render_template(fout, _SEGMENTS, values)
+
+    def _page_values(self) -> Dict[str, Union[str, Iterable[str]]]:
+        return {
+            "Title": self.cfg.title,
+            "Header": self.cfg.header,
+            "Footer": self.cfg.footer if self.cfg.footer != "" else WebpageConfig.footer,
+            "When": f" on {now_utc()}",
+            "Report": self.report,
+            "Search": json.dumps(build_search_index(self.nodes.iter_ids()), separators=(",", ":")),
+        }
+
+    def write_sharded(self, path: str, data_dir: str = "data") -> List[str]:
+        """Writes the shell webpage with the links sharded by the top-level packages.
+
+        The page fetches the manifest and the shard of the selected node's top-level package. The shards' file names
+        contain the hash of their content, hence the shards can be cached by the static hosts for long term; the stale
+        shards are removed. The page must be served over http(s) to fetch the shards.
+
+        Args:
+            path: Output directory.
+            data_dir: Directory for the manifest and the shards relative to the output directory.
+
+        Returns:
+            Paths of the written files.
+        """
+        import hashlib
+
+        os.makedirs(os.path.join(path, data_dir), exist_ok=True)
+
+        o = []
+        manifest: Dict[str, str] = {}
+        for node, (prefix, links) in zip(self.nodes, shard_links(self.links, [el.id for el in self.nodes]).items()):
+            ids = {_id for el in links for _id in (el.start, el.end)}
+            classes = Classes(el for el in self.classes if el.id in ids)
+            node_ids = list(Nodes([node]).iter_ids())
+            index = json.dumps(build_link_index(links, node_ids))
+            diagrams = _diagrams_json({el: self.diagrams[el] for el in node_ids if el in self.diagrams})
+            content = (
+                f'{{"links": {Links(links).to_json()}, "classes": {classes.to_json()}, "index": {index}, '
+                f'"diagrams": {diagrams}}}'
+            ).encode()
+
+            name = re.sub(r"[^A-Za-z0-9_-]", "_", prefix) or "_"
+            manifest[prefix] = f"{name}.{hashlib.sha256(content).hexdigest()[:12]}.json"
+            o.append(os.path.join(path, data_dir, manifest[prefix]))
+            if not isfile(o[-1]):
+                with open(o[-1], "wb") as f:
+                    f.write(content)
+
+        shards = set(manifest.values())
+        for el in os.listdir(os.path.join(path, data_dir)):
+            if re.fullmatch(r".+\.[0-9a-f]{12}\.json", el) and el not in shards:
+                os.remove(os.path.join(path, data_dir, el))
+
+        o.append(os.path.join(path, data_dir, "manifest.json"))
+        with open(o[-1], "w") as f:
+            f.write(json.dumps({"version": 1, "shards": manifest}))
+
+        values = self._page_values()
+        values["Nodes"] = self.nodes.to_json()
+        values["Data"] = data_dir
+        o.append(os.path.join(path, "index.html"))
+        with open(o[-1], "w") as f:
+            render_template(f, _SEGMENTS_SHARDED, values)
+
+        return o
+
+
+def diff_page(diff: LinksDiff, old_classes: Classes, new_classes: Classes, cfg: WebpageConfig) -> WebpageGenerator:
+    """Creates the page of the changed links.
+
+    The added and the removed links are labelled by the change, the added and the removed nodes are annotated with
+    <<added>> and <<removed>>, and the summary of the changes is embedded as the report.
+
+    Args:
+        diff: Difference between the snapshots.
+        old_classes: Classes table of the old snapshot, used for the removed links.
+        new_classes: Classes table of the new snapshot.
+        cfg: Page templating configuration.
+
+    Returns:
+        Page generator.
+    """
+    links = Links()
+    for change, rows in (("added", diff.added), ("removed", diff.removed)):
+        for el in rows:
+            label = f"{change} {el.description}" if el.description else change
+            links.append(Link.from_parts(el.start, el.arrow, el.end, label))
+
+    annotations = {**{el: "<<removed>>" for el in diff.removed_nodes}, **{el: "<<added>>" for el in diff.added_nodes}}
+    classes = Classes()
+    for _id in _link_ends(links):
+        row = new_classes.get(_id) or old_classes.get(_id)
+        if _id in annotations or row is not None:
+            attributes = () if row is None else row.attributes
+            classes.add(
+                Class(
+                    _id,
+                    _id if row is None else row.label,
+                    "class" if row is None else row.kind,
+                    "" if row is None else row.stereotype,
+                    ((annotations[_id],) if _id in annotations else ()) + attributes,
+                    () if row is None else row.methods,
+                )
+            )
+
+    return WebpageGenerator(links.get_nodes(), links, cfg, classes, report=diff.to_html())
+
+
+@dataclasses.dataclass
+class BatchJob:
+    """Page of the package to build in the batch.
+
+    Args:
+        output: Path to the page's file relative to the batch's output directory.
+        input: Directory with {classes,packages}.puml files.
+        source: Directory with the package source code to analyse instead of the PUML DSL.
+        title: Page title, also used as the label of the link to the page in the index.
+        header: Page header, defaults to the title.
+        ignore: Base names of the files and directories to skip with source.
+        compact: Embed the data to the page using the compact columnar JSON encoding.
+    """
+
+    output: str
+    input: Optional[str] = None
+    source: Optional[str] = None
+    title: str = WebpageConfig.title
+    header: str = ""
+    ignore: List[str] = dataclasses.field(default_factory=list)
+    compact: bool = False
+
+
+def read_batch_manifest(path: str) -> List[BatchJob]:
+    """Reads the manifest of the batch: the JSON array of objects with the attributes of BatchJob.
+
+    The jobs' input and source directories are relative to the manifest's directory; the output defaults to the base
+    name of the input, or of the source with the .html extension.
+
+    Raises:
+        ValueError: raised when the manifest is malformed.
+    """
+    with open(path) as f:
+        rows = json.load(f)
+    if not isinstance(rows, list):
+        raise ValueError("manifest %s must be the JSON array of the jobs" % path)
+
+    o = []
+    base = os.path.dirname(os.path.abspath(path))
+    for i, row in enumerate(rows):
+        if not isinstance(row, dict) or ("input" in row) == ("source" in row):
+            raise ValueError("job %d of manifest %s must define either input, or source" % (i, path))
+        try:
+            job = BatchJob(**{"output": "", **row})
+        except TypeError as ex:
+            raise ValueError("job %d of manifest %s: %s" % (i, path, ex)) from None
+
+        if job.input is not None:
+            job.input = os.path.join(base, job.input)
+        if job.source is not None:
+            job.source = os.path.join(base, job.source)
+        if job.output == "":
+            job.output = os.path.basename(os.path.normpath(row.get("input") or row["source"])) + ".html"
+        o.append(job)
+
+    outputs = [os.path.normpath(el.output) for el in o]
+    if len(set(outputs)) != len(outputs) or "index.html" in outputs:
+        raise ValueError("outputs of manifest %s must be unique and differ from index.html" % path)
+    return o
+
+
+def _batch_job_size(job: BatchJob) -> int:
+    """Returns the size of the job's inputs in bytes to schedule the largest jobs first, 0 if they are not found."""
+    try:
+        if job.input is not None:
+            return sum(os.path.getsize(el) for el in _iter_puml_paths(job.input))
+        return sum(os.path.getsize(el[1]) for el in iter_source_modules(job.source or "", job.ignore))
+    except OSError:
+        return 0
+
+
+def _iter_puml_paths(path: str) -> Iterator[str]:
+    for el in (f"{path}/packages.puml", f"{path}/classes.puml"):
+        if isfile(el):
+            yield el
+
+
+def load_snapshot(
+    path: str, source: bool = False, ignore: Iterable[str] = (), cache: Optional[Cache] = None
+) -> Tuple[Links, Classes]:
+    """Loads the links and the classes of the package's snapshot.
+
+    Args:
+        path: Graph snapshot file written by save_graph, or the directory with {classes,packages}.puml files, or with
+            the package source code if source.
+        source: Analyse the package source code instead of the PUML DSL.
+        ignore: Base names of the files and directories to skip with source.
+        cache: Cache of the parsed inputs.
+
+    Returns:
+        Links and the classes table.
+
+    Raises:
+        FileNotFoundError: raised when no inputs are found.
+        ValueError: raised when the file is not the graph snapshot.
+        IOError: raised upon reading error.
+    """
+    if isfile(path):
+        with GraphSnapshot(path) as snapshot:
+            return snapshot.links(), snapshot.classes()
+
+    if source:
+        return analyze_source(path, ignore, cache)
+
+    paths = list(_iter_puml_paths(path))
+    if len(paths) == 0:
+        raise FileNotFoundError("no {classes,packages}.puml files found in %s" % path)
+    return parse_puml_files(paths, 1, cache)
+
+
+def build_batch_job(job: BatchJob, output: str, footer: str, cache_dir: Optional[str] = None) -> Dict[str, Any]:
+    """Builds the page of the batch's job.
+
+    Args:
+        job: Job to build.
+        output: Batch's output directory.
+        footer: Footer of the page.
+        cache_dir: Directory of the cache of the parsed inputs shared by the jobs, the cache is not used if None.
+
+    Returns:
+        Job's summary: the output, the number of links and nodes, and the build time in seconds.
+
+    Raises:
+        ValueError: raised when no relations are found.
+        IOError: raised upon reading, or writing error.
+    """
+    start = time.perf_counter()
+    cache = None if cache_dir is None else Cache(cache_dir)
+    if job.source is not None:
+        links, classes = analyze_source(job.source, job.ignore, cache)
+    else:
+        links, classes = parse_puml_files(_iter_puml_paths(job.input or ""), 1, cache)
+
+    if len(links) == 0:
+        raise ValueError("no relations found in %s" % (job.source or job.input))
+
+    nodes = links.get_nodes()
+    cfg = WebpageConfig(job.title, job.header or job.title, footer)
+
+    path = os.path.join(output, job.output)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as fout:
+        WebpageGenerator(nodes, links, cfg, classes, job.compact).render(fout)
+
+    return {
+        "output": job.output,
+        "links": len(links),
+        "nodes": sum(1 for _ in nodes.iter_ids()),
+        "seconds": time.perf_counter() - start,
+    }
+
+
+def run_batch(
+    jobs: List[BatchJob],
+    output: str,
+    cfg: WebpageConfig,
+    workers: int = 1,
+    cache_dir: Optional[str] = None,
+) -> Tuple[List[Dict[str, Any]], Dict[str, str]]:
+    """Builds the pages of the jobs and the index page linking them.
+
+    The jobs are built in the process pool of at most workers processes, the largest jobs by their inputs' size are
+    scheduled first, hence the total time tends to the time of the largest job given enough workers. The workers
+    inherit the template split at import, and build several jobs each.
+
+    Args:
+        jobs: Jobs to build.
+        output: Directory to write the pages and the index.html to.
+        cfg: Title, header and footer of the index page; the footer is also used by the pages.
+        workers: Number of the worker processes, the jobs are built in the current process if workers < 2.
+        cache_dir: Directory of the cache of the parsed inputs, the cache is not used if None.
+
+    Returns:
+        Summaries of the built jobs in the manifest's order, and the errors of the failed jobs by their outputs.
+    """
+    footer = cfg.footer if cfg.footer != "" else WebpageConfig.footer
+    os.makedirs(output, exist_ok=True)
+    sizes = [_batch_job_size(el) for el in jobs]
+    order = sorted(range(len(jobs)), key=lambda i: -sizes[i])
+
+    results: Dict[int, Dict[str, Any]] = {}
+    errors: Dict[str, str] = {}
+    if workers < 2 or len(jobs) < 2:
+        for i in order:
+            try:
+                results[i] = build_batch_job(jobs[i], output, footer, cache_dir)
+            except (IOError, ValueError, SyntaxError) as ex:
+                errors[jobs[i].output] = str(ex)
+    else:
+        import concurrent.futures
+
+        with concurrent.futures.ProcessPoolExecutor(min(workers, len(jobs))) as executor:
+            futures = {executor.submit(build_batch_job, jobs[i], output, footer, cache_dir): i for i in order}
+            for future in concurrent.futures.as_completed(futures):
+                i = futures[future]
+                try:
+                    results[i] = future.result()
+                except (IOError, ValueError, SyntaxError) as ex:
+                    errors[jobs[i].output] = str(ex)
+
+    summaries = [results[i] for i in sorted(results)]
+    with open(os.path.join(output, "index.html"), "w") as fout:
+        write_batch_index(fout, [(jobs[i].output, jobs[i].title, results[i]) for i in sorted(results)], cfg)
+    return summaries, errors
+
+
+_INDEX_TEMPLATE = """<!doctypehtml><html lang=en><title>{{.Title}}</title><meta content="width=device-width,initial-scale=1"name=viewport><meta charset=UTF-8><style>:root{font-family:Inter,system-ui,Avenir,Helvetica,Arial,sans-serif;line-height:1.5;font-weight:400;background:rgb(245, 245, 245)}header{font-size:2rem;font-weight:700;margin-bottom:10px;text-align:center}ul{list-style-type:none;max-width:60rem;margin:auto;padding:0}li{display:flex;justify-content:space-between;border-bottom:1px solid #7f7f7f;padding:.5rem 0}a{color:#000}a:active,a:hover,a:link,a:visited{text-decoration:none}.info{font-weight:300}footer{padding:1rem;text-align:center}</style><header>{{.Header}}</header><ul>{{.Items}}</ul><footer><p style=font-size:15px>Generated by <a href=https://github.com/kislerdm/pyarch target=_blank>pyarch</a> {{.When}}</p>{{.Footer}}</footer></html>"""
+
+_SEGMENTS_INDEX = _split_template(_INDEX_TEMPLATE)
+
+
+def write_batch_index(fout: TextIO, pages: Iterable[Tuple[str, str, Dict[str, Any]]], cfg: WebpageConfig) -> None:
+    """Writes the index page linking the pages.
+
+    Args:
+        fout: File-like object to write to.
+        pages: Pages' paths relative to the index, their titles and summaries with the number of links and nodes.
+        cfg: Title, header and footer of the index page.
+    """
+    import urllib.parse
+
+    items = (
+        f'<li><a href="{urllib.parse.quote(path.replace(os.sep, "/"))}">{html.escape(title)}</a>'
+        f'<span class=info>{summary["nodes"]} nodes, {summary["links"]} links</span></li>'
+        for path, title, summary in pages
+    )
+    render_template(
+        fout,
+        _SEGMENTS_INDEX,
+        {
+            "Title": cfg.title,
+            "Header": cfg.header,
+            "Footer": cfg.footer if cfg.footer != "" else WebpageConfig.footer,
+            "When": f" on {now_utc()}",
+            "Items": items,
+        },
+    )
+
+
+class Workspace:
+    """Graph of the inputs kept in memory and updated incrementally.
+
+    The inputs are either the directory with the {classes,packages}.puml files, or the python package's source. The
+    files are polled for the changes of their modification time and size, only the changed files are parsed on update.
+    The modules' relations are resolved again only for the changed modules unless the set of the modules, or of the
+    classes changed.
+
+    Args:
+        path: Directory with the {classes,packages}.puml files, or the package's source directory.
+        source: True if the path is the package's source directory.
+        ignore: Base names of the files and directories to skip in the package's source.
+    """
+
+    def __init__(self, path: str, source: bool = False, ignore: Iterable[str] = ()) -> None:
+        self.path = path
+        self.source = source
+        self.ignore = list(ignore)
+        self.generation = 0
+        self.nodes = Nodes()
+        self.links = Links()
+        self.classes = Classes()
+
+        self._stats: Dict[str, Tuple[int, int]] = {}
+        self._tables: Dict[str, Tuple[Links, Classes]] = {}
+        self._summaries: Dict[str, ModuleSummary] = {}
+        self._module_links: Dict[str, Tuple[List[Link], List[Link], List[Class]]] = {}
+        self._modules: Set[str] = set()
+        self._class_ids: Set[str] = set()
+        self._ids: List[str] = []
+        self._groups = [Links(), Links()]
+        self._classes = Classes()
+        self._dirty: Set[int] = set()
+        self._dirs: Dict[str, int] = {}
+        self._files: List[Tuple[str, str, bool]] = []
+
+    def _list_files(self) -> List[Tuple[str, str, bool]]:
+        if not self.source:
+            return [("", el, False) for el in (f"{self.path}/packages.puml", f"{self.path}/classes.puml") if isfile(el)]
+
+        # the package is walked again only if any of its directories changed, i.e. a file was added, or removed
+        for path, mtime in self._dirs.items():
+            try:
+                if os.stat(path).st_mtime_ns != mtime:
+                    break
+            except OSError:
+                break
+        else:
+            if self._dirs:
+                return self._files
+
+        self._dirs, self._files = {}, []
+        for path, modules in _iter_source_dirs(self.path, set(self.ignore)):
+            self._dirs[path] = os.stat(path).st_mtime_ns
+            self._files.extend(modules)
+        return self._files
+
+    def update(self) -> List[str]:
+        """Parses the files changed since the last update and rebuilds the graph.
+
+        Returns:
+            Paths of the changed files, the generation of the graph is incremented if the graph changed.
+
+        Raises:
+            IOError: raised upon reading error.
+        """
+        files: Dict[str, Tuple[str, bool]] = {}
+        changed = []
+        for module, path, is_package in self._list_files():
+            files[path] = (module, is_package)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            if self._stats.get(path) != (st.st_mtime_ns, st.st_size):
+                self._stats[path] = (st.st_mtime_ns, st.st_size)
+                changed.append(path)
+
+        removed = [el for el in self._stats if el not in files]
+        if removed:
+            self._dirty = {0, 1, 2}
+        for path in removed:
+            del self._stats[path]
+            self._tables.pop(path, None)
+            self._summaries.pop(path, None)
+            self._module_links.pop(path, None)
+
+        if not changed and not removed:
+            return []
+
+        if self.source:
+            graph_changed = self._update_modules(files, changed) or bool(removed)
+        else:
+            graph_changed = self._update_puml(changed) or bool(removed)
+
+        if graph_changed:
+            with _gc_paused():
+                self._rebuild(files)
+            self.generation += 1
+        return changed + removed
+
+    def _update_puml(self, changed: List[str]) -> bool:
+        o = False
+        for path in changed:
+            parser = PumlParser()
+            try:
+                parser.feed(iter_input_puml(path))
+            except (OSError, ValueError) as ex:
+                raise IOError(ex) from ex
+            table = (parser.links, parser.classes)
+            o = o or self._tables.get(path) != table
+            self._tables[path] = table
+        return o
+
+    def _update_modules(self, files: Dict[str, Tuple[str, bool]], changed: List[str]) -> bool:
+        updated = []
+        for path in changed:
+            try:
+                with open(path, "rb") as f:
+                    source = f.read()
+            except OSError as ex:
+                raise IOError(ex) from ex
+
+            module, is_package = files[path]
+            try:
+                summary = summarize_module(module, source.decode("utf-8", errors="replace"), is_package)
+            except SyntaxError as ex:
+                _LOGS.warning("skip %s: %s" % (path, ex))
+                if self._summaries.pop(path, None) is not None:
+                    self._module_links.pop(path, None)
+                    self._dirty = {0, 1, 2}
+                continue
+
+            # the edits which do not change the module's summary, e.g. of the functions' bodies, keep the graph
+            if self._summaries.get(path) != summary:
+                self._summaries[path] = summary
+                updated.append(path)
+
+        modules = {el.module for el in self._summaries.values()}
+        class_ids = {f"{el.module}.{cls.name}" for el in self._summaries.values() for cls in el.classes}
+        if modules != self._modules or class_ids != self._class_ids:
+            self._modules, self._class_ids = modules, class_ids
+            updated = list(self._summaries)
+
+        for path in updated:
+            summary = self._summaries[path]
+            parts = (
+                _link_module_imports(summary, modules),
+                _link_module_classes(summary, class_ids),
+                _module_classes(summary),
+            )
+            previous = self._module_links.get(path)
+            self._dirty.update(i for i, el in enumerate(parts) if previous is None or previous[i] != el)
+            self._module_links[path] = parts
+        return len(self._dirty) > 0
+
+    def _rebuild(self, files: Dict[str, Tuple[str, bool]]) -> None:
+        if self.source:
+            # the modules' imports and the classes' relations are disjoint by the arrows, hence only the changed
+            # group of the links is deduplicated again
+            paths = [el for el in files if el in self._module_links]
+            if 0 in self._dirty:
+                self._groups[0] = Links(el for path in paths for el in self._module_links[path][0])
+            if 1 in self._dirty:
+                self._groups[1] = Links(el for path in paths for el in self._module_links[path][1])
+            if 2 in self._dirty:
+                self._classes = _copy_classes(el for path in paths for el in self._module_links[path][2])
+            self._dirty = set()
+
+            links = Links.concat(*self._groups)
+            classes = self._classes
+        else:
+            links = Links(el for path in files if path in self._tables for el in self._tables[path][0])
+            classes = _copy_classes(el for path in files if path in self._tables for el in self._tables[path][1])
+
+        # the nodes' tree is rebuilt only if the order of the links' ends changed
+        ids: Dict[str, None] = {}
+        for link in links:
+            ids[link.start] = None
+            ids[link.end] = None
+        if list(ids) != self._ids:
+            self._ids = list(ids)
+            self.nodes = Nodes.from_ids(self._ids)
+        self.links, self.classes = links, classes
+
+
+def _copy_classes(classes: Iterable[Class]) -> Classes:
+    """Merges the classes to the new table without changing them."""
+    o = Classes()
+    for el in classes:
+        o.add(Class(el.id, el.label, el.kind, el.stereotype, el.attributes, el.methods))
+    return o
+
+
+# the page served by Server reloads upon the rebuild of the graph
+_RELOAD_SCRIPT = (
+    "<script>(()=>{let e=%d;setInterval(async()=>{try{let t=await(await fetch('/version')).text();+t!==e&&location.r"
+    "eload()}catch(t){}},1e3)})()</script>"
+)
+
+
+class Server:
+    """Local HTTP server of the workspace's page and data.
+
+    The server responds to GET requests: / with the page, /data.json with the nodes, links and classes, and /version
+    with the graph's generation which the page polls to reload upon the rebuild.
+
+    Args:
+        workspace: Workspace to serve.
+        cfg: Page templating configuration.
+        interval: Interval in seconds to poll the workspace's files for the changes.
+    """
+
+    def __init__(self, workspace: Workspace, cfg: WebpageConfig, interval: float = 0.5) -> None:
+        self.workspace = workspace
+        self.cfg = cfg
+        self.interval = interval
+        self._responses: Dict[str, Tuple[int, bytes]] = {}
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8000, watch: bool = False) -> None:
+        """Serves the workspace until cancelled.
+
+        Args:
+            host: Host to bind.
+            port: Port to bind.
+            watch: True to rebuild the graph upon the changes of the workspace's files.
+        """
+        import asyncio
+
+        # the graph is long-lived, hence it is moved out of the collected generations: the collections triggered by the
+        # rebuilds do not traverse it, which takes the most of the rebuild's time for the large graphs otherwise
+        gc.freeze()
+        server = await asyncio.start_server(self._handle, host, port)
+        _LOGS.info("serving %s on http://%s:%d" % (self.workspace.path, host, port))
+        async with server:
+            if watch:
+                await asyncio.gather(server.serve_forever(), self.watch())
+            else:
+                await server.serve_forever()
+
+    async def watch(self) -> None:
+        """Polls the workspace's files and rebuilds the graph upon the changes."""
+        import asyncio
+
+        while True:
+            await asyncio.sleep(self.interval)
+            start = time.perf_counter()
+            try:
+                changed = self.update()
+            except IOError as ex:
+                _LOGS.error(ex)
+                continue
+            if changed:
+                _LOGS.info(
+                    "%d files changed, rebuilt in %.1f ms, generation %d"
+                    % (len(changed), (time.perf_counter() - start) * 1e3, self.workspace.generation)
+                )
+
+    def update(self) -> List[str]:
+        """Updates the workspace's graph.
+
+        The rebuild runs with the previous graph frozen, the collections it triggers do not traverse it. The graph has no
+        reference cycles, hence the replaced one is freed by the reference counting; the permanent generation is
+        unfrozen and frozen again after the rebuild, hence it holds the current graph only.
+
+        Returns:
+            Paths of the changed files.
+
+        Raises:
+            IOError: raised upon reading error.
+        """
+        changed = self.workspace.update()
+        if changed:
+            gc.unfreeze()
+            gc.freeze()
+        return changed
+
+    def respond(self, method: str, target: str) -> Tuple[int, str, bytes]:
+        """Returns the status, the content type and the body of the response to the request."""
+        if method not in ("GET", "HEAD"):
+            return 405, "text/plain", b"method not allowed"
+
+        import urllib.parse
+
+        path = urllib.parse.urlsplit(target).path
+        if path == "/version":
+            return 200, "text/plain", str(self.workspace.generation).encode()
+        if path in ("/", "/index.html"):
+            return 200, "text/html; charset=utf-8", self._cached("page", self._page)
+        if path == "/data.json":
+            return 200, "application/json", self._cached("data", self._data)
+        return 404, "text/plain", b"not found"
+
+    def _cached(self, key: str, fn: Callable[[], bytes]) -> bytes:
+        generation = self.workspace.generation
+        cached = self._responses.get(key)
+        if cached is None or cached[0] != generation:
+            cached = self._responses[key] = (generation, fn())
+        return cached[1]
+
+    def _page(self) -> bytes:
+        ws = self.workspace
+        o = io.StringIO()
+        WebpageGenerator(ws.nodes, ws.links, self.cfg, ws.classes).render(o)
+        o.write(_RELOAD_SCRIPT % ws.generation)
+        return o.getvalue().encode()
+
+    def _data(self) -> bytes:
+        ws = self.workspace
+        return (
+            f'{{"nodes": {ws.nodes.to_json()}, "links": {ws.links.to_json()}, "classes": {ws.classes.to_json()}}}'
+        ).encode()
+
+    async def _handle(self, reader: "asyncio.StreamReader", writer: "asyncio.StreamWriter") -> None:
+        import http
+
+        try:
+            request = (await reader.readline()).decode("latin-1").split()
+            while (await reader.readline()).strip():
+                pass
+            if len(request) != 3:
+                return
+
+            status, content_type, body = self.respond(request[0], request[1])
+            writer.write(
+                (
+                    f"HTTP/1.1 {status} {http.HTTPStatus(status).phrase}\r\nContent-Type: {content_type}\r\n"
+                    f"Content-Length: {len(body)}\r\nCache-Control: no-store\r\nConnection: close\r\n\r\n"
+                ).encode()
+            )
+            if request[0] != "HEAD":
+                writer.write(body)
+            await writer.drain()
+        except (ConnectionError, UnicodeDecodeError) as ex:
+            _LOGS.debug(ex)
+        finally:
+            writer.close()
+
+
+def _peak_rss_kb() -> int:
+    """Returns the peak resident set size of the process in kilobytes, 0 if it cannot be measured on the platform."""
+    try:
+        import resource
+    except ImportError:
+        return 0
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports the peak RSS in bytes
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+@dataclasses.dataclass
+class Stage:
+    """Measurements of the pipeline's stage.
+
+    Args:
+        name: Stage name.
+        wall: Wall time in seconds.
+        cpu: CPU time of the process in seconds.
+        rss_kb: Increase of the process' peak RSS in kilobytes.
+        counts: Inputs' and outputs' counts, e.g. the number of links.
+    """
+
+    name: str
+    wall: float
+    cpu: float
+    rss_kb: int
+    counts: Dict[str, int] = dataclasses.field(default_factory=dict)
+
+
+class Profiler:
+    """Records the wall time, the CPU time, the peak RSS increase and the counts of the pipeline's stages.
+
+    The stages are optionally profiled with cProfile, which is imported only if it is enabled.
+
+    Example:
+        profiler = Profiler()
+        with profiler.stage("parse") as counts:
+            links = parse_links(puml)
+            counts["links"] = len(links)
+        print(profiler.to_table())
+    """
+
+    def __init__(self, cprofile: bool = False) -> None:
+        self.stages: List[Stage] = []
+        self._cprofile: Any = None
+        if cprofile:
+            import cProfile
+
+            self._cprofile = cProfile.Profile()
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Iterator[Dict[str, int]]:
+        """Measures the stage executed in the context, the context's value is the dict to set the stage's counts."""
+        counts: Dict[str, int] = {}
+        wall, cpu, rss_kb = time.perf_counter(), time.process_time(), _peak_rss_kb()
+        if self._cprofile is not None:
+            self._cprofile.enable()
+        try:
+            yield counts
+        finally:
+            if self._cprofile is not None:
+                self._cprofile.disable()
+            self.stages.append(
+                Stage(name, time.perf_counter() - wall, time.process_time() - cpu, _peak_rss_kb() - rss_kb, counts)
+            )
+
+    def dump_stats(self, path: str) -> None:
+        """Writes the cProfile statistics to the file to read with pstats.
+
+        Raises:
+            ValueError: raised when the profiler was created without cProfile.
+        """
+        if self._cprofile is None:
+            raise ValueError("cProfile is not enabled")
+        self._cprofile.dump_stats(path)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"stages": [dataclasses.asdict(el) for el in self.stages]}
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict())
+
+    def to_table(self) -> str:
+        o = [f"{'stage':<10} {'wall, s':>9} {'cpu, s':>9} {'rss, MB':>8}  counts"]
+        for el in self.stages:
+            counts = " ".join(f"{k}={v}" for k, v in el.counts.items())
+            o.append(f"{el.name:<10} {el.wall:>9.4f} {el.cpu:>9.4f} {el.rss_kb / 1024:>8.1f}  {counts}".rstrip())
+        return "\n".join(o)
+
+    def to_prometheus(self) -> str:
+        """Returns the measurements in the Prometheus text exposition format."""
+        metrics = (
+            ("pyarch_stage_wall_seconds", "Wall time of the stage.", lambda el: [("", el.wall)]),
+            ("pyarch_stage_cpu_seconds", "CPU time of the stage.", lambda el: [("", el.cpu)]),
+            ("pyarch_stage_rss_increase_bytes", "Increase of the peak RSS.", lambda el: [("", el.rss_kb * 1024)]),
+            (
+                "pyarch_stage_count",
+                "Inputs' and outputs' counts of the stage.",
+                lambda el: [(f',count="{k}"', v) for k, v in el.counts.items()],
+            ),
+        )
+        o: List[str] = []
+        for name, description, values in metrics:
+            o.extend((f"# HELP {name} {description}", f"# TYPE {name} gauge"))
+            for stage in self.stages:
+                o.extend(f'{name}{{stage="{stage.name}"{labels}}} {value:g}' for labels, value in values(stage))
+        return "\n".join(o) + "\n"
+
+
+class _TimedWriter:
+    """File-like object which measures the time spent writing to the wrapped file."""
+
+    def __init__(self, fout: TextIO) -> None:
+        self.fout = fout
+        self.wall = 0.0
+        self.cpu = 0.0
+
+    def write(self, s: str) -> int:
+        wall, cpu = time.perf_counter(), time.process_time()
+        o = self.fout.write(s)
+        self.wall += time.perf_counter() - wall
+        self.cpu += time.process_time() - cpu
+        return o
+
+
+def _count_puml_files(paths: Iterable[str]) -> Dict[str, int]:
+    """Counts the bytes, the lines and the relations of the PUML files."""
+    o = {"bytes": 0, "lines": 0, "relations": 0}
+    for path in paths:
+        with open(path, "rb") as f:
+            for line in f:
+                o["bytes"] += len(line)
+                o["lines"] += 1
+                o["relations"] += b" --" in line
+    return o
+
+
+def main(puml_packages: PumlSource, puml_classes: PumlSource, webpage_cfg: WebpageConfig) -> str:
+    """Main runner.
+
+    Args:
+        puml_packages: PUML DSL definition packages relations as a string, or as an iterable of lines.
+        puml_classes: PUML DSL definition classes relations as a string, or as an iterable of lines.
+        webpage_cfg: Page templating configuration.
+
+    Returns:
+        HTML page.
+    """
+    parser = PumlParser()
+    parser.feed(puml_packages)
+    parser.feed(puml_classes)
+
+    nodes = parser.links.get_nodes()
+
+    webpage_generator = WebpageGenerator(nodes, parser.links, webpage_cfg, parser.classes)
+
+    return webpage_generator()
+
+
+def read_puml(*inputs: PumlInput) -> Tuple[Links, Classes]:
+    """Parses the PUML DSL inputs in the given order.
+
+    Args:
+        inputs: Paths of the PUML files, or of the directories with {classes,packages}.puml files, or the file objects,
+            or other iterables of the PUML DSL lines. The strings are the paths, use PumlParser.feed to parse the
+            PUML DSL given as a string.
+
+    Returns:
+        Deduplicated links and the classes table.
+
+    Raises:
+        FileNotFoundError: raised when the file, or the directory's PUML files are not found.
+        IOError: raised upon reading error.
+    """
+    parser = PumlParser()
+    for el in inputs:
+        if not isinstance(el, (str, os.PathLike)):
+            parser.feed(el)
+            continue
+
+        path = os.fspath(el)
+        paths = list(_iter_puml_paths(path)) if os.path.isdir(path) else [path]
+        if len(paths) == 0:
+            raise FileNotFoundError("no {classes,packages}.puml files found in %s" % path)
+        for path in paths:
+            parser.feed(iter_input_puml(path))
+    return parser.links, parser.classes
+
+
+def _add_input_arguments(parser: "argparse.ArgumentParser", stdin: bool = True, graph: bool = True) -> None:
+    inputs = parser.add_mutually_exclusive_group(required=True)
+    inputs.add_argument(
+        "-i",
+        "--input",
+        type=str,
+        help="Directory with {classes,packages}.puml files"
+        + (", or '-' to read the PUML DSL from stdin." if stdin else "."),
+    )
+    inputs.add_argument(
+        "-s",
+        "--source",
+        type=str,
+        help="Directory with the package source code to analyse in-process instead of the pyreverse PUML DSL.",
+    )
+    if graph:
+        inputs.add_argument(
+            "-g", "--graph", type=str, help="Graph snapshot file written with --save-graph to load instead of parsing."
+        )
+    parser.add_argument(
+        "--ignore",
+        required=False,
+        type=lambda v: [el for el in v.split(",") if el],
+        default=[],
+        help="Comma separated base names of the files and directories to skip with --source, e.g. test,tests.",
+    )
+
+
+def _add_page_arguments(parser: "argparse.ArgumentParser") -> None:
+    parser.add_argument("-v", "--verbose", required=False, default=False, action="store_true", help="Verbosity.")
+    parser.add_argument("--title", required=False, type=str, default=WebpageConfig.title, help="Custom page title.")
+    parser.add_argument(
+        "--header", required=False, type=str, default=WebpageConfig.header, help="Custom header string."
+    )
+    parser.add_argument(
+        "--footer",
+        required=False,
+        type=str,
+        default=WebpageConfig.footer,
+        help="Custom footer as HTML encoded string.",
+    )
+
+
+def get_args(argv: Optional[List[str]] = None) -> "argparse.Namespace":
+    """Parses stdin arguments."""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog="pyarch",
+        usage="""pyarch: generates HTML with dynamic classDiagram based on the pyreverse PUML DSL.
+
+Ref:
+- https://www.bhavaniravi.com/python/generate-uml-diagrams-from-python-code
+- https://mermaid.js.org/syntax/classDiagram.html
+
+Usage example:
+
+cd superduperdb
+pyreverse -Akmy -o puml . --ignore=test,tests
+./pyarch.py --input . --output index.html
+
+Alternatively, without pyreverse:
+
+./pyarch.py --source superduperdb --ignore=test,tests --output .
+
+To serve the page locally and rebuild it upon the changes:
+
+./pyarch.py serve --source superduperdb --ignore=test,tests --watch
+
+To build the pages of the packages listed in the manifest, and the index page linking them:
+
+./pyarch.py batch manifest.json --output public --jobs 4
+
+To compare the links of two snapshots of the package:
+
+./pyarch.py diff old new --output diff
+
+To query the transitive dependencies of the node:
+
+./pyarch.py query graph.pyarch dependencies superduperdb.base.config""",
+    )
+    _add_input_arguments(parser)
+    parser.add_argument("-o", "--output", required=True, type=str, help="Directory to output index.html file.")
+    _add_page_arguments(parser)
+    parser.add_argument(
+        "--shards",
+        required=False,
+        default=False,
+        action="store_true",
+        help="Output the shell index.html with the links sharded by the top-level packages to fetch on demand.",
+    )
+    parser.add_argument(
+        "--compact",
+        required=False,
+        default=False,
+        action="store_true",
+        help="Embed the data to the page using the compact columnar JSON encoding.",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        required=False,
+        type=int,
+        default=1,
+        help="Number of processes to parse the {classes,packages}.puml files and to prerender the diagrams in parallel.",
+    )
+    parser.add_argument(
+        "--prerender",
+        required=False,
+        type=int,
+        default=None,
+        help="Embed the diagrams of N nodes with the most links to the page, 0 to prerender the diagrams of all nodes.",
+    )
+    parser.add_argument(
+        "--prerender-size",
+        required=False,
+        type=float,
+        default=8,
+        help="Maximum total size of the prerendered diagrams in megabytes.",
+    )
+    parser.add_argument(
+        "--max-edges-per-view",
+        required=False,
+        type=int,
+        default=None,
+        help="Collapse the diagrams of the nodes with more links to the aggregated links between their sub-packages.",
+    )
+    parser.add_argument(
+        "--collapse-depth",
+        required=False,
+        type=int,
+        default=2,
+        help="Number of the levels below the node to aggregate the links to with --max-edges-per-view.",
+    )
+    parser.add_argument(
+        "--save-graph",
+        required=False,
+        type=str,
+        default=None,
+        help="Write the graph to the binary snapshot file to load with --graph, or to compare with pyarch diff.",
+    )
+    parser.add_argument(
+        "--analyze",
+        required=False,
+        default=False,
+        action="store_true",
+        help="Embed the report of the import cycles, the modules' coupling metrics and the heaviest couplings.",
+    )
+    parser.add_argument(
+        "--report", required=False, type=str, default=None, help="Write the dependency analysis as JSON to the file."
+    )
+    parser.add_argument(
+        "--fail-on-cycles",
+        required=False,
+        default=False,
+        action="store_true",
+        help="Exit with the code 1 if the imports have cycles, the outputs are written regardless.",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        required=False,
+        type=str,
+        default=None,
+        help="Directory to cache the parsed inputs between the runs, e.g. .pyarch/cache; the cache is off by default.",
+    )
+    parser.add_argument(
+        "--cache-size", required=False, type=int, default=512, help="Maximum size of the cache in megabytes."
+    )
+    parser.add_argument(
+        "--no-cache",
+        required=False,
+        default=False,
+        action="store_true",
+        help="Disable the cache even if --cache-dir is set.",
+    )
+    parser.add_argument(
+        "--profile",
+        required=False,
+        nargs="?",
+        const="table",
+        default=None,
+        choices=["table", "json", "prometheus"],
+        help="Print the wall time, CPU time, peak RSS increase and the counts of every stage to stdout.",
+    )
+    parser.add_argument(
+        "--profile-dump",
+        required=False,
+        type=str,
+        default=None,
+        help="Write the cProfile statistics of the stages to the file to read with pstats.",
+    )
+    args = parser.parse_args(argv)
+    if args.compact and args.shards:
+        parser.error("--compact cannot be used with --shards")
+    return args
+
+
+def get_serve_args(argv: Optional[List[str]] = None) -> "argparse.Namespace":
+    """Parses the arguments of the serve command."""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog="pyarch serve", description="Serves the page over http and rebuilds it upon the inputs' changes."
+    )
+    _add_input_arguments(parser, stdin=False, graph=False)
+    _add_page_arguments(parser)
+    parser.add_argument("--host", required=False, type=str, default="127.0.0.1", help="Host to bind.")
+    parser.add_argument("--port", required=False, type=int, default=8000, help="Port to bind.")
+    parser.add_argument(
+        "--watch",
+        required=False,
+        default=False,
+        action="store_true",
+        help="Watch the inputs and rebuild the page upon the changes.",
+    )
+    parser.add_argument(
+        "--interval", required=False, type=float, default=0.5, help="Interval in seconds to poll the inputs."
+    )
+    return parser.parse_args(argv)
+
+
+def get_batch_args(argv: Optional[List[str]] = None) -> "argparse.Namespace":
+    """Parses the arguments of the batch command."""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog="pyarch batch",
+        description="Builds the pages of the packages listed in the manifest, and the index page linking them.",
+        epilog="""The manifest is the JSON array of the jobs, e.g.:
+
+[
+  {"input": "code/sklearn", "output": "sklearn.html", "title": "sklearn architecture"},
+  {"source": "code/sanic/sanic", "ignore": ["test", "tests"], "output": "sanic.html", "title": "sanic architecture"}
+]""",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("manifest", type=str, help="Path to the manifest of the jobs.")
+    parser.add_argument(
+        "-o", "--output", required=True, type=str, help="Directory to output the pages and index.html file."
+    )
+    _add_page_arguments(parser)
+    parser.add_argument(
+        "-j", "--jobs", required=False, type=int, default=os.cpu_count() or 1, help="Number of processes."
+    )
+    parser.add_argument(
+        "--cache-dir",
+        required=False,
+        type=str,
+        default=None,
+        help="Directory to cache the parsed inputs between the runs, e.g. .pyarch/cache; the cache is off by default.",
+    )
+    parser.add_argument(
+        "--no-cache",
+        required=False,
+        default=False,
+        action="store_true",
+        help="Disable the cache even if --cache-dir is set.",
+    )
+    return parser.parse_args(argv)
+
+
+def get_diff_args(argv: Optional[List[str]] = None) -> "argparse.Namespace":
+    """Parses the arguments of the diff command."""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog="pyarch diff",
+        description="Compares the links and the nodes of two snapshots of the package.",
+    )
+    parser.add_argument(
+        "old", type=str, help="Old snapshot: the graph snapshot file, or the directory with {classes,packages}.puml."
+    )
+    parser.add_argument(
+        "new", type=str, help="New snapshot: the graph snapshot file, or the directory with {classes,packages}.puml."
+    )
+    parser.add_argument(
+        "-s",
+        "--source",
+        required=False,
+        default=False,
+        action="store_true",
+        help="Analyse the package source code in the old and new directories instead of the PUML DSL.",
+    )
+    parser.add_argument(
+        "--ignore",
+        required=False,
+        type=lambda v: [el for el in v.split(",") if el],
+        default=[],
+        help="Comma separated base names of the files and directories to skip with --source, e.g. test,tests.",
+    )
+    parser.add_argument(
+        "--format",
+        required=False,
+        default="markdown",
+        choices=["markdown", "json"],
+        help="Format of the summary printed to stdout.",
+    )
+    parser.add_argument(
+        "--limit", required=False, type=int, default=100, help="Maximum number of the changes listed per kind."
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        required=False,
+        type=str,
+        default=None,
+        help="Directory to output index.html file with the diagrams of the changed links.",
+    )
+    _add_page_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def get_query_args(argv: Optional[List[str]] = None) -> "argparse.Namespace":
+    """Parses the arguments of the query command."""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog="pyarch query",
+        description="Queries the transitive dependencies between the nodes of the package.",
+    )
+    parser.add_argument(
+        "path", type=str, help="Graph snapshot file, or the directory with {classes,packages}.puml, or the source."
+    )
+    parser.add_argument("query", nargs="?", choices=_QUERIES, default=None, help="Query to run.")
+    parser.add_argument(
+        "ids",
+        nargs="*",
+        help="Node id, or the start's and the end's ids of the path; a package's id selects its nodes.",
+    )
+    parser.add_argument(
+        "-s",
+        "--source",
+        required=False,
+        default=False,
+        action="store_true",
+        help="Analyse the package source code in the path instead of the PUML DSL.",
+    )
+    parser.add_argument(
+        "--ignore",
+        required=False,
+        type=lambda v: [el for el in v.split(",") if el],
+        default=[],
+        help="Comma separated base names of the files and directories to skip with --source, e.g. test,tests.",
+    )
+    parser.add_argument(
+        "--arrows",
+        required=False,
+        type=lambda v: [el for el in v.split(",") if el],
+        default=None,
+        help="Comma separated arrows of the links of the dependency graph, e.g. '-->' for the imports; all by default.",
+    )
+    parser.add_argument(
+        "--depth", required=False, type=int, default=1, help="Maximum number of the steps of the neighbourhood."
+    )
+    parser.add_argument(
+        "--direction",
+        required=False,
+        default="both",
+        choices=["dependencies", "dependents", "both"],
+        help="Steps of the neighbourhood.",
     )
+    parser.add_argument(
+        "--batch",
+        required=False,
+        type=str,
+        default=None,
+        help="File with the queries to run, one per line as the query and the ids, or '-' to read them from stdin.",
+    )
+    parser.add_argument(
+        "--format", required=False, default="text", choices=["text", "json"], help="Format of the results."
+    )
+    parser.add_argument("-v", "--verbose", required=False, default=False, action="store_true", help="Verbosity.")
+    args = parser.parse_args(argv)
+    if (args.query is None) == (args.batch is None):
+        parser.error("either the query, or --batch is required")
+    return args
+
+
+_LOGS = logging.getLogger("pyarch")
+# the logs are configured by the application, the library only emits them
+_LOGS.addHandler(logging.NullHandler())
+
+
+def read_input_puml(path: str) -> str:
+    """Reads input file.
+
+    Args:
+        path: Path to file.
+
+    Returns:
+        File content.
+
+    Raises:
+        FileNotFoundError: raised when the file is not found.
+        IOError: raised upon reading error.
+    """
+    if not isfile(path):
+        raise FileNotFoundError("file %s not found" % path)
+
+    try:
+        with open(path, "r") as f:
+            return f.read()
+    except Exception as ex:
+        raise IOError(ex) from ex
+
+
+def iter_input_puml(path: str) -> Iterator[str]:
+    """Reads input file line by line.
+
+    Args:
+        path: Path to file.
+
+    Returns:
+        Iterator over the file lines, the file is read lazily.
+
+    Raises:
+        FileNotFoundError: raised when the file is not found.
+        IOError: raised upon reading error while iterating.
+    """
+    if not isfile(path):
+        raise FileNotFoundError("file %s not found" % path)
+
+    def _read() -> Iterator[str]:
+        try:
+            with open(path, "r") as f:
+                yield from f
+        except Exception as ex:
+            raise IOError(ex) from ex
+
+    return _read()
+
+
+def print_version() -> None:
+    """Prints version to stdout."""
+    print("version: %s" % __version__)
+
+
+def _cli_serve(argv: List[str]) -> int:
+    """Runs the serve command."""
+    args = get_serve_args(argv)
+    workspace = Workspace(args.source or args.input, args.source is not None, args.ignore)
+    try:
+        workspace.update()
+    except IOError as ex:
+        _LOGS.error(ex)
+        return 1
+    if args.verbose:
+        _LOGS.info("%d links, generation %d" % (len(workspace.links), workspace.generation))
+
+    import asyncio
+
+    server = Server(workspace, WebpageConfig(args.title, args.header, args.footer), args.interval)
+    try:
+        asyncio.run(server.serve(args.host, args.port, args.watch))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def _cli_diff(argv: List[str]) -> int:
+    """Runs the diff command."""
+    args = get_diff_args(argv)
+    try:
+        old_links, old_classes = load_snapshot(args.old, args.source, args.ignore)
+        new_links, new_classes = load_snapshot(args.new, args.source, args.ignore)
+    except (IOError, ValueError) as ex:
+        _LOGS.error(ex)
+        return 1
+
+    diff = diff_links(old_links, new_links)
+    if args.verbose:
+        _LOGS.info("%d links added, %d links removed" % (len(diff.added), len(diff.removed)))
+
+    if args.format == "json":
+        print(diff.to_json())
+    else:
+        print(diff.to_markdown(args.limit), end="")
+
+    if args.output is not None and diff:
+        if args.verbose:
+            _LOGS.info("writing %s" % f"{args.output}/index.html")
+        page = diff_page(diff, old_classes, new_classes, WebpageConfig(args.title, args.header, args.footer))
+        with open(f"{args.output}/index.html", "w") as fout:
+            page.render(fout)
+    return 0
+
+
+def _cli_query(argv: List[str]) -> int:
+    """Runs the query command."""
+    args = get_query_args(argv)
+    try:
+        if args.batch is not None and args.batch != "-" and not isfile(args.batch):
+            raise FileNotFoundError("batch file %s not found" % args.batch)
+        links, _ = load_snapshot(args.path, args.source, args.ignore)
+    except (IOError, ValueError) as ex:
+        _LOGS.error(ex)
+        return 1
+
+    start = time.perf_counter()
+    query = GraphQuery.from_links(links, args.arrows)
+    if args.verbose:
+        _LOGS.info(
+            "indexed %d nodes, %d edges in %.2f s" % (len(query.graph), query.graph.edges, time.perf_counter() - start)
+        )
+
+    # the queries of the batch are read lazily, hence they can be piped to the process one by one
+    if args.batch is None:
+        return _run_queries(query, [" ".join([args.query, *args.ids])], args)
+    if args.batch == "-":
+        return _run_queries(query, sys.stdin, args)
+    with open(args.batch) as lines:
+        return _run_queries(query, lines, args)
+
+
+def _run_queries(query: GraphQuery, lines: Iterable[str], args: "argparse.Namespace") -> int:
+    """Runs the queries given one per line and prints their results, returns the exit code."""
+    failed = 0
+    for line in lines:
+        fields = line.split()
+        if len(fields) == 0 or fields[0].startswith("#"):
+            continue
+        kind, ids = fields[0], fields[1:]
+        start = time.perf_counter()
+        try:
+            record = run_query(query, kind, ids, args.depth, args.direction)
+        except KeyError as ex:
+            _LOGS.error(ex.args[0])
+            failed += 1
+            continue
+        except ValueError as ex:
+            _LOGS.error(ex)
+            failed += 1
+            continue
+        if args.verbose:
+            _LOGS.info("%s in %.2f ms" % (line.strip(), (time.perf_counter() - start) * 1e3))
+
+        if args.format == "json":
+            print(json.dumps(record), flush=True)
+        else:
+            print(("" if args.batch is None else f"# {line.strip()}\n") + _query_text(record), end="", flush=True)
+    return 1 if failed else 0
+
+
+def _cli_batch(argv: List[str]) -> int:
+    """Runs the batch command."""
+    args = get_batch_args(argv)
+    try:
+        batch = read_batch_manifest(args.manifest)
+    except (IOError, ValueError) as ex:
+        _LOGS.error(ex)
+        return 1
+
+    start = time.perf_counter()
+    summaries, errors = run_batch(
+        batch,
+        args.output,
+        WebpageConfig(args.title, args.header, args.footer),
+        args.jobs,
+        None if args.no_cache else args.cache_dir,
+    )
+    if args.verbose:
+        for summary in summaries:
+            _LOGS.info("built %(output)s: %(nodes)d nodes, %(links)d links in %(seconds).2f s" % summary)
+        _LOGS.info("built %d pages in %.2f s" % (len(summaries), time.perf_counter() - start))
+    for output, error in errors.items():
+        _LOGS.error("%s: %s" % (output, error))
+    return 1 if errors else 0
+
+
+def _cli_build(argv: List[str]) -> int:
+    """Runs the default command building the page."""
+    args = get_args(argv)
+
+    webpage_cfg = WebpageConfig(title=args.title, header=args.header, footer=args.footer)
+    cache = None if args.no_cache or args.cache_dir is None else Cache(args.cache_dir, args.cache_size * 2**20)
+    profiler = Profiler(args.profile_dump is not None)
+    nodes: Optional[Nodes] = None
+
+    if args.graph is not None:
+        if args.verbose:
+            _LOGS.info("loading %s" % args.graph)
+        try:
+            with profiler.stage("load") as counts, GraphSnapshot(args.graph) as snapshot:
+                links, classes, nodes = snapshot.links(), snapshot.classes(), snapshot.nodes()
+        except (IOError, ValueError) as ex:
+            _LOGS.error(ex)
+            return 1
+
+    elif args.source is not None:
+        if args.verbose:
+            _LOGS.info("analysing %s" % args.source)
+        try:
+            with profiler.stage("parse") as counts:
+                links, classes = analyze_source(args.source, args.ignore, cache)
+        except IOError as ex:
+            _LOGS.error(ex)
+            return 1
+
+    elif args.input == "-":
+        if args.verbose:
+            _LOGS.info("reading stdin")
+        with profiler.stage("parse") as counts:
+            parser = PumlParser()
+            parser.feed(sys.stdin)
+            links, classes = parser.links, parser.classes
+
+    else:
+        paths = []
+        for path in (f"{args.input}/packages.puml", f"{args.input}/classes.puml"):
+            if args.verbose:
+                _LOGS.info("reading %s" % path)
+            if isfile(path):
+                paths.append(path)
+            else:
+                _LOGS.warning("file %s not found" % path)
+
+        if len(paths) == 0:
+            _LOGS.error("no required inputs found")
+            return 1
+
+        try:
+            with profiler.stage("parse") as counts:
+                links, classes = parse_puml_files(paths, args.jobs, cache)
+        except IOError as ex:
+            _LOGS.error(ex)
+            return 1
+
+        if args.profile is not None:
+            counts.update(_count_puml_files(paths))
+
+    counts.update(links=len(links), classes=len(classes))
+
+    if args.verbose and cache is not None:
+        _LOGS.info("cache %s: %d hits, %d misses" % (cache.path, cache.hits, cache.misses))
+
+    if len(links) == 0:
+        _LOGS.error("no relations found")
+        return 1
 
     if args.verbose:
-        _LOGS.info("writing %s" % f"{args.output}/index.html")
+        _LOGS.info("generating report files")
+
+    if nodes is None:
+        with profiler.stage("nodes") as counts:
+            nodes = links.get_nodes()
+        if args.profile is not None:
+            counts["nodes"] = sum(1 for _ in nodes.iter_ids())
+
+    if args.save_graph is not None:
+        if args.verbose:
+            _LOGS.info("writing %s" % args.save_graph)
+        with profiler.stage("save") as counts:
+            save_graph(args.save_graph, links, classes, nodes)
+        counts["bytes"] = os.path.getsize(args.save_graph)
+
+    diagrams = {}
+    if args.prerender is not None:
+        with profiler.stage("prerender") as counts:
+            diagrams = prerender_diagrams(
+                links, nodes.iter_ids(), classes, args.prerender or None, int(args.prerender_size * 2**20), args.jobs
+            )
+        counts["diagrams"] = len(diagrams)
+        if args.verbose:
+            _LOGS.info("prerendered %d diagrams" % len(diagrams))
+
+    if args.max_edges_per_view is not None:
+        with profiler.stage("rollup") as counts:
+            rollups = rollup_diagrams(links, nodes.iter_ids(), classes, args.max_edges_per_view, args.collapse_depth)
+        counts["diagrams"] = len(rollups)
+        diagrams.update(rollups)
+        if args.verbose:
+            _LOGS.info("collapsed %d diagrams" % len(rollups))
+
+    analysis, report = None, ""
+    if args.analyze or args.report is not None or args.fail_on_cycles:
+        with profiler.stage("analyze") as counts:
+            analysis = analyze_links(links)
+        counts.update(edges=analysis.edges, cycles=len(analysis.cycles))
+        if args.verbose:
+            _LOGS.info("found %d import cycles" % len(analysis.cycles))
+
+        if args.report is not None:
+            if args.verbose:
+                _LOGS.info("writing %s" % args.report)
+            with open(args.report, "w") as f:
+                f.write(analysis.to_json())
+
+        if args.analyze:
+            report = analysis.to_html()
+
+    webpage_generator = WebpageGenerator(nodes, links, webpage_cfg, classes, args.compact, diagrams, report)
+
+    if args.shards:
+        if args.verbose:
+            _LOGS.info("writing %s" % f"{args.output}/index.html with the shards to {args.output}/data")
+        with profiler.stage("render") as counts:
+            written = webpage_generator.write_sharded(args.output)
+        counts.update(files=len(written), bytes=sum(os.path.getsize(el) for el in written))
+
+    else:
+        if args.verbose:
+            _LOGS.info("writing %s" % f"{args.output}/index.html")
+
+        with open(f"{args.output}/index.html", "w") as fout:
+            if args.profile is None:
+                with profiler.stage("render"):
+                    webpage_generator.render(fout)
+            else:
+                writer = _TimedWriter(fout)
+                with profiler.stage("encode"):
+                    webpage_generator.render(writer)  # type: ignore[arg-type]
+                # the time spent writing to the file is reported as the separate stage
+                encode = profiler.stages[-1]
+                encode.wall, encode.cpu = encode.wall - writer.wall, encode.cpu - writer.cpu
+                profiler.stages.append(Stage("write", writer.wall, writer.cpu, 0, {"bytes": fout.tell()}))
 
-    with open(f"{args.output}/index.html", "w") as fout:
-        fout.write(html)
+    if args.profile_dump is not None:
+        profiler.dump_stats(args.profile_dump)
+
+    if args.profile == "table":
+        print(profiler.to_table())
+    elif args.profile == "json":
+        print(profiler.to_json())
+    elif args.profile == "prometheus":
+        print(profiler.to_prometheus(), end="")
+
+    if args.fail_on_cycles and analysis is not None and len(analysis.cycles) > 0:
+        largest = analysis.cycles[0]
+        _LOGS.error(
+            "%d import cycles found, the largest of %d modules: %s"
+            % (len(analysis.cycles), len(largest), ", ".join(largest[:5]) + (", ..." if len(largest) > 5 else ""))
+        )
+        return 1
+    return 0
+
+
+def cli(argv: Optional[List[str]] = None) -> int:
+    """Runs the command line interface.
+
+    The logging is configured here, not at import, hence importing pyarch does not change the application's logs.
+
+    Args:
+        argv: Command line arguments, sys.argv[1:] if None.
+
+    Returns:
+        Exit code.
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    logging.basicConfig(format="%(asctime)s [%(levelname)s] %(message)s", level=logging.INFO)
+    if len(argv) > 0 and argv[-1].endswith("--version"):
+        print_version()
+        return 0
+
+    commands = {"serve": _cli_serve, "diff": _cli_diff, "query": _cli_query, "batch": _cli_batch}
+    if len(argv) > 0 and argv[0] in commands:
+        return commands[argv[0]](argv[1:])
+    return _cli_build(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(cli())
@@ -1,4 +1,54 @@
-from pyarch import Node, Nodes, Link, Links
+import copy
+import gc
+import io
+import itertools
+import json
+import os
+import pathlib
+import pickle
+import subprocess
+import sys
+
+from pyarch import (
+    Cache,
+    Class,
+    Classes,
+    Graph,
+    GraphQuery,
+    GraphSnapshot,
+    Link,
+    Links,
+    Node,
+    Nodes,
+    Profiler,
+    PumlParser,
+    Server,
+    WebpageConfig,
+    WebpageGenerator,
+    Workspace,
+    analyze_links,
+    analyze_source,
+    build_link_index,
+    build_search_index,
+    chunk_puml_file,
+    cli,
+    diff_links,
+    diff_page,
+    generate_diagram,
+    iter_compact_payload,
+    parse_links,
+    parse_puml_files,
+    prerender_diagrams,
+    read_batch_manifest,
+    read_puml,
+    rollup_diagrams,
+    rollup_links,
+    run_batch,
+    run_query,
+    save_graph,
+    shard_links,
+    strongly_connected_components,
+)
 
 
 def test_Node_from_str():
@@ -252,3 +302,995 @@ def test_Links_deduplicate():
     ]
     for test in tests:
         assert len(test["input"].deduplicate()) == test["want"]
+
+
+def test_Links_append_keeps_first_occurrence_order():
+    tests = [
+        {
+            "input": [
+                Link("foo --* bar : quxx"),
+                Link("foo --* bar : qux"),
+                Link("foo --* bar : quxx"),
+                Link("bar --|> foo"),
+                Link("foo --* bar : qux"),
+            ],
+            "want": [
+                Link("foo --* bar : quxx"),
+                Link("foo --* bar : qux"),
+                Link("bar --|> foo"),
+            ],
+        },
+    ]
+    for test in tests:
+        links = Links()
+        for link in test["input"]:
+            links.append(link)
+        assert list(links) == test["want"]
+        assert links.deduplicate() == Links(test["want"])
+
+
+def test_Link_pickle_and_copy():
+    links = Links([Link("a --> b"), Link("b --* c : attr")])
+    tests = [
+        {"name": "pickle", "fn": lambda el: pickle.loads(pickle.dumps(el))},
+        {"name": "copy", "fn": copy.copy},
+        {"name": "deepcopy", "fn": copy.deepcopy},
+    ]
+
+    for test in tests:
+        for el in (links[1], links):
+            got = test["fn"](el)
+            assert got == el, test["name"]
+            assert type(got) is type(el), test["name"]
+        got = test["fn"](links)
+        got.append(Link("b --* c : attr"))
+        assert len(got) == 2, test["name"]
+
+
+def test_Links_concat():
+    a, b, c = Link("a --> b"), Link("b --* c"), Link("c --> a")
+    tests = [
+        {"name": "none", "links": [], "expected": []},
+        {"name": "disjoint", "links": [Links([a, b]), Links([c])], "expected": [a, b, c]},
+        {"name": "overlapping", "links": [Links([c, a]), Links([a, b]), Links([b])], "expected": [c, a, b]},
+        {"name": "empty", "links": [Links(), Links([b])], "expected": [b]},
+    ]
+
+    for test in tests:
+        got = Links.concat(*test["links"])
+        assert list(got) == test["expected"], test["name"]
+        assert len(got) == len(test["expected"]), test["name"]
+        got.append(test["expected"][0] if test["expected"] else a)
+        assert len(got) == max(1, len(test["expected"])), test["name"]
+        assert all(el in got for el in test["expected"]), test["name"]
+
+
+def test_Link_is_hashable_and_immutable():
+    link = Link("foo --* bar : qux")
+    assert link == Link.from_parts("foo", "--*", "bar", "qux")
+    assert hash(link) == hash(Link.from_parts("foo", "--*", "bar", "qux"))
+    assert link != Link("foo --* bar")
+    try:
+        link.start = "baz"  # type: ignore
+        assert False, "Link must be immutable"
+    except AttributeError:
+        pass
+
+
+def test_Nodes_from_ids():
+    ids = []
+    for path in ("fixtures/packages.puml", "fixtures/classes.puml"):
+        with open(path) as f:
+            for line in f:
+                if " --" in line:
+                    link = Link(line.rstrip("\n"))
+                    ids.extend([link.start, link.end])
+    ids.extend(["", ".", "foo.bar.", "foo.bar", "foo"])
+
+    want = Nodes()
+    for _id in ids:
+        want.add(Node.from_str(_id))
+
+    got = Nodes.from_ids(ids)
+    assert got == want
+    assert got.to_json() == want.to_json()
+
+
+def test_parse_links():
+    puml = """@startuml classes
+set namespaceSeparator none
+class "foo.Bar" as foo.Bar {
+}
+foo.Bar --* foo.Qux : quxx
+foo.Bar --|> foo.Base
+foo.Bar --* foo.Qux : quxx
+@enduml
+"""
+    want = Links([Link("foo.Bar --* foo.Qux : quxx"), Link("foo.Bar --|> foo.Base")])
+    tests = [
+        {"input": [puml], "want": want},
+        {"input": [io.StringIO(puml)], "want": want},
+        {"input": [iter(puml.splitlines(keepends=True)), "foo.Bar --|> foo.Base\r\n"], "want": want},
+        {"input": ["", ""], "want": Links()},
+    ]
+    for test in tests:
+        assert parse_links(*test["input"]) == test["want"]
+
+
+def test_PumlParser():
+    puml = """@startuml classes
+set namespaceSeparator none
+class "Artifact" as foo.container.Artifact #aliceblue {
+  bytes : bytes
+  sha1 : str
+  {abstract}load(x: int) -> 'Artifact'
+  {static}save()
+}
+class "Config" as foo.base.Config.Config {
+}
+abstract class "Base" as foo.base.Base <<dataclass>> {
+  run()
+}
+interface foo.base.Api
+package "foo.base" as foo.base {
+}
+foo.container.Artifact --|> foo.base.Base
+foo.container.Artifact --* foo.base.Config.Config : config
+@enduml
+"""
+    parser = PumlParser()
+    parser.feed(puml)
+
+    assert parser.links == Links(
+        [
+            Link("foo.container.Artifact --|> foo.base.Base"),
+            Link("foo.container.Artifact --* foo.base.Config.Config : config"),
+        ]
+    )
+    assert parser.classes == Classes(
+        [
+            Class(
+                "foo.container.Artifact",
+                "Artifact",
+                attributes=("bytes : bytes", "sha1 : str"),
+                methods=("{abstract}load(x: int) -> 'Artifact'", "{static}save()"),
+            ),
+            Class("foo.base.Config.Config", "Config"),
+            Class("foo.base.Base", "Base", stereotype="dataclass", methods=("run()",)),
+            Class("foo.base.Api", kind="interface"),
+        ]
+    )
+    assert (
+        parser.classes.to_json()
+        == """{"foo.container.Artifact": ["bytes : bytes", "sha1 : str", "load(x: int) 'Artifact'*", "save()$"], """
+        + """"foo.base.Base": ["run()"]}"""
+    )
+
+
+def test_analyze_source(tmp_path):
+    package = tmp_path / "foo"
+    (package / "base").mkdir(parents=True)
+    (package / "tests").mkdir()
+    (package / "__init__.py").write_text("from foo.base.config import Config\n")
+    (package / "base" / "__init__.py").write_text("")
+    (package / "base" / "config.py").write_text(
+        """import abc
+from typing import Optional
+
+from ..api import Api
+
+
+class Config(abc.ABC):
+    api: Optional[Api] = None
+
+    class Inner:
+        pass
+
+    def __init__(self, inner: "Config.Inner") -> None:
+        self.inner = inner
+        self.api = Api()
+
+    @abc.abstractmethod
+    def run(self, x: int) -> str:
+        def local():
+            import os
+"""
+    )
+    (package / "api.py").write_text("class Api(object):\n    pass\n")
+    (package / "tests" / "test_api.py").write_text("from foo.api import Api\n")
+
+    links, classes = analyze_source(str(package), ignore=["tests"])
+
+    assert list(links) == [
+        Link("foo --> foo.base.config"),
+        Link("foo.base.config --> foo.api"),
+        Link("foo.base.config.Config --|> abc.ABC"),
+        Link("foo.api.Api --* foo.base.config.Config : api"),
+        Link("foo.base.config.Config.Inner --o foo.base.config.Config : inner"),
+    ]
+    assert classes.get("foo.base.config.Config") == Class(
+        "foo.base.config.Config",
+        attributes=("api : Optional[Api]", 'inner : "Config.Inner"'),
+        methods=('__init__(inner: "Config.Inner") -> None', "{abstract}run(x: int) -> str"),
+    )
+
+
+def test_parse_puml_files_parallel(tmp_path):
+    path = tmp_path / "classes.puml"
+    lines = ["@startuml classes", "set namespaceSeparator none"]
+    for i in range(200):
+        lines.extend([f'class "foo.C{i}" as foo.C{i} {{', f"  attr{i} : int", f"  method{i}()", "}"])
+        lines.append(f"foo.C{i} --* foo.C{i // 2} : attr{i % 3}")
+        lines.append(f"foo.C{i // 2} --* foo.C{i} : attr{i % 3}")
+    path.write_text("\n".join(lines) + "\n@enduml\n")
+
+    for start, end in chunk_puml_file(str(path), 16):
+        with open(path, "rb") as f:
+            f.seek(start)
+            line = f.readline()
+        assert start == 0 or line.startswith(b"class ") or line.startswith(b"foo.C"), line
+
+    paths = ["fixtures/packages.puml", "fixtures/classes.puml", str(path)]
+    want = parse_puml_files(paths, jobs=1)
+    got = parse_puml_files(paths, jobs=3)
+    assert list(got[0]) == list(want[0])
+    assert got[1] == want[1]
+    assert len(want[1]) == 200 + 164
+
+
+def test_read_puml(tmp_path):
+    paths = ["fixtures/packages.puml", "fixtures/classes.puml"]
+    want = parse_puml_files(paths)
+    with open(paths[0]) as packages_file, open(paths[1]) as classes_file:
+        tests = [
+            {"name": "directory", "inputs": ["fixtures"]},
+            {"name": "path-like", "inputs": [pathlib.Path("fixtures")]},
+            {"name": "files", "inputs": paths},
+            {"name": "file objects", "inputs": [packages_file, classes_file]},
+            {"name": "lines", "inputs": [paths[0], pathlib.Path(paths[1]).read_text().splitlines()]},
+        ]
+
+        for test in tests:
+            links, classes = read_puml(*test["inputs"])
+            assert list(links) == list(want[0]), test["name"]
+            assert classes == want[1], test["name"]
+
+    for el in (str(tmp_path), str(tmp_path / "classes.puml")):
+        try:
+            read_puml(el)
+            assert False, "error expected"
+        except FileNotFoundError:
+            pass
+
+
+def test_Cache(tmp_path):
+    cache = Cache(str(tmp_path / "cache"), max_bytes=100)
+    keys = [Cache.key("test", str(i)) for i in range(3)]
+
+    assert cache.get(keys[0]) is None
+    for i, key in enumerate(keys):
+        cache.put(key, ["x" * 40, i])
+        os.utime(cache._entry_path(key), (i, i))
+    assert cache.get(keys[0]) == ["x" * 40, 0]
+
+    cache.evict()
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[2]) == ["x" * 40, 2]
+    assert cache.get(keys[0]) == ["x" * 40, 0]
+    assert (cache.hits, cache.misses) == (3, 2)
+
+
+def test_parse_with_cache(tmp_path):
+    paths = ["fixtures/packages.puml", "fixtures/classes.puml"]
+    want = parse_puml_files(paths)
+
+    for _ in range(2):
+        cache = Cache(str(tmp_path / "cache"))
+        got = parse_puml_files(paths, cache=cache)
+        assert list(got[0]) == list(want[0])
+        assert got[1] == want[1]
+    assert (cache.hits, cache.misses) == (2, 0)
+
+    want = analyze_source(os.path.dirname(json.__file__))
+    for _ in range(2):
+        cache = Cache(str(tmp_path / "cache"))
+        got = analyze_source(os.path.dirname(json.__file__), cache=cache)
+        assert list(got[0]) == list(want[0])
+        assert got[1] == want[1]
+    assert cache.misses == 0
+
+
+def test_shard_links():
+    links = Links(
+        [
+            Link("foo.a --> bar.b"),
+            Link("foobar.c --> baz"),
+            Link("bar.b --|> bar.c"),
+        ]
+    )
+    assert shard_links(links, ["foo", "bar", "baz", "qux"]) == {
+        "foo": [Link("foo.a --> bar.b"), Link("foobar.c --> baz")],
+        "bar": [Link("foo.a --> bar.b"), Link("bar.b --|> bar.c")],
+        "baz": [Link("foobar.c --> baz")],
+        "qux": [],
+    }
+
+
+def test_WebpageGenerator_write_sharded(tmp_path):
+    links, classes = parse_puml_files(["fixtures/packages.puml", "fixtures/classes.puml"])
+    generator = WebpageGenerator(links.get_nodes(), links, WebpageConfig(), classes)
+
+    (tmp_path / "data").mkdir()
+    (tmp_path / "data" / "superduperdb.000000000000.json").write_text("{}")
+    paths = generator.write_sharded(str(tmp_path))
+
+    assert sorted(os.listdir(tmp_path / "data")) == sorted(os.path.basename(el) for el in paths[:-1])
+    with open(tmp_path / "data" / "manifest.json") as f:
+        manifest = json.load(f)
+    assert list(manifest["shards"]) == [el.id for el in generator.nodes]
+
+    with open(tmp_path / "data" / manifest["shards"]["superduperdb"]) as f:
+        shard = json.load(f)
+    assert len(shard["links"]) == len([el for el in links if "superduperdb" in (el.start[:12], el.end[:12])])
+
+    with open(tmp_path / "index.html") as f:
+        html = f.read()
+    assert "{{." not in html
+    assert "loadShard" in html
+
+
+def _select_links(links, _id):
+    """Reference implementation of the page's selectLinks."""
+    o = [i for i, el in enumerate(links) if el.start == _id or el.end == _id]
+    if len(o) == 0:
+        o = [i for i, el in enumerate(links) if el.start.startswith(_id) or el.end.startswith(_id)]
+    return o
+
+
+def test_build_link_index():
+    links, _ = parse_puml_files(["fixtures/packages.puml", "fixtures/classes.puml"])
+    links.extend([Link("foo --> foo"), Link("foobar.baz --> qux"), Link("foo.bar --> foo.baz")])
+    ids = [*links.get_nodes().iter_ids(), "", "superduperdb.ba", "missing"]
+
+    index = build_link_index(links, ids)
+
+    assert list(index) == ids
+    for _id in ids:
+        got = [i for j in range(0, len(index[_id]), 2) for i in range(index[_id][j], index[_id][j + 1])]
+        assert got == _select_links(links, _id), _id
+    assert index["missing"] == []
+    assert index[""] == [0, len(links)]
+
+
+def _search_nodes(index, ids, query):
+    """Reference implementation of the page's searchNodes without the ranking."""
+    query = query.lower()
+    term = query.rsplit(".", 1)[-1]
+    if len(term) < 3:
+        names = [i for i, el in enumerate(index["n"]) if el.startswith(term)]
+    else:
+        names = None
+        for j in range(len(term) - 2):
+            postings = set(itertools.accumulate(index["g"].get(term[j : j + 3], [])))
+            names = postings if names is None else names & postings
+        names = [i for i in sorted(names) if term in index["n"][i]]
+    return sorted(ids[i] for name in names for i in index["x"][name] if query in ids[i].lower())
+
+
+def test_build_search_index():
+    links, _ = parse_puml_files(["fixtures/packages.puml", "fixtures/classes.puml"])
+    ids = list(links.get_nodes().iter_ids())
+
+    index = build_search_index(ids)
+
+    assert index["n"] == sorted({el.rsplit(".", 1)[-1].lower() for el in ids})
+    assert sorted(i for el in index["x"] for i in el) == list(range(len(ids)))
+    for gram, deltas in index["g"].items():
+        assert deltas[0] >= 0 and all(el > 0 for el in deltas[1:]), gram
+
+    tests = ["s", "QU", "query", "config.", "db.base", "superduperdb.db.query_dataset.CachedQueryDataset", "missing"]
+    for query in tests:
+        term = query.lower().rsplit(".", 1)[-1]
+        want = sorted(
+            el
+            for el in ids
+            if query.lower() in el.lower()
+            and (
+                term in el.lower().rsplit(".", 1)[-1]
+                if len(term) >= 3
+                else el.lower().rsplit(".", 1)[-1].startswith(term)
+            )
+        )
+        assert _search_nodes(index, ids, query) == want, query
+
+    assert _search_nodes(index, ids, "cachedquery") == ["superduperdb.db.query_dataset.CachedQueryDataset"]
+    assert build_search_index([]) == {"n": [], "x": [], "g": {}}
+
+
+def test_iter_compact_payload():
+    links, classes = parse_puml_files(["fixtures/packages.puml", "fixtures/classes.puml"])
+    classes.add(Class("superduperdb.base.config.Api", attributes=("port : int",)))
+    nodes = links.get_nodes()
+
+    payload = json.loads("".join(iter_compact_payload(nodes, links, classes)))
+
+    ids = []
+    for parent, name in zip(payload["p"], payload["n"]):
+        ids.append(name if parent < 0 else f"{ids[parent]}.{name}")
+    assert ids == list(nodes.iter_ids())
+
+    got = Links(
+        Link.from_parts(ids[s], payload["a"][a], ids[e], payload["d"][d])
+        for s, e, a, d in zip(payload["ls"], payload["le"], payload["la"], payload["ld"])
+    )
+    assert got == links
+    assert {ids[i]: members for i, members in payload["c"]} == json.loads(classes.to_json())
+    assert dict(zip(ids, payload["x"])) == build_link_index(links, ids)
+
+    standard = len(nodes.to_json()) + len(links.to_json()) + len(json.dumps(build_link_index(links, ids)))
+    assert standard / len(json.dumps(payload, separators=(",", ":"))) > 3
+
+
+def test_WebpageGenerator_render():
+    links, classes = parse_puml_files(["fixtures/packages.puml", "fixtures/classes.puml"])
+    search = json.dumps(build_search_index(links.get_nodes().iter_ids()), separators=(",", ":"))
+    tests = [
+        {
+            "name": "default",
+            "compact": False,
+            "expected": [links.to_json(), classes.to_json(), search],
+        },
+        {
+            "name": "compact",
+            "compact": True,
+            "expected": ["".join(iter_compact_payload(links.get_nodes(), links, classes)), search],
+        },
+    ]
+
+    for test in tests:
+        cfg = WebpageConfig(title="{{.Nodes}}", header="<h1>{{.Footer}}</h1>")
+        generator = WebpageGenerator(links.get_nodes(), links, cfg, classes, test["compact"])
+
+        fout = io.StringIO()
+        generator.render(fout)
+        html = fout.getvalue()
+
+        assert "<title>{{.Nodes}}</title>" in html, test["name"]
+        assert "<header><h1>{{.Footer}}</h1></header>" in html, test["name"]
+        assert html.count("{{.") == 2, test["name"]
+        for el in test["expected"]:
+            assert el in html, test["name"]
+
+    # the small graph's page selects the links by the scan, the index is embedded from index_min_links links
+    index = json.dumps(build_link_index(links, links.get_nodes().iter_ids()))
+    for index_min_links, expected in ((len(links) + 1, "linkIndex={}"), (len(links), f"linkIndex={index}")):
+        generator = WebpageGenerator(
+            links.get_nodes(), links, WebpageConfig(), classes, index_min_links=index_min_links
+        )
+        assert expected in generator(), index_min_links
+
+
+def test_WebpageGenerator_from_puml():
+    links, classes = parse_puml_files(["fixtures/packages.puml", "fixtures/classes.puml"])
+    generator = WebpageGenerator.from_puml("fixtures", cfg=WebpageConfig(title="foo"))
+
+    assert generator.links == links
+    assert generator.classes == classes
+    assert generator.nodes == links.get_nodes()
+    html = generator()
+    assert "<title>foo</title>" in html
+    assert html.split("</footer>")[1] == generator().split("</footer>")[1]
+
+
+def test_generate_diagram():
+    tests = [
+        {
+            "name": "no links",
+            "links": [],
+            "members": {},
+            "expected": "",
+        },
+        {
+            "name": "links with the members of the classes",
+            "links": [Link("foo.Bar --|> foo.Baz"), Link("foo.Bar --* qux : quux")],
+            "members": {"foo.Baz": ["x : int", "f()*"], "missing": ["y : str"]},
+            "expected": "classDiagram\nfoo-Bar --|> foo-Baz\nfoo-Bar --* qux : quux\nclass foo-Baz{\nx : int\nf()*\n}\n",
+        },
+    ]
+
+    for test in tests:
+        assert generate_diagram(test["links"], test["members"]) == test["expected"], test["name"]
+
+
+def test_prerender_diagrams():
+    links, classes = parse_puml_files(["fixtures/packages.puml", "fixtures/classes.puml"])
+    ids = list(links.get_nodes().iter_ids())
+    index = build_link_index(links, ids)
+    members = classes.to_members()
+
+    diagrams = prerender_diagrams(links, ids, classes)
+    assert len(diagrams) == len([el for el in index.values() if el])
+    for _id, diagram in diagrams.items():
+        assert diagram == generate_diagram([links[i] for i in _select_links(links, _id)], members), _id
+
+    counts = [len(_select_links(links, el)) for el in diagrams]
+    assert counts == sorted(counts, reverse=True)
+
+    assert prerender_diagrams(links, ids, classes, top=5) == dict(list(diagrams.items())[:5])
+    assert prerender_diagrams(links, ids, classes, jobs=2) == diagrams
+
+    budget = len(diagrams[ids[0]].encode()) - 1
+    got = prerender_diagrams(links, ids, classes, budget=budget)
+    assert ids[0] not in got
+    assert sum(len(el.encode()) for el in set(got.values())) <= budget
+
+
+def test_rollup_links():
+    links = [
+        Link("a.b.c.X --> a.d.Y"),
+        Link("a.b.e --> a.d.Z"),
+        Link("a.b.c.X --|> a.d.Y"),
+        Link("a.b.c --> a.b.e"),
+        Link("a.d --> b"),
+    ]
+    tests = [
+        {
+            "name": "depth 2",
+            "depth": 2,
+            "expected": {("a.b", "-->", "a.d"): 2, ("a.b", "--|>", "a.d"): 1, ("a.d", "-->", "b"): 1},
+        },
+        {
+            "name": "depth 1",
+            "depth": 1,
+            "expected": {("a", "-->", "b"): 1},
+        },
+        {
+            "name": "depth 3",
+            "depth": 3,
+            "expected": {
+                ("a.b.c", "-->", "a.d.Y"): 1,
+                ("a.b.e", "-->", "a.d.Z"): 1,
+                ("a.b.c", "--|>", "a.d.Y"): 1,
+                ("a.b.c", "-->", "a.b.e"): 1,
+                ("a.d", "-->", "b"): 1,
+            },
+        },
+    ]
+
+    for test in tests:
+        assert rollup_links(links, test["depth"]) == test["expected"], test["name"]
+
+
+def test_rollup_diagrams():
+    links = Links(
+        [
+            Link("a.b.c.X --> a.d.Y"),
+            Link("a.b.c.X --> a.d.Z"),
+            Link("a.b.e --> a.d.Z"),
+            Link("a.d.Y --> q"),
+        ]
+    )
+
+    tests = [
+        {
+            "name": "collapsed to the sub-packages",
+            "max_edges": 2,
+            "depth": 1,
+            "expected": {
+                "a": "classDiagram\na-b --> a-d : 3 links\na-d --> q\n"
+                "class a-b{\n<<collapsed>>\n}\nclass a-d{\n<<collapsed>>\n}\n",
+                "a.b": "classDiagram\na-b-c --> a-d-Y\na-b-c --> a-d-Z\nclass a-b-c{\n<<collapsed>>\n}\n",
+                "a.d": "classDiagram\na-b-c --> a-d-Y\na-b-c --> a-d-Z\nclass a-b-c{\n<<collapsed>>\n}\n",
+            },
+        },
+        {
+            "name": "depth reduced, then the heaviest edges kept",
+            "max_edges": 1,
+            "depth": 2,
+            "expected": {
+                "a": "classDiagram\na-b --> a-d : 3 links\nclass a-b{\n<<collapsed>>\n}\nclass a-d{\n<<collapsed>>\n}\n",
+                "a.b": "classDiagram\na-b-c --> a-d-Y\nclass a-b-c{\n<<collapsed>>\n}\n",
+                "a.b.c": "classDiagram\na-b-c-X --> a-d-Y\n",
+                "a.b.c.X": "classDiagram\na-b-c-X --> a-d-Y\n",
+                "a.d": "classDiagram\na-b-c --> a-d-Y\nclass a-b-c{\n<<collapsed>>\n}\n",
+                "a.d.Y": "classDiagram\na-b-c-X --> a-d-Y\n",
+                "a.d.Z": "classDiagram\na-b-c-X --> a-d-Z\n",
+            },
+        },
+        {
+            "name": "links within one ancestor, the deeper level kept",
+            "links": Links(Link(f"a.b.c.X{i} --> a.b.c.Y{i}") for i in range(3)),
+            "max_edges": 2,
+            "depth": 2,
+            "expected": {
+                el: "classDiagram\na-b-c-X0 --> a-b-c-Y0\na-b-c-X1 --> a-b-c-Y1\n" for el in ("a", "a.b", "a.b.c")
+            },
+        },
+        {
+            "name": "self-links only",
+            "links": Links([Link("a.b --> a.b"), Link("a.b --* a.b"), Link("a.b --> a.b : x")]),
+            "max_edges": 2,
+            "depth": 2,
+            "expected": {el: "classDiagram\na-b --> a-b : 2 links\na-b --* a-b\n" for el in ("a", "a.b")},
+        },
+    ]
+
+    for test in tests:
+        test_links = test.get("links", links)
+        test_ids = list(test_links.get_nodes().iter_ids())
+        got = rollup_diagrams(test_links, test_ids, Classes(), test["max_edges"], test["depth"])
+        assert got == test["expected"], test["name"]
+
+
+def test_Workspace(tmp_path):
+    package = tmp_path / "pkg"
+    package.mkdir()
+    (package / "__init__.py").write_text("")
+    (package / "base.py").write_text("class Base:\n    pass\n")
+    (package / "model.py").write_text("from pkg.base import Base\n\n\nclass Model(Base):\n    pass\n")
+
+    tests = [
+        {
+            "name": "function added",
+            "files": {
+                "model.py": "from pkg.base import Base\n\n\nclass Model(Base):\n    def run(self):\n        pass\n"
+            },
+            "changed": True,
+        },
+        {
+            "name": "import added",
+            "files": {"base.py": "import pkg.model\n\n\nclass Base:\n    pass\n"},
+            "changed": True,
+        },
+        {
+            "name": "module added",
+            "files": {
+                "view.py": "from pkg.model import Model\n\n\nclass View:\n    def __init__(self, m: Model):\n"
+                "        self.m = m\n"
+            },
+            "changed": True,
+        },
+        {
+            "name": "body changed",
+            "files": {
+                "view.py": "from pkg.model import Model\n\n\nclass View:\n    def __init__(self, m: Model):\n"
+                "        self.m = m\n        print(m)\n"
+            },
+            "changed": False,
+        },
+        {
+            "name": "syntax error",
+            "files": {"base.py": "class Base(\n"},
+            "changed": True,
+        },
+        {
+            "name": "module removed",
+            "files": {"view.py": None},
+            "changed": True,
+        },
+    ]
+
+    workspace = Workspace(str(package), source=True)
+    workspace.update()
+    for i, test in enumerate(tests):
+        generation = workspace.generation
+        for name, content in test["files"].items():
+            if content is None:
+                (package / name).unlink()
+            else:
+                (package / name).write_text(content)
+                # the modification time is set explicitly to detect the changes within the filesystem's resolution
+                os.utime(package / name, ns=(0, i + 1))
+
+        assert workspace.update(), test["name"]
+        assert (workspace.generation > generation) == test["changed"], test["name"]
+
+        links, classes = analyze_source(str(package))
+        assert workspace.links == links, test["name"]
+        assert workspace.classes == classes, test["name"]
+        assert workspace.nodes.to_json() == links.get_nodes().to_json(), test["name"]
+
+    assert workspace.update() == []
+
+
+def test_Server_respond():
+    workspace = Workspace("fixtures")
+    workspace.update()
+    links, classes = parse_puml_files(["fixtures/packages.puml", "fixtures/classes.puml"])
+    assert workspace.links == links
+    assert workspace.classes == classes
+
+    server = Server(workspace, WebpageConfig())
+    tests = [
+        {"method": "GET", "target": "/version", "status": 200, "body": b"1"},
+        {"method": "GET", "target": "/?q=superduperdb.base", "status": 200, "body": b"fetch('/version')"},
+        {"method": "GET", "target": "/data.json", "status": 200, "body": links.to_json().encode()},
+        {"method": "GET", "target": "/missing", "status": 404, "body": b"not found"},
+        {"method": "POST", "target": "/", "status": 405, "body": b"method not allowed"},
+    ]
+
+    for test in tests:
+        status, _, body = server.respond(test["method"], test["target"])
+        assert status == test["status"], test["target"]
+        assert test["body"] in body, test["target"]
+
+
+def test_Server_update(tmp_path):
+    packages = pathlib.Path("fixtures/packages.puml").read_text()
+    (tmp_path / "classes.puml").write_text(pathlib.Path("fixtures/classes.puml").read_text())
+    (tmp_path / "packages.puml").write_text(packages)
+    workspace = Workspace(str(tmp_path))
+    workspace.update()
+    server = Server(workspace, WebpageConfig())
+
+    # the graphs alternate, hence after the first rebuild the permanent generation holds as many objects every other one
+    counts = []
+    try:
+        for i in range(7):
+            (tmp_path / "packages.puml").write_text(packages + ("foo.a --> foo.b\n" if i % 2 else ""))
+            os.utime(tmp_path / "packages.puml", ns=(0, i + 1))
+            assert server.update()
+            counts.append(gc.get_freeze_count())
+    finally:
+        gc.unfreeze()
+    assert counts[1:] == counts[1:3] * 3, counts
+    assert server.update() == []
+
+
+def test_Profiler():
+    profiler = Profiler()
+    with profiler.stage("parse") as counts:
+        counts["links"] = len(parse_links("a --> b\n", "a --> c\n"))
+    with profiler.stage("nodes") as counts:
+        counts["nodes"] = 3
+
+    assert [el.name for el in profiler.stages] == ["parse", "nodes"]
+    assert all(el.wall >= 0 and el.cpu >= 0 and el.rss_kb >= 0 for el in profiler.stages)
+
+    tests = [
+        {"output": profiler.to_table(), "want": ["parse", "links=2", "nodes=3"]},
+        {"output": profiler.to_json(), "want": ['"name": "parse"', '"counts": {"nodes": 3}']},
+        {
+            "output": profiler.to_prometheus(),
+            "want": [
+                "# TYPE pyarch_stage_wall_seconds gauge",
+                'pyarch_stage_wall_seconds{stage="nodes"} ',
+                'pyarch_stage_count{stage="parse",count="links"} 2',
+            ],
+        },
+    ]
+
+    for test in tests:
+        for want in test["want"]:
+            assert want in test["output"]
+
+
+def test_run_batch(tmp_path):
+    manifest = tmp_path / "manifest.json"
+    manifest.write_text(
+        json.dumps(
+            [
+                {"input": os.path.abspath("fixtures"), "output": "superduperdb.html", "title": "superduperdb <arch>"},
+                {"input": os.path.abspath("fixtures"), "title": "compact", "compact": True},
+                {"input": "missing", "title": "missing"},
+            ]
+        )
+    )
+    jobs = read_batch_manifest(str(manifest))
+    assert [el.output for el in jobs] == ["superduperdb.html", "fixtures.html", "missing.html"]
+    assert jobs[2].input == str(tmp_path / "missing")
+
+    output = tmp_path / "public"
+    summaries, errors = run_batch(jobs, str(output), WebpageConfig(title="index"), workers=2)
+    assert [(el["output"], el["nodes"], el["links"]) for el in summaries] == [
+        ("superduperdb.html", 243, 416),
+        ("fixtures.html", 243, 416),
+    ]
+    assert list(errors) == ["missing.html"]
+
+    index = (output / "index.html").read_text()
+    assert '<a href="superduperdb.html">superduperdb &lt;arch&gt;</a>' in index
+    assert '<a href="fixtures.html">compact</a>' in index
+    assert "missing.html" not in index
+    assert "decodePayload" in (output / "fixtures.html").read_text()
+
+    tests = [
+        {"manifest": {"input": "a"}, "error": "JSON array"},
+        {"manifest": [{"title": "a"}], "error": "either input, or source"},
+        {"manifest": [{"input": "a", "source": "a"}], "error": "either input, or source"},
+        {"manifest": [{"input": "a", "jobs": 1}], "error": "jobs"},
+        {"manifest": [{"input": "a"}, {"input": "b/a"}], "error": "unique"},
+        {"manifest": [{"input": "a", "output": "index.html"}], "error": "unique"},
+    ]
+
+    for test in tests:
+        manifest.write_text(json.dumps(test["manifest"]))
+        try:
+            read_batch_manifest(str(manifest))
+            assert False, "the manifest %s must be rejected" % test["manifest"]
+        except ValueError as ex:
+            assert test["error"] in str(ex)
+
+
+def test_strongly_connected_components():
+    tests = [
+        {"links": ["a --> b", "b --> c"], "want": [["c"], ["b"], ["a"]]},
+        {"links": ["a --> b", "b --> a", "b --> c"], "want": [["c"], ["a", "b"]]},
+        {
+            "links": ["a --> b", "b --> c", "c --> a", "c --> d", "d --> e", "e --> d"],
+            "want": [["d", "e"], ["a", "b", "c"]],
+        },
+        {"links": ["a --> a", "a --> b"], "want": [["b"], ["a"]]},
+        {"links": [], "want": []},
+    ]
+
+    for test in tests:
+        graph = Graph.from_links(Links([Link(el) for el in test["links"]]))
+        got = [sorted(graph.ids[i] for i in el) for el in strongly_connected_components(graph)]
+        assert got == test["want"], test["links"]
+
+
+def test_analyze_links():
+    links = parse_links(
+        "\n".join(
+            [
+                "pkg.a.x --> pkg.b.y",
+                "pkg.b.y --> pkg.a.x",
+                "pkg.a.x --> pkg.c.z",
+                "pkg.a.w --> pkg.c.z",
+                "pkg.a.w --> pkg.a.x",
+                "pkg.a.x --* pkg.c.z : attr",
+            ]
+        )
+    )
+
+    analysis = analyze_links(links)
+    assert (analysis.nodes, analysis.edges) == (4, 5)
+    assert analysis.cycles == [["pkg.a.x", "pkg.b.y"]]
+    assert [(el.id, el.fan_in, el.fan_out, el.instability) for el in analysis.metrics] == [
+        ("pkg.a.x", 2, 2, 0.5),
+        ("pkg.b.y", 1, 1, 0.5),
+        ("pkg.c.z", 2, 0, 0.0),
+        ("pkg.a.w", 0, 2, 1.0),
+    ]
+    assert analysis.couplings == [("pkg.a", "pkg.c", 2), ("pkg.a", "pkg.b", 1), ("pkg.b", "pkg.a", 1)]
+
+    report = json.loads(analysis.to_json())
+    assert report["graph"] == {"arrows": ["-->"], "nodes": 4, "edges": 5}
+    assert report["couplings"][0] == {"start": "pkg.a", "end": "pkg.c", "links": 2}
+    assert '<a href="?q=pkg.b.y">pkg.b.y</a>' in analysis.to_html()
+
+    page = WebpageGenerator(links.get_nodes(), links, WebpageConfig(), report=analysis.to_html())()
+    assert "<header>Python package architecture</header><details" in page
+
+
+def test_GraphQuery():
+    links = parse_links(
+        "\n".join(
+            [
+                "pkg.a.x --> pkg.b.y",
+                "pkg.b.y --> pkg.a.x",
+                "pkg.b.y --> pkg.c.z",
+                "pkg.c.z --> pkg.d",
+                "pkg.e --> pkg.a.x",
+                "pkg.c.Cls --|> pkg.d.Base",
+                "pkg.c.Attr --* pkg.c.Cls : attr",
+            ]
+        )
+    )
+
+    for cache_size in (2**20, 0):
+        query = GraphQuery.from_links(links, cache_size=cache_size)
+        tests = [
+            {"kind": "dependencies", "ids": ["pkg.a.x"], "want": ["pkg.b.y", "pkg.c.z", "pkg.d"]},
+            {"kind": "dependencies", "ids": ["pkg.d"], "want": []},
+            {"kind": "dependencies", "ids": ["pkg.c.Cls"], "want": ["pkg.c.Attr", "pkg.d.Base"]},
+            {"kind": "dependencies", "ids": ["pkg.c"], "want": ["pkg.d", "pkg.d.Base"]},
+            {"kind": "dependents", "ids": ["pkg.c.z"], "want": ["pkg.a.x", "pkg.b.y", "pkg.e"]},
+            {"kind": "dependents", "ids": ["pkg.c.Attr"], "want": ["pkg.c.Cls"]},
+            {"kind": "dependents", "ids": ["pkg.d.Base"], "want": ["pkg.c.Cls"]},
+            {"kind": "path", "ids": ["pkg.e", "pkg.d"], "want": ["pkg.e", "pkg.a.x", "pkg.b.y", "pkg.c.z", "pkg.d"]},
+            {"kind": "path", "ids": ["pkg.d", "pkg.e"], "want": None},
+            {"kind": "path", "ids": ["pkg.a", "pkg.c.z"], "want": ["pkg.a.x", "pkg.b.y", "pkg.c.z"]},
+            {"kind": "neighbourhood", "ids": ["pkg.b.y"], "want": {"pkg.a.x": 1, "pkg.c.z": 1}},
+        ]
+        for test in tests:
+            got = run_query(query, test["kind"], test["ids"])
+            assert got == {"query": test["kind"], "ids": test["ids"], "result": test["want"]}, test
+
+    assert query.neighbourhood("pkg.b.y", 2, "dependencies") == {"pkg.a.x": 1, "pkg.c.z": 1, "pkg.d": 2}
+    assert query.neighbourhood("pkg.b.y", 2, "dependents") == {"pkg.a.x": 1, "pkg.e": 2}
+
+    for kind, ids in (("dependencies", ["pkg.missing"]), ("path", ["pkg.a.x"]), ("cycles", ["pkg.a.x"])):
+        try:
+            run_query(query, kind, ids)
+            assert False, "error expected"
+        except (KeyError, ValueError):
+            pass
+
+
+def test_diff_links():
+    old = parse_links("a.x --> a.y\na.y --* b.z : attr\nb.z --|> c.w\n")
+    new = parse_links("a.x --> a.y\na.y --* b.z : other\nb.z --|> c.w\nd.v --> a.x\n")
+
+    diff = diff_links(old, new)
+    assert diff.added == [Link("a.y --* b.z : other"), Link("d.v --> a.x")]
+    assert diff.removed == [Link("a.y --* b.z : attr")]
+    assert (diff.added_nodes, diff.removed_nodes) == (["d.v"], [])
+    assert (diff.old, diff.new) == ((3, 4), (4, 5))
+    assert not diff_links(old, parse_links("b.z --|> c.w\na.x --> a.y\na.y --* b.z : attr\n"))
+
+    summary = diff.to_markdown(limit=1)
+    assert "| links | 3 | 4 | 2 | 1 |" in summary
+    assert "- `a.y --* b.z : other`\n- ... 1 more" in summary
+    assert json.loads(diff.to_json())["removed"]["links"] == [Link("a.y --* b.z : attr").to_dict()]
+
+    page = diff_page(diff, Classes(), Classes([Class("d.v", methods=("run()",))]), WebpageConfig())
+    assert [el.description for el in page.links] == ["added other", "added", "removed attr"]
+    assert page.classes.to_members() == {"d.v": ["<<added>>", "run()"]}
+    assert "Architecture diff: +2 / -1 links, +1 / -0 nodes" in page()
+
+
+def test_save_graph(tmp_path):
+    links, classes = parse_puml_files(["fixtures/packages.puml", "fixtures/classes.puml"])
+    tests = [
+        {"links": links, "classes": classes},
+        {"links": parse_links("a.b --> c\nc --* a.b.d : ✓\n"), "classes": Classes([Class("c", methods=("run()",))])},
+        {"links": Links(), "classes": Classes()},
+    ]
+
+    path = str(tmp_path / "graph.pyarch")
+    for test in tests:
+        save_graph(path, test["links"], test["classes"])
+        with GraphSnapshot(path) as snapshot:
+            assert len(snapshot) == len(test["links"])
+            assert snapshot.links() == test["links"]
+            assert snapshot.classes() == test["classes"]
+            assert snapshot.nodes() == test["links"].get_nodes()
+            assert snapshot.node_ids == list(test["links"].get_nodes().iter_ids())
+            assert list(snapshot.section("link_starts")) == [snapshot.node_ids.index(el.start) for el in test["links"]]
+
+    save_graph(path, links, classes)
+    snapshot = pathlib.Path(path).read_bytes()
+    for content in (
+        b"",
+        b"PYARCHG",
+        pathlib.Path("fixtures/packages.puml").read_bytes(),
+        snapshot[:300],
+        snapshot[:-3],
+    ):
+        with open(path, "wb") as f:
+            f.write(content)
+        try:
+            GraphSnapshot(path)
+            assert False, "the snapshot must be rejected"
+        except ValueError:
+            pass
+
+
+def test_import():
+    # the heavy modules are imported by the commands using them, the logs are configured by the application
+    code = (
+        "import logging, sys, pyarch; "
+        "lazy = ('argparse', 'asyncio', 'concurrent.futures', 'hashlib', 'tempfile'); "
+        "print(sorted(el for el in lazy if el in sys.modules)); "
+        "print(len(logging.getLogger().handlers))"
+    )
+    got = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert got.stdout.split("\n")[:2] == ["[]", "0"]
+    assert got.stderr == ""
+
+
+def test_cli(tmp_path):
+    tests = [
+        {"name": "version", "argv": ["--version"], "expected": 0},
+        {"name": "build", "argv": ["-i", "fixtures", "-o", str(tmp_path), "--no-cache"], "expected": 0},
+        {"name": "no inputs", "argv": ["-i", str(tmp_path), "-o", str(tmp_path)], "expected": 1},
+        {"name": "query", "argv": ["query", "fixtures", "dependencies", "pyarch"], "expected": 1},
+        {"name": "batch", "argv": ["query", "fixtures", "--batch", str(tmp_path / "queries.txt")], "expected": 0},
+    ]
+
+    (tmp_path / "queries.txt").write_text("# transitive dependencies\ndependencies superduperdb.base\n")
+    for test in tests:
+        assert cli(test["argv"]) == test["expected"], test["name"]
+    assert os.path.isfile(tmp_path / "index.html")